@@ -0,0 +1,66 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+
+from wingman.colorlut import ColorLUT, _in_hsv_range
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, "wingman", "config.yaml")
+
+
+def _configured_classes():
+    with open(CONFIG) as f:
+        cfg = yaml.safe_load(f)
+    classes = dict(cfg.get("color_classes") or {})
+    classes.setdefault("enemy", cfg["enemy_hsv"])
+    return classes, cfg.get("color_lut", {}).get("bits", 6)
+
+
+def _all_colors():
+    b, g, r = np.meshgrid(*(np.arange(256, dtype=np.uint8),) * 3, indexing="ij")
+    return np.stack((b, g, r), axis=-1).reshape(4096, 4096, 3)
+
+
+@pytest.mark.parametrize("bits", [5, None])
+def test_lut_masks_match_inrange_on_every_color(bits):
+    classes, configured_bits = _configured_classes()
+    lut = ColorLUT(classes, bits=bits or configured_bits)
+    colors = _all_colors()
+    hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+    labels = lut.classify(colors)
+    for name, r in classes.items():
+        expected = _in_hsv_range(hsv, r["lower"], r["upper"])
+        assert np.count_nonzero(lut.mask(labels, name) != expected) == 0, name
+
+
+def test_lut_matches_inrange_in_windows():
+    classes, bits = _configured_classes()
+    lut = ColorLUT(classes, bits=bits)
+    colors = _all_colors()[1000:1400, 2000:2600]
+    out = np.zeros((500, 700), dtype=np.uint8)
+    # neither the frame nor the output window is contiguous
+    labels = lut.classify(colors[:, 50:550], out=out[20:420, 30:530])
+    hsv = cv2.cvtColor(np.ascontiguousarray(colors[:, 50:550]), cv2.COLOR_BGR2HSV)
+    for name, r in classes.items():
+        assert np.array_equal(lut.mask(labels.copy(), name), _in_hsv_range(hsv, r["lower"], r["upper"])), name
+
+
+def test_wrapping_hue_matches_with_and_without_lut():
+    from wingman.synth import FrameGenerator
+    from wingman.vision import Vision
+
+    red = {"lower": [170, 120, 120], "upper": [8, 255, 255]}
+    gen = FrameGenerator(320, 180, 12, 6, red["lower"], red["upper"], seed=3)
+    frames = []
+    for _ in range(6):
+        frames.append(gen.render()[0])
+        gen.step()
+    plain = Vision(red["lower"], red["upper"], engine="components")
+    lut = Vision(red["lower"], red["upper"], engine="components", lut=ColorLUT({"enemy": red}, bits=6))
+    found = [plain.find_enemies(f) for f in frames]
+    assert all(found)
+    assert found == [lut.find_enemies(f) for f in frames]
+    batch = plain.find_enemies_batch(np.stack(frames))
+    assert len(batch.frame) == sum(len(f) for f in found)
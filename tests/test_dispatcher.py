@@ -0,0 +1,49 @@
+import threading
+
+from wingman.backends import RecordingBackend
+from wingman.dispatcher import InputDispatcher
+
+
+class _SlowPress(RecordingBackend):
+    """Recording backend whose press blocks until the test lets it finish."""
+
+    def __init__(self):
+        super().__init__()
+        self.pressing = threading.Event()
+        self.proceed = threading.Event()
+
+    def press(self, key):
+        self.pressing.set()
+        self.proceed.wait(1.0)
+        super().press(key)
+
+
+def test_cancel_all_during_a_press_leaves_the_key_released():
+    backend = _SlowPress()
+    clock = [0.0]
+    d = InputDispatcher(backend.press, backend.release, clock=lambda: clock[0])
+    h = d.hold("w", 1.0)
+    firing = threading.Thread(target=d.process_due)
+    firing.start()
+    assert backend.pressing.wait(1.0)
+    canceller = threading.Thread(target=d.cancel_all)
+    canceller.start()
+    canceller.join(0.05)
+    backend.proceed.set()
+    firing.join(1.0)
+    canceller.join(1.0)
+    assert [(e.kind, e.key) for e in backend.events] == [("press", "w"), ("release", "w")]
+    assert d.held_keys == []
+    assert h.done.is_set() and h.cancelled
+
+
+def test_overlapping_holds_of_one_key_release_once():
+    backend = RecordingBackend()
+    clock = [0.0]
+    d = InputDispatcher(backend.press, backend.release, clock=lambda: clock[0])
+    d.hold("a", 1.0)
+    d.hold("a", 2.0, at=0.5)
+    for clock[0] in (0.0, 0.5, 1.0, 2.5):
+        d.process_due()
+    assert [(e.kind, e.key) for e in backend.events] == [("press", "a"), ("release", "a")]
+    assert backend.holds()[0][2] is not None
@@ -0,0 +1,40 @@
+import threading
+
+from wingman import flightrec
+from wingman.flightrec import FlightRecorder
+
+
+def test_ring_keeps_the_newest_events_through_a_dump(tmp_path):
+    rec = FlightRecorder(capacity=8)
+    for i in range(20):
+        rec.record(flightrec.FRAME, i, ts=float(i))
+    rec.record(flightrec.MARK, name="done", ts=20.0)
+    events, meta = flightrec.load(rec.dump(str(tmp_path / "flight.wmfr")))
+    assert meta["total"] == 21
+    assert [e[5] for e in events if e[2] == flightrec.FRAME] == list(range(13, 20))
+    assert meta["names"][events[-1][4]] == "done"
+    trace = flightrec.to_chrome_trace(events, meta)
+    assert trace["traceEvents"]
+
+
+def test_thread_table_is_shared_by_short_lived_threads():
+    rec = FlightRecorder(capacity=64)
+
+    def note():
+        rec.record(flightrec.MARK)
+
+    for _ in range(300):
+        t = threading.Thread(target=note)
+        t.start()
+        t.join()
+    assert rec._thread_names == ["Thread (note)"]
+
+
+def test_thread_table_is_capped():
+    rec = FlightRecorder(capacity=16)
+    for i in range(300):
+        t = threading.Thread(target=rec.record, args=(flightrec.MARK,), name="worker-%d" % i)
+        t.start()
+        t.join()
+    assert len(rec._thread_names) == 256
+    assert rec._thread_names[-1] == "other"
@@ -0,0 +1,50 @@
+import threading
+
+import numpy as np
+
+from wingman import ocr
+
+
+class _SlowReader:
+    """Stands in for an EasyOCR Reader; each read waits until the test releases it."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def readtext(self, image, detail=1, paragraph=False):
+        self.calls += 1
+        self.release.wait(5)
+        return [([(0, 0), (4, 0), (4, 4), (0, 4)], str(int(image[0, 0, 0])), 0.9)]
+
+
+def test_scan_returns_the_last_read_while_a_miss_is_read_in_the_background(monkeypatch):
+    reader = _SlowReader()
+    monkeypatch.setattr(ocr, "load_easyocr", lambda: object())
+    monkeypatch.setattr(ocr, "get_reader", lambda gpu=True: reader)
+    service = ocr.OCRService({"speed": [0, 0, 8, 8]}, shift=0).start()
+    try:
+        assert service.ready.wait(5)
+        frame = np.full((8, 8, 3), 41, np.uint8)
+        assert service.scan(frame) == {}  # the first read is still running
+        reader.release.set()
+        for _ in range(500):
+            if service.misses:
+                break
+            threading.Event().wait(0.01)
+        assert service.scan(frame) == {"speed": "41"}
+        assert service.hits == 1
+
+        reader.release.clear()
+        frame[:] = 42
+        assert service.scan(frame) == {"speed": "41"}  # the new pixels are being read
+        reader.release.set()
+        for _ in range(500):
+            if service.misses == 2:
+                break
+            threading.Event().wait(0.01)
+        assert service.scan(frame) == {"speed": "42"}
+        assert reader.calls == 2
+    finally:
+        reader.release.set()
+        service.stop()
@@ -0,0 +1,57 @@
+import threading
+
+from wingman.pacing import FrameScheduler
+
+
+class _ResettingStop(threading.Event):
+    """A stop event that resets the scheduler while `wait` sleeps on it, like main does on pause."""
+
+    def __init__(self, sched):
+        super().__init__()
+        self.sched = sched
+
+    def wait(self, timeout=None):
+        self.sched.reset()
+        return super().wait(timeout)
+
+
+def test_reset_during_wait_does_not_break_the_schedule():
+    sched = FrameScheduler(fps=100.0, spin=0.0)
+    stop = _ResettingStop(sched)
+    assert sched.wait(stop)
+    sched.finish()
+    # the second frame sleeps until its deadline; reset() clears the schedule meanwhile
+    assert sched.wait(stop)
+    sched.finish()
+    assert sched.wait(stop)
+    assert sched.frames == 2
+
+
+def test_reset_while_waiting_from_another_thread():
+    sched = FrameScheduler(fps=1000.0, spin=0.0)
+    stop = threading.Event()
+    errors = []
+
+    def pace():
+        try:
+            while not stop.is_set():
+                if sched.wait(stop):
+                    sched.finish(0.0001)
+        except Exception as e:  # pragma: no cover - the failure being tested for
+            errors.append(e)
+            stop.set()
+
+    t = threading.Thread(target=pace)
+    t.start()
+    for _ in range(2000):
+        sched.reset()
+    stop.set()
+    t.join(5)
+    assert not t.is_alive()
+    assert errors == []
+
+
+def test_finish_without_wait_is_a_no_op():
+    sched = FrameScheduler(fps=30.0)
+    assert sched.finish() == 0.0
+    assert sched.frames == 0
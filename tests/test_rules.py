@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from wingman.backends import RecordingBackend
+from wingman.controller import ACTIONS, Controller
+from wingman.dispatcher import InputDispatcher
+from wingman.rules import RuleEngine, RuleError, load_rules
+
+MISSIONS = {"climb": {"tracks": {"main": [{"action": "nose_up", "hold": 5.0}]}}}
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _engine(entries, clock=None, backend=None, dispatcher=None):
+    clock = clock or _Clock()
+    backend = backend or RecordingBackend()
+    if dispatcher is None:
+        dispatcher = InputDispatcher(backend.press, backend.release, clock=clock)
+    ctrl = Controller((0, 0, 1, 1), backend=backend, dispatcher=dispatcher, missions=MISSIONS)
+    return RuleEngine(load_rules(entries), ctrl, clock=clock), ctrl, clock
+
+
+def test_for_frames_needs_consecutive_frames():
+    engine, _, _ = _engine([{"name": "flare", "when": "enemy.count >= 2", "do": "flares", "for_frames": 3}])
+    seen = [{"enemy.count": n} for n in (2, 2, 0, 2, 2)]
+    assert [engine.evaluate(f) for f in seen] == [[]] * 5
+    assert [r.name for r in engine.evaluate({"enemy.count": 3})] == ["flare"]
+
+
+def test_cooldown_blocks_refiring():
+    engine, _, clock = _engine([{"name": "gun", "when": "enemy", "do": "machine_gun", "cooldown": 1.0}])
+    facts = {"enemy.count": 1}
+    assert len(engine.evaluate(facts)) == 1
+    clock.now = 0.5
+    assert engine.evaluate(facts) == []
+    clock.now = 1.0
+    assert len(engine.evaluate(facts)) == 1
+    assert engine.rules[0].fired == 2
+
+
+def test_one_rule_per_key_per_frame():
+    engine, _, _ = _engine(
+        [
+            {"name": "high", "when": "enemy", "do": "flares", "priority": 2},
+            {"name": "low", "when": "enemy", "do": "flares", "priority": 1},
+        ]
+    )
+    assert [r.name for r in engine.evaluate({"enemy.count": 1})] == ["high"]
+
+
+def test_missing_facts_never_match():
+    engine, _, _ = _engine([{"name": "low_fuel", "when": "hud.fuel < 20", "do": "afterburner"}])
+    assert engine.evaluate({}) == []
+
+
+def test_bad_rules_are_rejected():
+    with pytest.raises(RuleError):
+        load_rules([{"when": "enemy", "do": "barrel_roll"}])
+    with pytest.raises(RuleError):
+        load_rules([{"when": "enemy.count >", "do": "flares"}])
+
+
+def test_interrupt_cancels_only_the_mission_inputs():
+    backend = RecordingBackend()
+    dispatcher = InputDispatcher(backend.press, backend.release).start()
+    engine, ctrl, _ = _engine(
+        [{"name": "evade", "when": "enemy", "do": "roll_left", "hold": 0.2, "interrupt": True}], clock=dispatcher.clock, backend=backend, dispatcher=dispatcher
+    )
+    try:
+        weapon = dispatcher.hold(ACTIONS["machine_gun"][0], 5.0)
+        mission = threading.Thread(target=ctrl.run_mission, args=("climb",))
+        mission.start()
+        while not backend.events or ACTIONS["nose_up"][0] not in dispatcher.held_keys:
+            threading.Event().wait(0.005)
+        assert [r.name for r in engine.evaluate({"enemy.count": 1})] == ["evade"]
+        mission.join(1.0)
+        assert not mission.is_alive()
+        assert ctrl.last_mission_report["cancelled"]
+        held = dispatcher.held_keys
+        assert ACTIONS["nose_up"][0] not in held
+        assert ACTIONS["machine_gun"][0] in held
+        assert not weapon.cancelled
+    finally:
+        dispatcher.stop()
@@ -0,0 +1,54 @@
+import numpy as np
+
+from wingman.tracker import Tracker, associate
+
+
+def test_associate_prefers_mutual_nearest_within_the_gate():
+    dist = np.array(
+        [
+            [1.0, 5.0, 90.0],
+            [2.0, 3.0, 90.0],
+            [90.0, 90.0, 95.0],
+        ]
+    )
+    ti, di = associate(dist, gate=80.0)
+    assert sorted(zip(ti.tolist(), di.tolist())) == [(0, 0), (1, 1)]
+
+
+def test_tracks_keep_their_ids_and_learn_velocity():
+    tracker = Tracker(gate=50.0, alpha=1.0, beta=1.0)
+    for i in range(5):
+        tracker.update([(100 + 10 * i, 100, 30), (400, 300 - 5 * i, 30)], i * 0.1)
+    tracks = tracker.tracks[np.argsort(tracker.tracks["id"])]
+    assert tracks["id"].tolist() == [1, 2]
+    assert tracks["hits"].tolist() == [5, 5]
+    assert np.allclose(tracks["vx"], [100.0, 0.0])
+    assert np.allclose(tracks["vy"], [0.0, -50.0])
+    assert np.allclose(tracker.predict(tracks, 0.5), [[150, 100], [400, 275]])
+
+
+def test_repeated_timestamp_corrects_position_without_a_velocity_spike():
+    tracker = Tracker(gate=50.0)
+    tracker.update([(100, 100, 30)], 1.0)
+    tracker.update([(110, 100, 30)], 1.1)
+    vx = float(tracker.tracks["vx"][0])
+    tracks = tracker.update([(112, 100, 30)], 1.1)
+    assert np.isfinite(tracks["vx"]).all() and np.isfinite(tracks["vy"]).all()
+    assert float(tracks["vx"][0]) == vx
+    assert tracker.timestamp == 1.1
+    # an out-of-order frame neither moves time back nor breaks the filter
+    tracks = tracker.update([(113, 100, 30)], 1.05)
+    assert tracker.timestamp == 1.1
+    assert np.isfinite(tracks["vx"]).all()
+
+
+def test_unmatched_tracks_expire_and_far_detections_start_new_tracks():
+    tracker = Tracker(gate=20.0, max_misses=2, min_hits=2)
+    tracker.update([(100, 100, 30)], 0.0)
+    tracker.update([(300, 100, 30)], 0.1)
+    assert sorted(tracker.tracks["id"].tolist()) == [1, 2]
+    assert len(tracker.confirmed()) == 0
+    for i in range(3):
+        tracker.update([(300, 100, 30)], 0.2 + 0.1 * i)
+    assert tracker.tracks["id"].tolist() == [2]
+    assert tracker.confirmed()["id"].tolist() == [2]
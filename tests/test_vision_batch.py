@@ -0,0 +1,42 @@
+import numpy as np
+
+from wingman.colorlut import ColorLUT
+from wingman.synth import FrameGenerator
+from wingman.vision import Vision
+
+ENEMY = {"lower": [0, 120, 120], "upper": [10, 255, 255]}
+
+
+def _frames(count=24, width=320, height=180, blobs=12):
+    gen = FrameGenerator(width, height, blobs, 6, ENEMY["lower"], ENEMY["upper"], seed=5)
+    frames = np.empty((count, height, width, 3), dtype=np.uint8)
+    for i in range(count):
+        frames[i] = gen.render()[0]
+        gen.step()
+    return frames
+
+
+def _per_frame(vision, frames):
+    rows = [(i, x, y, area) for i, frame in enumerate(frames) for x, y, area in vision.find_enemies(frame)]
+    return [tuple(column) for column in zip(*rows)] if rows else [(), (), (), ()]
+
+
+def _batched(vision, frames, **kwargs):
+    found = vision.find_enemies_batch(frames, **kwargs)
+    return [tuple(column.tolist()) for column in found]
+
+
+def test_batch_matches_find_enemies():
+    frames = _frames()
+    vision = Vision(ENEMY["lower"], ENEMY["upper"], engine="components")
+    assert _batched(vision, frames) == _per_frame(vision, frames)
+    assert _batched(vision, list(frames), chunk_bytes=1, workers=2) == _per_frame(vision, frames)
+
+
+def test_batch_with_lut_and_workers_matches_find_enemies():
+    frames = _frames(count=64)
+    lut = ColorLUT({"enemy": ENEMY}, bits=6)
+    vision = Vision(ENEMY["lower"], ENEMY["upper"], engine="components", lut=lut)
+    expected = _per_frame(vision, frames)
+    for _ in range(3):
+        assert _batched(vision, frames, chunk_bytes=1 << 20, workers=3) == expected
@@ -1,41 +1,106 @@
 import time
-import math
 import logging
 
+import numpy as np
+
+from . import flightrec
+from .tracker import detections_to_array
+
 
 logger = logging.getLogger(__name__)
 
 
 class SimpleAI:
-    def __init__(self, region, smoothing=0.3, fire_cooldown=0.2):
+    def __init__(
+        self, region, smoothing=0.3, fire_cooldown=0.2, tracker=None, latency_smoothing=0.1, switch_margin=0.8, max_lead=0.5, clock=time.time
+    ):
         self.region = region
         self.smoothing = smoothing
         self.fire_cooldown = fire_cooldown
         self._last_fire = 0.0
+        # time source for the fire cooldown (a simulator passes its virtual clock)
+        self.clock = clock
+        # Optional Tracker: decisions are then made on tracks predicted forward by the
+        # measured capture-to-action latency instead of on raw detections.
+        self.tracker = tracker
+        self.latency_smoothing = latency_smoothing
+        # keep the current target unless another track is closer than this fraction of its distance
+        self.switch_margin = switch_margin
+        self.latency = 0.0
+        # never extrapolate tracks further ahead than this (seconds)
+        self.max_lead = max_lead
+        self._latency_reported = False
+        self._target_id = None
+
+    def report_latency(self, seconds):
+        """Feed a measured capture-to-action latency into the prediction lead (EMA).
+
+        Until something reports latency, the lead is the capture-to-decision time
+        measured in `decide`.
+        """
+        self._latency_reported = True
+        self._update_latency(seconds)
+
+    def _update_latency(self, seconds):
+        if self.latency == 0.0:
+            self.latency = seconds
+        else:
+            self.latency += self.latency_smoothing * (seconds - self.latency)
+
+    def _fire(self):
+        now = self.clock()
+        if now - self._last_fire >= self.fire_cooldown:
+            self._last_fire = now
+            return True
+        return False
+
+    def decide(self, enemies, timestamp=None):
+        """Decide action given enemies (list of (x,y,area) or a detection array). Returns dict with 'target' and 'fire'.
 
-    def decide(self, enemies):
-        """Decide action given list of enemies (x,y,area). Returns dict with 'target' and 'fire'."""
-        if not enemies:
-            logger.debug("AI: no enemies")
+        `timestamp` is the perf_counter() time the frame was captured; with a tracker it
+        drives the motion model and the latency the prediction is led by.
+        """
+        if self.tracker is not None:
+            return self._decide_tracked(enemies, time.perf_counter() if timestamp is None else timestamp)
+
+        if len(enemies) == 0:
+            flightrec.record(flightrec.DECIDE, -1, -1, 0)
             return {"target": None, "fire": False}
 
         # choose nearest to screen center
+        det = detections_to_array(enemies)
         cx = self.region[2] // 2
         cy = self.region[3] // 2
-        best = None
-        best_dist = 1e9
-        for (x, y, a) in enemies:
-            d = math.hypot(x - cx, y - cy)
-            if d < best_dist:
-                best_dist = d
-                best = (x, y)
-
-        fire = False
-        now = time.time()
-        if now - self._last_fire >= self.fire_cooldown:
-            fire = True
-            self._last_fire = now
+        i = int(np.argmin(np.hypot(det[:, 0] - cx, det[:, 1] - cy)))
+        best = (int(det[i, 0]), int(det[i, 1]))
 
-        logger.debug("AI: chosen target=%s fire=%s", best, fire)
+        fire = self._fire()
+
+        flightrec.record(flightrec.DECIDE, best[0], best[1], fire)
 
         return {"target": best, "fire": fire, "smoothing": self.smoothing}
+
+    def _decide_tracked(self, enemies, timestamp):
+        self.tracker.update(enemies, timestamp)
+        if not self._latency_reported:
+            self._update_latency(time.perf_counter() - timestamp)
+        tracks = self.tracker.confirmed()
+        if len(tracks) == 0:
+            self._target_id = None
+            flightrec.record(flightrec.DECIDE, -1, -1, 0)
+            return {"target": None, "fire": False, "track_id": None}
+
+        pos = self.tracker.predict(tracks, timestamp + min(self.latency, self.max_lead))
+        dist = np.hypot(pos[:, 0] - self.region[2] // 2, pos[:, 1] - self.region[3] // 2)
+        i = int(np.argmin(dist))
+        current = np.flatnonzero(tracks["id"] == self._target_id)
+        if len(current) and dist[i] > self.switch_margin * dist[current[0]]:
+            i = int(current[0])
+        self._target_id = int(tracks["id"][i])
+        best = (int(pos[i, 0]), int(pos[i, 1]))
+
+        fire = self._fire()
+
+        flightrec.record(flightrec.DECIDE, best[0], best[1], fire | self._target_id << 1, dur=self.latency)
+
+        return {"target": best, "fire": fire, "smoothing": self.smoothing, "track_id": self._target_id}
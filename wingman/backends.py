@@ -0,0 +1,118 @@
+"""Input backends: where key presses and releases actually go.
+
+Controller talks to an InputBackend instead of a specific library, so the same
+maneuvers and missions can drive the game through `keyboard` or run headless against
+a RecordingBackend, which only logs what would have been sent (for latency tests and
+benchmarks on machines without a desktop).
+"""
+import time
+import logging
+import threading
+from collections import namedtuple
+
+try:
+    import keyboard as keyboard_module
+except Exception:
+    keyboard_module = None
+
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("keyboard", "recording")
+
+# t_ns: time.perf_counter_ns() when the call was made; kind: "press" | "release"
+InputEvent = namedtuple("InputEvent", "t_ns kind key")
+
+
+class InputBackend:
+    """Interface for sending key input."""
+
+    name = "none"
+
+    @property
+    def available(self):
+        return True
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def release(self, key):
+        raise NotImplementedError
+
+    def add_hotkey(self, key, callback):
+        """Register a global hotkey; returns False if the backend has no hotkey support."""
+        return False
+
+    def close(self):
+        pass
+
+
+class KeyboardBackend(InputBackend):
+    """Send keys with the `keyboard` library (works with DirectInput games, see ADR 002)."""
+
+    name = "keyboard"
+
+    @property
+    def available(self):
+        return keyboard_module is not None
+
+    def press(self, key):
+        keyboard_module.press(key)
+
+    def release(self, key):
+        keyboard_module.release(key)
+
+    def add_hotkey(self, key, callback):
+        if keyboard_module is None:
+            return False
+        keyboard_module.add_hotkey(key, callback)
+        return True
+
+
+class RecordingBackend(InputBackend):
+    """Log every press and release with a perf_counter_ns() timestamp instead of sending it."""
+
+    name = "recording"
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def press(self, key):
+        t = time.perf_counter_ns()
+        with self._lock:
+            self.events.append(InputEvent(t, "press", key))
+
+    def release(self, key):
+        t = time.perf_counter_ns()
+        with self._lock:
+            self.events.append(InputEvent(t, "release", key))
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+
+    def holds(self):
+        """Pair presses with releases per key; returns [(key, press_ns, release_ns), ...].
+
+        A key still down at the end has release_ns None.
+        """
+        down = {}
+        out = []
+        with self._lock:
+            events = list(self.events)
+        for e in events:
+            if e.kind == "press":
+                down.setdefault(e.key, []).append(len(out))
+                out.append([e.key, e.t_ns, None])
+            elif down.get(e.key):
+                out[down[e.key].pop(0)][2] = e.t_ns
+        return [tuple(h) for h in out]
+
+
+def make_backend(name="keyboard"):
+    if name == "keyboard":
+        return KeyboardBackend()
+    if name == "recording":
+        return RecordingBackend()
+    raise ValueError("unknown input backend %r (expected one of %s)" % (name, ", ".join(BACKENDS)))
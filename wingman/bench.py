@@ -0,0 +1,330 @@
+"""Headless benchmarks.
+
+    python -m wingman.bench input            # input timing against the recording backend
+    python -m wingman.bench hotpath          # vision, AI and capture on synthetic frames
+    python -m wingman.bench vision --quick --save-baseline bench-baseline.json
+    python -m wingman.bench hotpath --baseline bench-baseline.json --tolerance 0.25
+    python -m wingman.bench sim              # closed loop against the simulator
+
+The input suite runs the real Controller and InputDispatcher with a RecordingBackend,
+so nothing is sent to the desktop, and checks fixed thresholds. The hot-path suites
+time `Vision.find_enemies`, `SimpleAI.decide` and `Capture.get_frame` per call over a
+grid of resolutions, blob counts and noise levels, and compare against a JSON
+baseline. The sim suite runs vision, AI and the Controller in a closed loop against
+the simulator (see wingman.sim) and reports per-frame cost as well as time on target.
+The process exits with status 1 if any check fails.
+"""
+import sys
+import json
+import time
+import argparse
+import logging
+
+import numpy as np
+
+from .ai import SimpleAI
+from .backends import RecordingBackend
+from .capture import Capture
+from .controller import Controller
+from .synth import RESOLUTIONS, FrameGenerator
+from .tracker import Tracker
+from .vision import Vision
+
+
+logger = logging.getLogger(__name__)
+
+# metric -> worst acceptable value (lower is better for all of them). With 30 holds the
+# p99 is about the worst one, and a single preemption of the dispatcher thread on a busy
+# or single-core machine costs a scheduler tick (up to ~4 ms), so timing limits are 5 ms.
+INPUT_THRESHOLDS = {
+    "call_overhead_us.p99": 500.0,
+    "hold_error_ms.p99": 5.0,
+    "cancel_latency_ms.p99": 5.0,
+    "mission_press_error_ms.max": 5.0,
+    "mission_release_error_ms.max": 5.0,
+    "weapon_interval_error_ms.p99": 5.0,
+}
+
+# hot-path grid; markers are drawn in the default enemy_hsv range
+ENEMY_HSV = ([0, 120, 120], [10, 255, 255])
+BLOB_COUNTS = (0, 10, 100, 500)
+NOISE_LEVELS = (0, 4, 12)
+
+# a p50 may also exceed its baseline by this much, whatever the tolerance: cases of a few
+# microseconds (the AI ones) move by more than 25% between runs of the same tree
+COMPARE_FLOOR_MS = 0.05
+
+
+def summarize(values):
+    """mean / p50 / p99 / max of a sequence of numbers."""
+    a = np.asarray(values, dtype=np.float64)
+    if a.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(a.size),
+        "mean": float(a.mean()),
+        "p50": float(np.percentile(a, 50)),
+        "p99": float(np.percentile(a, 99)),
+        "max": float(a.max()),
+    }
+
+
+def time_calls(fn, inputs, iterations=30, warmup=3):
+    """Call fn(x) for x cycling through `inputs`; per-call latency stats in ms plus fps."""
+    costs = []
+    for i in range(warmup + iterations):
+        x = inputs[i % len(inputs)]
+        t = time.perf_counter_ns()
+        fn(x)
+        if i >= warmup:
+            costs.append((time.perf_counter_ns() - t) / 1e6)
+    stats = summarize(costs)
+    stats["fps"] = 1000.0 / stats["mean"] if stats["mean"] > 0 else 0.0
+    return {("%s_ms" % k if k in ("mean", "p50", "p99", "max") else k): v for k, v in stats.items()}
+
+
+def _frames(resolution, blobs, noise, count=4):
+    width, height = RESOLUTIONS[resolution]
+    gen = FrameGenerator(width, height, blobs, noise, *ENEMY_HSV, seed=blobs * 31 + int(noise))
+    frames = []
+    for _ in range(count):
+        frames.append(gen.render()[0])
+        gen.step()
+    return frames
+
+
+def vision_cases(quick=False):
+    """(name, resolution, blobs, noise) for the vision grid."""
+    resolutions = ("720p", "1080p") if quick else tuple(RESOLUTIONS)
+    cases = [("%s/%d/n0" % (r, b), r, b, 0) for r in resolutions for b in BLOB_COUNTS]
+    cases += [("1080p/100/n%d" % n, "1080p", 100, n) for n in NOISE_LEVELS if n]
+    return cases
+
+
+def run_vision(engine="components", quick=False, iterations=30):
+    results = {}
+    for name, resolution, blobs, noise in vision_cases(quick):
+        vis = Vision(*ENEMY_HSV, engine=engine)
+        results["vision/%s/%s" % (engine, name)] = time_calls(vis.find_enemies, _frames(resolution, blobs, noise), iterations)
+    return results
+
+
+def run_ai(iterations=200):
+    results = {}
+    region = (0, 0) + RESOLUTIONS["1080p"]
+    for blobs in BLOB_COUNTS:
+        gen = FrameGenerator(region[2], region[3], blobs, seed=blobs)
+        detections = []
+        for _ in range(30):
+            detections.append(gen.render()[1].tolist())
+            gen.step()
+        for tracked in (False, True):
+            ai = SimpleAI(region, tracker=Tracker() if tracked else None)
+            clock = iter(range(10**9))
+            results["ai/%s/%d" % ("tracked" if tracked else "nearest", blobs)] = time_calls(
+                lambda enemies: ai.decide(enemies, next(clock) / 60.0), detections, iterations
+            )
+    return results
+
+
+def run_capture(iterations=30):
+    results = {}
+    for resolution in ("720p", "1080p"):
+        name = "capture/%s" % resolution
+        try:
+            with Capture((0, 0) + RESOLUTIONS[resolution]) as cap:
+                results[name] = time_calls(lambda _: cap.get_frame(), [None], iterations)
+        except Exception as e:
+            results[name] = {"skipped": "%s: %s" % (type(e).__name__, e)}
+    return results
+
+
+def run_sim(seconds=10.0):
+    from .sim import run_case
+
+    results = {}
+    for tracked in (False, True):
+        for noise in (0, 8):
+            name = "sim/%s/n%d" % ("tracked" if tracked else "nearest", noise)
+            results[name] = run_case(seed=1, seconds=seconds, tracker=tracked, noise=noise)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, floor_ms=COMPARE_FLOOR_MS):
+    """Return (case, value, limit) for every case whose p50 regressed past its limit.
+
+    The limit is baseline * (1 + tolerance), but at least baseline + floor_ms.
+    """
+    failures = []
+    for case, stats in results.items():
+        base = baseline.get(case, {}).get("p50_ms")
+        value = stats.get("p50_ms")
+        if base is None or value is None:
+            continue
+        limit = max(base * (1 + tolerance), base + floor_ms)
+        if value > limit:
+            failures.append((case + ".p50_ms", value, limit))
+    return failures
+
+
+def _controller():
+    backend = RecordingBackend()
+    ctrl = Controller((0, 0, 1, 1), backend=backend)
+    return ctrl, backend
+
+
+def bench_call_overhead(ctrl, backend, calls=200):
+    """Time it takes a non-blocking maneuver call to return (scheduling cost only)."""
+    costs = []
+    holds = []
+    for _ in range(calls):
+        t = time.perf_counter_ns()
+        holds.append(ctrl.deploy_flares(hold_seconds=0.001, block=False))
+        costs.append((time.perf_counter_ns() - t) / 1e3)
+    for h in holds:
+        h.wait(1.0)
+    backend.clear()
+    return summarize(costs)
+
+
+def bench_hold_accuracy(ctrl, backend, durations=(0.005, 0.02, 0.05), repeats=10):
+    """Measured press-to-release time minus the requested hold, for blocking holds."""
+    errors = []
+    for _ in range(repeats):
+        for d in durations:
+            backend.clear()
+            ctrl.roll_left(hold_seconds=d, block=True)
+            (_, down, up), = backend.holds()
+            errors.append((up - down) / 1e6 - d * 1000)
+    backend.clear()
+    return summarize(errors)
+
+
+def bench_cancel_latency(ctrl, backend, repeats=20):
+    """Time from cancel_mission() to the held key's release."""
+    latencies = []
+    for _ in range(repeats):
+        backend.clear()
+        ctrl.afterburner(hold_seconds=5.0, block=False)
+        time.sleep(0.01)
+        t = time.perf_counter_ns()
+        ctrl.cancel_mission()
+        (_, _, up), = backend.holds()
+        latencies.append((up - t) / 1e6)
+    backend.clear()
+    return summarize(latencies)
+
+
+def bench_mission(ctrl, backend, name="loiter", time_scale=0.01):
+    """Run a mission timeline sped up by `time_scale`; planned vs actual timing."""
+    report = ctrl.run_mission(name, time_scale=time_scale)
+    backend.clear()
+    return report
+
+
+def bench_weapon_loop(ctrl, backend, interval=0.02, seconds=0.6, hold=0.1):
+    """Deviation of weapon-loop shot spacing from hold + interval."""
+    backend.clear()
+    ctrl.start_weapon_loop(interval=interval)
+    time.sleep(seconds)
+    ctrl.stop_weapon_loop()
+    presses = np.array([e.t_ns for e in backend.events if e.kind == "press"], dtype=np.float64)
+    backend.clear()
+    spacing = np.diff(presses) / 1e6
+    return summarize(np.abs(spacing - (hold + interval) * 1000))
+
+
+def run_input(thresholds=INPUT_THRESHOLDS):
+    ctrl, backend = _controller()
+    try:
+        mission = bench_mission(ctrl, backend)
+        results = {
+            "call_overhead_us": bench_call_overhead(ctrl, backend),
+            "hold_error_ms": bench_hold_accuracy(ctrl, backend),
+            "cancel_latency_ms": bench_cancel_latency(ctrl, backend),
+            "mission_press_error_ms": {"mean": mission["press"]["mean_ms"], "max": mission["press"]["max_ms"]},
+            "mission_release_error_ms": {"mean": mission["release"]["mean_ms"], "max": mission["release"]["max_ms"]},
+            "mission_duration_s": {"planned": mission["planned_s"], "actual": mission["actual_s"]},
+            "weapon_interval_error_ms": bench_weapon_loop(ctrl, backend),
+            "dispatcher_jitter_ms": ctrl.dispatcher.jitter(),
+        }
+    finally:
+        ctrl.close()
+    return results, check(results, thresholds)
+
+
+def check(results, thresholds):
+    """Return a list of (metric, value, limit) for every result worse than its threshold."""
+    failures = []
+    for metric, limit in thresholds.items():
+        group, stat = metric.rsplit(".", 1)
+        value = results.get(group, {}).get(stat)
+        if value is not None and value > limit:
+            failures.append((metric, value, limit))
+    return failures
+
+
+def _print(results, failures):
+    failed = {m for m, _, _ in failures}
+    for group, stats in results.items():
+        if group == "dispatcher_jitter_ms":
+            continue
+        parts = ", ".join("%s=%.3f" % (k, v) if isinstance(v, float) else "%s=%s" % (k, v) for k, v in stats.items())
+        flag = " FAIL" if any(m.startswith(group + ".") for m in failed) else ""
+        print("%-34s %s%s" % (group, parts, flag))
+    for metric, value, limit in failures:
+        print("FAIL %s = %.3f (limit %.3f)" % (metric, value, limit))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="wingman headless benchmarks")
+    parser.add_argument("suite", choices=["input", "vision", "ai", "capture", "hotpath", "sim"])
+    parser.add_argument("--engine", default="components", help="Vision engine for the vision suite")
+    parser.add_argument("--quick", action="store_true", help="Only 720p and 1080p in the vision suite")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed calls per vision/capture case")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail if a case's p50 regressed past the baseline in PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown vs the baseline (0.25 = 25%%)")
+    parser.add_argument("--floor-ms", type=float, default=COMPARE_FLOOR_MS, help="Allowed p50 slowdown in ms regardless of --tolerance")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write this run's results to PATH as the new baseline")
+    parser.add_argument("--json", metavar="PATH", help="Also write results to PATH")
+    parser.add_argument(
+        "--limit", metavar="METRIC=VALUE", action="append", default=[], help="Override an input threshold, e.g. hold_error_ms.p99=2"
+    )
+    args = parser.parse_args(argv)
+    thresholds = dict(INPUT_THRESHOLDS)
+    for item in args.limit:
+        metric, _, value = item.partition("=")
+        if metric not in thresholds:
+            parser.error("unknown --limit metric %r (expected one of %s)" % (metric, ", ".join(INPUT_THRESHOLDS)))
+        try:
+            thresholds[metric] = float(value)
+        except ValueError:
+            parser.error("--limit %s needs a number" % item)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    if args.suite == "input":
+        results, failures = run_input(thresholds)
+    else:
+        results = {}
+        if args.suite in ("vision", "hotpath"):
+            results.update(run_vision(args.engine, args.quick, args.iterations))
+        if args.suite in ("ai", "hotpath"):
+            results.update(run_ai())
+        if args.suite in ("capture", "hotpath"):
+            results.update(run_capture(args.iterations))
+        if args.suite == "sim":
+            results.update(run_sim())
+        failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(results, json.load(f).get("results", {}), args.tolerance, args.floor_ms)
+    _print(results, failures)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump({"suite": args.suite, "results": results, "failures": failures}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
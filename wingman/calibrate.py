@@ -0,0 +1,322 @@
+"""HSV auto-calibration for `enemy_hsv` from recorded frames and labelled marker points.
+
+    python -m wingman.calibrate labels.yaml --out calibrated_hsv.yaml
+
+labels.yaml names recordings and the marker centres in some of their frames:
+
+    radius: 5                      # marker pixels are within this radius of a point
+    frames:
+      - {recording: session.wmrec, frame: 12, points: [[812, 400], [1020, 377]]}
+      - {recording: session.wmrec, frame: 40, points: []}    # no markers in this frame
+    background: [menus.wmrec]      # optional recordings with no markers at all
+
+Pixels near the points are foreground; every other pixel of a labelled frame (and of
+the background recordings) is background, so label every marker in a labelled frame.
+Both sets go into 3D HSV histograms with one `cv2.calcHist` call per frame on a
+strided copy, so thousands of 1080p frames take seconds. Summed-area tables of the
+two histograms give the foreground and background pixel counts of any HSV box in
+constant time, and a coordinate search over the six box faces picks the bounds with
+the best F-score.
+Precision and recall are pixel-level: the share of thresholded pixels that belong to
+markers, and the share of marker pixels inside the box.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from collections import defaultdict
+
+import cv2
+import numpy as np
+import yaml
+
+from .recording import ReplaySource
+
+
+logger = logging.getLogger(__name__)
+
+# histogram bins per channel and their width in OpenCV HSV units (H 0-179, S and V 0-255)
+BINS = (90, 64, 64)
+WIDTHS = (2, 4, 4)
+_RANGES = [0, 180, 0, 256, 0, 256]
+
+
+class Histograms:
+    """Foreground and background HSV histograms accumulated frame by frame.
+
+    Args:
+        radius: marker radius in pixels around each labelled point
+        stride: background pixels are sampled every `stride` pixels in x and y
+    """
+
+    def __init__(self, radius: int = 5, stride: int = 4):
+        self.radius = int(radius)
+        self.stride = max(1, int(stride))
+        # foreground HSV pixels, histogrammed in one go when asked for
+        self._fg_pixels = []
+        self._fg = None
+        self._bg = np.zeros(BINS, dtype=np.float64)
+        # calcHist accumulates in float32, which stops counting exactly past 2**24 per
+        # bin, so partial sums are flushed into the float64 totals every few frames
+        self._bg32 = np.zeros(BINS, dtype=np.float32)
+        self._pending = 0
+        self.frames = 0
+        self.points = 0
+        self._masks = {}
+
+    @property
+    def fg(self):
+        if self._fg is None:
+            if not self._fg_pixels:
+                return np.zeros(BINS, dtype=np.float64)
+            pixels = np.concatenate(self._fg_pixels)
+            self._fg_pixels = [pixels]
+            self._fg = cv2.calcHist([pixels.reshape(-1, 1, 3)], [0, 1, 2], None, list(BINS), _RANGES).astype(np.float64)
+        return self._fg
+
+    @property
+    def bg(self):
+        """Background histogram, scaled back up from the sampled pixels."""
+        self._flush()
+        return self._bg * (self.stride * self.stride)
+
+    def _flush(self):
+        if self._pending:
+            self._bg += self._bg32
+            self._bg32.fill(0)
+            self._pending = 0
+
+    def _accumulate_bg(self, hsv, mask=None):
+        if self._pending + hsv.shape[0] * hsv.shape[1] >= 1 << 24:
+            self._flush()
+        cv2.calcHist([hsv], [0, 1, 2], mask, list(BINS), _RANGES, hist=self._bg32, accumulate=True)
+        self._pending += hsv.shape[0] * hsv.shape[1]
+
+    def add(self, frame, points=()):
+        """Add one BGR frame with marker centres `points` [(x, y), ...]."""
+        self.frames += 1
+        s = self.stride
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (w // s, h // s), interpolation=cv2.INTER_NEAREST) if s > 1 else frame
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        if not len(points):
+            self._accumulate_bg(hsv)
+            return
+        # background excludes a generous ring around each marker (anti-aliased edges)
+        keep = self._masks.get(hsv.shape[:2])
+        if keep is None:
+            keep = self._masks[hsv.shape[:2]] = np.empty(hsv.shape[:2], dtype=np.uint8)
+        keep.fill(255)
+        for x, y in points:
+            cv2.circle(keep, (int(x) // s, int(y) // s), (2 * self.radius) // s + 1, 0, -1)
+        self._accumulate_bg(hsv, keep)
+        # foreground from full-resolution crops around each point
+        r = self.radius
+        for x, y in points:
+            x, y = int(x), int(y)
+            x0, y0, x1, y1 = max(x - r, 0), max(y - r, 0), min(x + r + 1, w), min(y + r + 1, h)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            crop = cv2.cvtColor(np.ascontiguousarray(frame[y0:y1, x0:x1]), cv2.COLOR_BGR2HSV)
+            disk = np.zeros(crop.shape[:2], dtype=np.uint8)
+            cv2.circle(disk, (x - x0, y - y0), r, 255, -1)
+            self._fg_pixels.append(crop[disk > 0])
+            self._fg = None
+            self.points += 1
+
+
+def _table(hist):
+    """Zero-padded 3D summed-area table: box sums in O(1)."""
+    table = np.zeros(tuple(n + 1 for n in hist.shape), dtype=np.float64)
+    table[1:, 1:, 1:] = hist.cumsum(0).cumsum(1).cumsum(2)
+    return table
+
+
+def box_sum(table, box):
+    """Sum of the histogram over inclusive bin box (h0, h1, s0, s1, v0, v1); entries may be arrays."""
+    h0, h1, s0, s1, v0, v1 = box
+    h1, s1, v1 = h1 + 1, s1 + 1, v1 + 1
+    return (
+        table[h1, s1, v1] - table[h0, s1, v1] - table[h1, s0, v1] - table[h1, s1, v0]
+        + table[h0, s0, v1] + table[h0, s1, v0] + table[h1, s0, v0] - table[h0, s0, v0]
+    )
+
+
+def f_score(tp, fp, total, beta=1.0):
+    precision = np.divide(tp, tp + fp, out=np.zeros_like(tp, dtype=np.float64), where=(tp + fp) > 0)
+    recall = tp / total if total else np.zeros_like(tp, dtype=np.float64)
+    b2 = beta * beta
+    denom = b2 * precision + recall
+    return np.divide((1 + b2) * precision * recall, denom, out=np.zeros_like(denom), where=denom > 0), precision, recall
+
+
+def _percentile_box(hist, low, high):
+    box = []
+    for axis in range(3):
+        marginal = hist.sum(axis=tuple(a for a in range(3) if a != axis)).cumsum()
+        marginal /= marginal[-1]
+        box += [int(np.searchsorted(marginal, low)), int(np.searchsorted(marginal, high))]
+    return box
+
+
+def search(fg, bg, beta=1.0, max_rounds=50, tolerance=1e-4):
+    """Best (box, score, precision, recall) over HSV bin boxes by coordinate ascent.
+
+    Each face moves to the best-scoring position. When a range of positions scores
+    within `tolerance` of the best, saturation and value faces take the middle one,
+    leaving the widest margin between foreground and background, while hue faces stay
+    tight around the foreground, since hues missing from the background sample may
+    still show up in game. Hue is rotated so the foreground's mean hue sits mid-range,
+    so red markers whose hues straddle 0/180 still form one contiguous box. Returns the
+    box in rotated bins together with the rotation.
+    """
+    total = fg.sum()
+    if not total:
+        raise ValueError("no foreground pixels: check the labelled points and radius")
+    hue = fg.sum(axis=(1, 2))
+    # circular mean of the foreground hue, in bins
+    angle = np.angle((hue * np.exp(2j * np.pi * np.arange(BINS[0]) / BINS[0])).sum())
+    shift = BINS[0] // 2 - int(round(angle / (2 * np.pi) * BINS[0])) % BINS[0]
+    fg_t = _table(np.roll(fg, shift, axis=0))
+    bg_t = _table(np.roll(bg, shift, axis=0))
+    rolled = np.roll(fg, shift, axis=0)
+
+    best = None
+    for low, high in ((0.01, 0.99), (0.05, 0.95), (0.1, 0.9)):
+        box = _percentile_box(rolled, low, high)
+        score = f_score(box_sum(fg_t, box), box_sum(bg_t, box), total, beta)[0]
+        for _ in range(max_rounds):
+            improved = False
+            for face in range(6):
+                axis, upper = divmod(face, 2)
+                lo, hi = (box[2 * axis], BINS[axis] - 1) if upper else (0, box[2 * axis + 1])
+                candidates = np.arange(lo, hi + 1)
+                trial = [np.full(len(candidates), v) for v in box]
+                trial[face] = candidates
+                scores = f_score(box_sum(fg_t, trial), box_sum(bg_t, trial), total, beta)[0]
+                top = scores.max()
+                plateau = np.flatnonzero(scores >= top - tolerance)
+                if axis == 0:
+                    i = int(plateau[-1] if not upper else plateau[0])
+                else:
+                    i = int(plateau[len(plateau) // 2])
+                if top > score + tolerance or (candidates[i] != box[face] and scores[i] >= score - tolerance):
+                    improved = improved or top > score + tolerance
+                    box[face] = int(candidates[i])
+                    score = float(scores[i])
+            if not improved:
+                break
+        if best is None or score > best[1]:
+            best = (list(box), float(score))
+    box = best[0]
+    _, precision, recall = f_score(box_sum(fg_t, box), box_sum(bg_t, box), total, beta)
+    return box, shift, best[1], float(precision), float(recall)
+
+
+def to_hsv_bounds(box, shift):
+    """(lower, upper) OpenCV HSV bounds of a rotated bin box; lower hue > upper hue means it wraps."""
+    h0, h1, s0, s1, v0, v1 = box
+    hw, sw, vw = WIDTHS
+    lower = [((h0 - shift) % BINS[0]) * hw, s0 * sw, v0 * vw]
+    upper = [((h1 - shift) % BINS[0]) * hw + hw - 1, s1 * sw + sw - 1, v1 * vw + vw - 1]
+    return lower, upper
+
+
+def evaluate(fg, bg, lower, upper, beta=1.0):
+    """(score, precision, recall) of existing bounds against the histograms."""
+    lo = [int(v) // w for v, w in zip(lower, WIDTHS)]
+    hi = [int(v) // w for v, w in zip(upper, WIDTHS)]
+    if lo[0] > hi[0]:  # wrapping hue range: rotate it into one piece
+        shift = BINS[0] - lo[0]
+        fg, bg = np.roll(fg, shift, axis=0), np.roll(bg, shift, axis=0)
+        lo[0], hi[0] = 0, hi[0] + shift
+    box = [lo[0], hi[0], lo[1], hi[1], lo[2], hi[2]]
+    score, precision, recall = f_score(box_sum(_table(fg), box), box_sum(_table(bg), box), fg.sum(), beta)
+    return float(score), float(precision), float(recall)
+
+
+def load_labels(path):
+    """Read a labels file; returns (radius, {recording: {frame: points}}, [background recordings])."""
+    with open(path, "r") as f:
+        spec = yaml.safe_load(f) or {}
+    base = os.path.dirname(os.path.abspath(path))
+    frames = defaultdict(dict)
+    for entry in spec.get("frames") or []:
+        recording = os.path.join(base, os.path.expanduser(entry["recording"]))
+        frames[recording][int(entry["frame"])] = [tuple(p) for p in entry.get("points") or []]
+    background = [os.path.join(base, os.path.expanduser(p)) for p in spec.get("background") or []]
+    return spec.get("radius", 5), dict(frames), background
+
+
+def accumulate(frames, background=(), radius=5, stride=4):
+    """Histograms over the labelled frames and the background recordings."""
+    hists = Histograms(radius, stride)
+    for path, labelled in frames.items():
+        with ReplaySource(path) as source:
+            for i, points in sorted(labelled.items()):
+                if i >= len(source):
+                    logger.warning("Calibrate: %s has no frame %d", path, i)
+                    continue
+                hists.add(source.frames[i], points)
+    for path in background:
+        with ReplaySource(path) as source:
+            for i in range(len(source)):
+                hists.add(source.frames[i])
+    return hists
+
+
+def snippet(lower, upper, hists, score, precision, recall, beta):
+    lines = [
+        "# python -m wingman.calibrate: %d frames, %d marker points" % (hists.frames, hists.points),
+        "# pixel precision %.3f, recall %.3f, F%g %.3f" % (precision, recall, beta, score),
+    ]
+    if lower[0] > upper[0]:
+        lines.append("# hue wraps past 180 (lower hue > upper hue)")
+    lines += [
+        "enemy_hsv:",
+        "  lower: [%d, %d, %d]" % tuple(lower),
+        "  upper: [%d, %d, %d]" % tuple(upper),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit enemy_hsv to labelled marker points in recordings")
+    parser.add_argument("labels", help="Labels file (see module docstring)")
+    parser.add_argument("--config", default="wingman/config.yaml", help="Config whose current enemy_hsv is scored for comparison")
+    parser.add_argument("--out", default="calibrated_hsv.yaml", help="Where to write the config snippet")
+    parser.add_argument("--stride", type=int, default=4, help="Background pixel sampling stride")
+    parser.add_argument("--beta", type=float, default=1.0, help="F-beta weight; > 1 favours recall, < 1 precision")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    radius, frames, background = load_labels(args.labels)
+    start = time.perf_counter()
+    hists = accumulate(frames, background, radius, args.stride)
+    built = time.perf_counter()
+    box, shift, score, precision, recall = search(hists.fg, hists.bg, args.beta)
+    lower, upper = to_hsv_bounds(box, shift)
+    logger.info(
+        "Calibrate: %d frames, %d points histogrammed in %.2fs, search %.3fs",
+        hists.frames,
+        hists.points,
+        built - start,
+        time.perf_counter() - built,
+    )
+    if os.path.exists(args.config):
+        with open(args.config, "r") as f:
+            current = (yaml.safe_load(f) or {}).get("enemy_hsv")
+        if current:
+            s, p, r = evaluate(hists.fg, hists.bg, current["lower"], current["upper"], args.beta)
+            logger.info("Calibrate: current %s..%s precision %.3f recall %.3f F %.3f", current["lower"], current["upper"], p, r, s)
+    text = snippet(lower, upper, hists, score, precision, recall, args.beta)
+    with open(args.out, "w") as f:
+        f.write(text)
+    print(text, end="")
+    logger.info("Calibrate: wrote %s", args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
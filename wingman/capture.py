@@ -1,23 +1,406 @@
+import time
+import logging
+import threading
+from collections import namedtuple
+
+import cv2
 import numpy as np
 from mss import mss
 
+from . import flightrec
+
+
+logger = logging.getLogger(__name__)
+
+# A captured frame: monotonically increasing sequence number, perf_counter()
+# timestamp taken when the grab started, and the BGR image. With capture ROIs,
+# `image` is the "vision" ROI and `views` maps every ROI name to its image.
+Frame = namedtuple("Frame", ["seq", "timestamp", "image", "views"], defaults=(None,))
+
+# Fixed cost of one extra screen grab, expressed in pixels, used to decide whether
+# nearby ROIs are cheaper to fetch as one bounding grab or as separate grabs.
+GRAB_OVERHEAD_PX = 200_000
+
+
+def _monitor_for(region):
+    return {
+        "left": region[0],
+        "top": region[1],
+        "width": region[2],
+        "height": region[3],
+    }
+
+
+def _grab_bgr(sct, monitor, dst=None):
+    """Grab `monitor` with `sct` and return a contiguous BGR image.
+
+    mss hands back BGRA bytes; wrapping them with `np.frombuffer` avoids a copy and
+    `cv2.cvtColor` drops alpha in one pass, writing into `dst` when one is given.
+    """
+    s = sct.grab(monitor)
+    bgra = np.frombuffer(s.raw, dtype=np.uint8).reshape(s.height, s.width, 4)
+    if dst is None:
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+    return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=dst)
+
+
+def _area(rect):
+    return rect[2] * rect[3]
+
+
+def _union(a, b):
+    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def plan_grabs(rois, grab_overhead_px: int = GRAB_OVERHEAD_PX):
+    """Group ROIs into grabs; returns [(rect, [names]), ...].
+
+    Starts with one grab per ROI and keeps merging the pair whose bounding box saves
+    the most, where a grab costs `grab_overhead_px` plus its area.
+    """
+    groups = [(tuple(rect), [name]) for name, rect in rois.items()]
+    while len(groups) > 1:
+        best = None
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                merged = _union(groups[i][0], groups[j][0])
+                saving = grab_overhead_px + _area(groups[i][0]) + _area(groups[j][0]) - _area(merged)
+                if saving > 0 and (best is None or saving > best[0]):
+                    best = (saving, i, j, merged)
+        if best is None:
+            break
+        _, i, j, merged = best
+        names = groups[i][1] + groups[j][1]
+        del groups[j], groups[i]
+        groups.append((merged, names))
+    return groups
+
+
+class RoiLayout:
+    """Where each named ROI comes from: which grab, and which slice of it.
+
+    ROIs are (x, y, w, h) relative to the capture region. Without ROIs the layout is
+    a single grab of the whole region.
+
+    Args:
+        region: (left, top, width, height) on screen
+        rois: {name: (x, y, w, h)} or None for the whole region
+        grab_overhead_px: see `plan_grabs`
+    """
+
+    def __init__(self, region, rois=None, grab_overhead_px: int = GRAB_OVERHEAD_PX):
+        self.region = region
+        self.rois = {name: tuple(int(v) for v in rect) for name, rect in (rois or {}).items()}
+        for name, (x, y, w, h) in self.rois.items():
+            if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > region[2] or y + h > region[3]:
+                raise ValueError("capture ROI %r %s is outside the region %s" % (name, (x, y, w, h), region))
+        if self.rois:
+            self.groups = plan_grabs(self.rois, grab_overhead_px)
+        else:
+            self.groups = [((0, 0, region[2], region[3]), [])]
+        self.monitors = [_monitor_for((region[0] + x, region[1] + y, w, h)) for (x, y, w, h), _ in self.groups]
+        self.pixels = sum(_area(rect) for rect, _ in self.groups)
+
+    def allocate(self):
+        """One preallocated BGR buffer per grab."""
+        return [np.empty((h, w, 3), dtype=np.uint8) for (_, _, w, h), _ in self.groups]
+
+    def views(self, buffers):
+        """{name: view} slicing each ROI out of its grab buffer (no copies); None without ROIs."""
+        if not self.rois:
+            return None
+        out = {}
+        for ((gx, gy, _, _), names), buf in zip(self.groups, buffers):
+            for name in names:
+                x, y, w, h = self.rois[name]
+                out[name] = buf[y - gy:y - gy + h, x - gx:x - gx + w]
+        return out
+
+    def grab(self, sct, buffers=None):
+        """Grab every group; returns the list of BGR images (written into `buffers` if given)."""
+        if buffers is None:
+            return [_grab_bgr(sct, m) for m in self.monitors]
+        for m, buf in zip(self.monitors, buffers):
+            if _grab_bgr(sct, m, dst=buf) is not buf:
+                raise ValueError("grab size does not match capture region %s" % (self.region,))
+        return buffers
+
+    def frame(self, seq, ts, buffers, views=None):
+        """Build a Frame from grabbed buffers; `views` may be passed in if already sliced."""
+        if not self.rois:
+            return Frame(seq, ts, buffers[0])
+        if views is None:
+            views = self.views(buffers)
+        return Frame(seq, ts, views["vision"], views)
+
+    def describe(self):
+        if not self.rois:
+            return "whole region"
+        share = 100.0 * self.pixels / _area(self.region)
+        return "%d ROIs in %d grabs, %d px per frame (%.0f%% of the region)" % (
+            len(self.rois), len(self.groups), self.pixels, share
+        )
+
+
+def subviews(views, prefix):
+    """{name: view} for the ROIs named `prefix` + name, e.g. subviews(frame.views, "hud.")."""
+    if not views:
+        return None
+    return {name[len(prefix):]: v for name, v in views.items() if name.startswith(prefix)}
+
+
+class FrameSource:
+    """Base class for anything that produces BGR frames (live screen, recording, ...).
+
+    Subclasses implement `read()`; `get_frame()` is the image-only shortcut the main
+    loop uses. Both return None once a finite source is exhausted.
+    """
+
+    # True for sources that end (recordings); live sources only ever time out
+    finite = False
+    # Optional callable(seconds) run after every screen grab, e.g. Telemetry.recorder("capture")
+    on_grab = None
+
+    def read(self):
+        """Return the next Frame, or None when the source has no more frames."""
+        raise NotImplementedError
 
-class Capture:
-    def __init__(self, region):
+    def get_frame(self):
+        """Return the next BGR image, or None when the source has no more frames."""
+        frame = self.read()
+        return None if frame is None else frame.image
+
+    def release(self, frame):
+        """Tell the source a Frame from `acquire` is no longer needed (no-op by default)."""
+
+    def acquire(self, after_seq: int = 0, timeout: float | None = None):
+        """Return a Frame newer than `after_seq` that stays valid until `release`d.
+
+        Sources that allocate a fresh image per frame simply return `read()`.
+        """
+        return self.read()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Capture(FrameSource):
+    """Grab the region (or only its ROIs, see RoiLayout) on every call.
+
+    With `rois`, one of them must be named "vision"; it becomes `Frame.image`.
+    """
+
+    def __init__(self, region, rois=None, grab_overhead_px: int = GRAB_OVERHEAD_PX):
+        if rois and "vision" not in rois:
+            raise ValueError('capture ROIs need a "vision" entry')
         self.region = region
+        self.layout = RoiLayout(region, rois, grab_overhead_px)
         self.sct = mss()
+        self._monitor = _monitor_for(region)
+        self._seq = 0
+
+    def read(self):
+        ts = time.perf_counter()
+        buffers = self.layout.grab(self.sct)
+        grabbed = time.perf_counter() - ts
+        if self.on_grab is not None:
+            self.on_grab(grabbed)
+        self._seq += 1
+        flightrec.record(flightrec.FRAME, self._seq, ts=ts, dur=grabbed)
+        return self.layout.frame(self._seq, ts, buffers)
 
     def get_frame(self):
-        """Return a BGR image of the configured region."""
-        monitor = {
-            "left": self.region[0],
-            "top": self.region[1],
-            "width": self.region[2],
-            "height": self.region[3],
-        }
-        s = self.sct.grab(monitor)
-        img = np.array(s)
-        # mss returns BGRA
-        img = img[:, :, :3]
-        # convert to BGR (mss already returns BGRA/BGR ordering for most platforms)
-        return img
+        """Return a BGR image of the configured region (the "vision" ROI with ROIs)."""
+        if self.on_grab is not None or self.layout.rois:
+            return self.read().image
+        return _grab_bgr(self.sct, self._monitor)
+
+    def close(self):
+        self.sct.close()
+
+
+class ThreadedCapture(FrameSource):
+    """Capture that grabs on a background thread into a ring of preallocated BGR buffers.
+
+    The grab thread always writes into a slot that is neither the newest published frame
+    nor pinned by a consumer, so consumers never wait on a grab and never see a buffer
+    being overwritten under them. Frames that are superseded before anyone asked for
+    them are simply dropped (counted in `dropped`).
+
+    Images returned by `latest()` / `get_frame()` stay valid until the next call to either.
+    Frames from `acquire()` stay valid until `release()`d; keep at most ring_size - 2
+    acquired at once or the grab thread has to wait for a free slot.
+    """
+
+    def __init__(self, region, ring_size: int = 3, max_fps: float = 0.0, rois=None, grab_overhead_px: int = GRAB_OVERHEAD_PX):
+        if ring_size < 3:
+            raise ValueError("ring_size must be at least 3")
+        if rois and "vision" not in rois:
+            raise ValueError('capture ROIs need a "vision" entry')
+        self.region = region
+        self.layout = RoiLayout(region, rois, grab_overhead_px)
+        self._min_interval = 1.0 / max_fps if max_fps else 0.0
+        # per slot: the grab buffers and their ROI views, sliced once up front
+        self._buffers = [self.layout.allocate() for _ in range(ring_size)]
+        self._views = [self.layout.views(bufs) for bufs in self._buffers]
+        self._images = [self.layout.frame(0, 0.0, bufs, views).image for bufs, views in zip(self._buffers, self._views)]
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._pins = [0] * ring_size
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._latest = None
+        self._latest_slot = -1
+        self._reader_frame = None
+        self._consumed_seq = 0
+        self._error = None
+        self.dropped = 0
+
+    def start(self):
+        """Start the grab thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        logger.info("Capture: grab thread started (%d slots, %s)", len(self._buffers), self.layout.describe())
+
+    def stop(self, timeout: float = 1.0):
+        """Stop the grab thread and wait for it to exit."""
+        self._stop.set()
+        with self._new_frame:
+            self._new_frame.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    close = stop
+
+    def _next_slot(self):
+        n = len(self._buffers)
+        for i in range(1, n + 1):
+            slot = (self._latest_slot + i) % n
+            if slot != self._latest_slot and not self._pins[slot]:
+                return slot
+        return None
+
+    def _slot_of(self, frame):
+        for i, image in enumerate(self._images):
+            if image is frame.image:
+                return i
+        raise ValueError("frame does not belong to this capture")
+
+    def _run(self):
+        # mss keeps per-thread OS handles, so the grab thread owns its own instance.
+        sct = mss()
+        try:
+            next_grab = time.perf_counter()
+            while not self._stop.is_set():
+                if self._min_interval:
+                    delay = next_grab - time.perf_counter()
+                    if delay > 0 and self._stop.wait(delay):
+                        break
+                    next_grab = max(next_grab + self._min_interval, time.perf_counter())
+                with self._lock:
+                    slot = self._next_slot()
+                if slot is None:
+                    # every other slot is pinned by a slow consumer; try again shortly
+                    self._stop.wait(0.001)
+                    continue
+                ts = time.perf_counter()
+                self.layout.grab(sct, self._buffers[slot])
+                grabbed = time.perf_counter() - ts
+                if self.on_grab is not None:
+                    self.on_grab(grabbed)
+                flightrec.record(flightrec.FRAME, self._seq + 1, ts=ts, dur=grabbed)
+                with self._lock:
+                    if self._latest is not None and self._latest.seq > self._consumed_seq:
+                        self.dropped += 1
+                    self._seq += 1
+                    self._latest = self.layout.frame(self._seq, ts, self._buffers[slot], self._views[slot])
+                    self._latest_slot = slot
+                    self._new_frame.notify_all()
+                self._ready.set()
+        except Exception as e:
+            logger.exception("Capture: grab thread failed")
+            # readers get the error instead of the last frame over and over
+            with self._new_frame:
+                self._error = e
+                self._new_frame.notify_all()
+            self._ready.set()
+        finally:
+            sct.close()
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError("capture grab thread failed: %s" % self._error) from self._error
+
+    def _pin_latest(self):
+        frame = self._latest
+        self._pins[self._latest_slot] += 1
+        self._consumed_seq = frame.seq
+        return frame
+
+    def latest(self):
+        """Return the newest Frame without blocking, or None if nothing has been grabbed yet.
+
+        Raises RuntimeError once the grab thread has failed.
+        """
+        with self._lock:
+            self._check()
+            if self._latest is None:
+                return None
+            if self._reader_frame is not None:
+                self._pins[self._slot_of(self._reader_frame)] -= 1
+            self._reader_frame = self._pin_latest()
+            return self._reader_frame
+
+    def acquire(self, after_seq: int = 0, timeout: float | None = None):
+        """Wait up to `timeout` for a frame newer than `after_seq` and pin it until `release`.
+
+        Returns None on timeout or once the capture is stopped; raises RuntimeError
+        once the grab thread has failed.
+        """
+        if self._thread is None and not self._stop.is_set():
+            self.start()
+        with self._new_frame:
+            if not self._new_frame.wait_for(
+                lambda: self._stop.is_set() or self._error is not None or (self._latest is not None and self._latest.seq > after_seq),
+                timeout,
+            ):
+                return None
+            self._check()
+            if self._stop.is_set():
+                return None
+            return self._pin_latest()
+
+    def release(self, frame):
+        with self._lock:
+            self._pins[self._slot_of(frame)] -= 1
+
+    def read(self, timeout: float = 1.0):
+        """Return the newest Frame, starting the grab thread on first use.
+
+        Only the very first call waits (for the first grab to land); after that this
+        returns immediately, possibly the same frame as last time if no new grab finished.
+        """
+        if not self._ready.is_set():
+            self.start()
+            if not self._ready.wait(timeout):
+                raise TimeoutError("no frame captured within %.1fs" % timeout)
+        return self.latest()
+
+    def get_frame(self, timeout: float = 1.0):
+        """Return the newest BGR image (see `read`)."""
+        return self.read(timeout).image
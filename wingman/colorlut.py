@@ -0,0 +1,184 @@
+"""Precomputed BGR -> color-class lookup table.
+
+Instead of converting every frame to HSV and running one `inRange` per color class,
+all classes are folded into a single table indexed by quantized BGR. Each table entry
+is a bit set (bit i = class i), so overlapping ranges are fine and up to seven classes
+come out of one classification pass.
+
+The result is exact: a quantization cell whose colors are not all on the same side of
+every class boundary gets the RECHECK bit instead, and those few pixels are converted
+to HSV and tested individually, so masks match `cv2.inRange` on the HSV frame.
+
+The table is laid out so OpenCV can do the gather: after quantizing to `bits` per
+channel, a BGRA pixel read as two int16 values is exactly (x = b | g << 8, y = r),
+which `cv2.remap` with nearest-neighbour sampling uses as coordinates into the table.
+"""
+import os
+import json
+import hashlib
+import logging
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+MAX_CLASSES = 7
+# table bit of cells that straddle a class boundary; their pixels are classified exactly
+RECHECK = 1 << MAX_CLASSES
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "wingman")
+_FORMAT_VERSION = 2
+
+
+def hsv_ranges(lower, upper):
+    """Split an HSV range into plain inRange bounds: [(lower, upper)], or two when the
+    lower hue is above the upper hue and the range wraps past 180 (for reds)."""
+    lower = np.array(lower, dtype=np.uint8)
+    upper = np.array(upper, dtype=np.uint8)
+    if lower[0] <= upper[0]:
+        return [(lower, upper)]
+    return [
+        (np.array([0, lower[1], lower[2]], np.uint8), upper),
+        (lower, np.array([180, upper[1], upper[2]], np.uint8)),
+    ]
+
+
+def _in_hsv_range(hsv, lower, upper):
+    """inRange that treats lower hue > upper hue as wrapping past 180 (for reds)."""
+    (lo, hi), *rest = hsv_ranges(lower, upper)
+    mask = cv2.inRange(hsv, lo, hi)
+    for lo, hi in rest:
+        cv2.bitwise_or(mask, cv2.inRange(hsv, lo, hi), dst=mask)
+    return mask
+
+
+def _cache_key(classes, bits):
+    blob = json.dumps([_FORMAT_VERSION, bits, classes, cv2.__version__], sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+class ColorLUT:
+    """Lookup table that classifies BGR pixels into named HSV color classes.
+
+    Args:
+        classes: mapping of class name -> {"lower": [h, s, v], "upper": [h, s, v]}
+        bits: quantization per channel (5-7); more bits mean fewer boundary cells to
+            recheck at the cost of a larger table
+    """
+
+    def __init__(self, classes, bits: int = 6, table=None):
+        if not 5 <= bits <= 7:
+            raise ValueError("bits must be between 5 and 7")
+        if not classes or len(classes) > MAX_CLASSES:
+            raise ValueError("need between 1 and %d color classes" % MAX_CLASSES)
+        self.classes = {name: {"lower": list(r["lower"]), "upper": list(r["upper"])} for name, r in classes.items()}
+        self.names = tuple(self.classes)
+        self.bits = bits
+        self._shift = 8 - bits
+        self._mask = int.from_bytes(bytes([(1 << bits) - 1] * 3 + [0]), "little")
+        self.table = self._build() if table is None else table
+        self._work = {}
+
+    @property
+    def key(self):
+        """Hash of everything the table depends on; used to name the cache file."""
+        return _cache_key(self.classes, self.bits)
+
+    def bit(self, name):
+        """Bit value for class `name` in classified label images."""
+        return 1 << self.names.index(name)
+
+    def _build(self):
+        n = 1 << self.bits
+        q = 1 << self._shift
+        # every 24-bit color in [b, g, r] order, converted once
+        b, g, r = np.meshgrid(*(np.arange(256, dtype=np.uint8),) * 3, indexing="ij")
+        colors = np.stack((b, g, r), axis=-1).reshape(256 * 256, 256, 3)
+        del b, g, r
+        hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+        del colors
+        cells = np.zeros((n, n, n), dtype=np.uint8)
+        mixed = np.zeros((n, n, n), dtype=bool)
+        for i, name in enumerate(self.names):
+            c = self.classes[name]
+            inside = (_in_hsv_range(hsv, c["lower"], c["upper"]) > 0).reshape(n, q, n, q, n, q)
+            inside = inside.transpose(0, 2, 4, 1, 3, 5).reshape(n, n, n, q * q * q)
+            every, some = inside.all(axis=-1), inside.any(axis=-1)
+            cells[every] |= 1 << i
+            mixed |= some & ~every
+        cells[mixed] = RECHECK
+        # lay out as table[r, b | g << 8] (see the module docstring); b >= n is never hit
+        table = np.zeros((n, (n - 1) * 256 + n), dtype=np.uint8)
+        qb, qg, qr = np.meshgrid(*(np.arange(n),) * 3, indexing="ij")
+        table[qr, qb | qg << 8] = cells
+        return table
+
+    @classmethod
+    def load_or_build(cls, classes, bits: int = 6, cache_dir=DEFAULT_CACHE_DIR):
+        """Return a ColorLUT for `classes`, reusing a cached table when the config matches."""
+        classes = {name: {"lower": list(r["lower"]), "upper": list(r["upper"])} for name, r in classes.items()}
+        path = None
+        if cache_dir:
+            path = os.path.join(os.path.expanduser(cache_dir), "colorlut-%s.npy" % _cache_key(classes, bits))
+            try:
+                lut = cls(classes, bits, table=np.load(path))
+                logger.info("ColorLUT: loaded %s", path)
+                return lut
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logger.warning("ColorLUT: ignoring unreadable cache %s", path)
+        lut = cls(classes, bits)
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                np.save(path, lut.table)
+                logger.info("ColorLUT: built and cached %s", path)
+            except OSError:
+                logger.warning("ColorLUT: could not write cache %s", path)
+        return lut
+
+    def classify(self, frame, out=None, work=None):
+        """Return an (H, W) uint8 image of class bits for a BGR frame.
+
+        `work` is an (H, W, 4) uint8 buffer for the packed pixels; callers classifying
+        on several threads at once must each pass their own (the default is shared).
+        """
+        h, w = frame.shape[:2]
+        if work is None:
+            work = self._work.get((h, w))
+            if work is None:
+                work = self._work[(h, w)] = np.empty((h, w, 4), dtype=np.uint8)
+        if out is None:
+            out = np.empty((h, w), dtype=np.uint8)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=work)
+        packed = work.view(np.uint32)
+        # quantize all channels and clear alpha in two passes over packed pixels
+        np.right_shift(packed, self._shift, out=packed)
+        np.bitwise_and(packed, self._mask, out=packed)
+        out = cv2.remap(self.table, work.view(np.int16).reshape(h, w, 2), None, cv2.INTER_NEAREST, dst=out)
+        # class bits stay below RECHECK, so max() is a cheap test for boundary pixels
+        if out.max() >= RECHECK:
+            if out.flags.c_contiguous:
+                flat = out.reshape(-1)
+                index = np.flatnonzero(flat >= RECHECK)
+                flat[index] = self._exact(frame[index // w, index % w])
+            else:
+                ys, xs = np.nonzero(out >= RECHECK)
+                out[ys, xs] = self._exact(frame[ys, xs])
+        return out
+
+    def _exact(self, pixels):
+        """Class bits of (N, 3) BGR pixels from their actual HSV values."""
+        hsv = cv2.cvtColor(pixels.reshape(-1, 1, 3), cv2.COLOR_BGR2HSV)
+        labels = np.zeros(len(pixels), dtype=np.uint8)
+        for i, name in enumerate(self.names):
+            c = self.classes[name]
+            labels[_in_hsv_range(hsv, c["lower"], c["upper"]).ravel() > 0] |= 1 << i
+        return labels
+
+    def mask(self, labels, name, out=None):
+        """Binary (0/255) mask of class `name` from a `classify` result."""
+        out = cv2.bitwise_and(labels, self.bit(name), dst=out)
+        return cv2.threshold(out, 0, 255, cv2.THRESH_BINARY, dst=out)[1]
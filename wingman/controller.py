@@ -1,13 +1,12 @@
 import time
 import logging
 import threading
-import pyautogui
 import sys
 
-try:
-    import keyboard as keyboard_module
-except Exception:
-    keyboard_module = None
+from . import flightrec
+from .backends import KeyboardBackend
+from .dispatcher import InputDispatcher
+from .timeline import MissionError, compile_mission, load_missions, run_schedule, timing_report
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +25,22 @@ SWITCH_WEAPON = 'g'
 SPECIAL_ABILITY = 'q'
 TOGGLE_WEAPON_LOOP_KEY = 'x'  # Press X to toggle weapon firing loop
 
+# Mission timeline actions: name -> (key, default hold seconds)
+ACTIONS = {
+    'nose_up': (NOSE_UP_KEY, 2.5),
+    'nose_down': (NOSE_DOWN_KEY, 2.5),
+    'afterburner': (AFTERBURNER_KEY, 2.5),
+    'airbrake': (AIRBRAKE_KEY, 1.0),
+    'roll_left': (ROLL_LEFT_KEY, 0.3),
+    'roll_right': (ROLL_RIGHT_KEY, 0.3),
+    'flares': (DEPLOY_FLARES_KEY, 0.05),
+    'wingsweep': (WINGSWEEP_KEY, 0.5),
+    'machine_gun': (FIRE_MACHINIE_GUN, 1.0),
+    'fire_weapon': (FIRE_ACTIVE_WEAPON, 0.1),
+    'switch_weapon': (SWITCH_WEAPON, 0.1),
+    'special_ability': (SPECIAL_ABILITY, 0.1),
+}
+
 """
 EMOTE1 # Moving to
 EMOTE2 # Help!
@@ -40,7 +55,9 @@ EMOTE10 # Oops!
 """
 
 class Controller:
-    def __init__(self, region, fire_button="left", fire_hold_seconds: float = 0.0, exit_event=None):
+    def __init__(
+        self, region, fire_button="left", fire_hold_seconds: float = 0.0, exit_event=None, missions=None, jet=None, backend=None, dispatcher=None
+    ):
         # region is (left, top, width, height)
         self.region = region
         self.fire_button = fire_button
@@ -49,7 +66,19 @@ class Controller:
         self._mission_lock = threading.Lock()
         self._mission_complete = threading.Event()
         self._mission_cancel = threading.Event()
+        self._mission_holds = []  # dispatcher Holds of the running mission
         self._exit_event = exit_event  # Event to signal program exit
+        # Where keys go (KeyboardBackend by default); every press/release is timed by one dispatcher thread,
+        # unless a dispatcher is passed in (e.g. one on a simulator's virtual clock, driven by process_due)
+        self.backend = backend if backend is not None else KeyboardBackend()
+        if dispatcher is None:
+            dispatcher = InputDispatcher(self.backend.press, self.backend.release).start()
+        self.dispatcher = dispatcher
+        # Mission timelines (missions.yaml by default), compiled on first use per mission
+        self._missions = missions
+        self.jet = jet
+        self._schedules = {}
+        self.last_mission_report = None
         
         # Weapon loop state
         self._weapon_loop_active = False
@@ -57,12 +86,11 @@ class Controller:
         self._weapon_loop_interval = 0.5  # Fire every 0.5 seconds
         
         # Register hotkey for weapon loop toggle
-        if keyboard_module:
-            try:
-                keyboard_module.add_hotkey(TOGGLE_WEAPON_LOOP_KEY, self.toggle_weapon_loop)
+        try:
+            if self.backend.add_hotkey(TOGGLE_WEAPON_LOOP_KEY, self.toggle_weapon_loop):
                 logger.info("Controller: registered hotkey '%s' to toggle weapon loop", TOGGLE_WEAPON_LOOP_KEY)
-            except Exception:
-                logger.exception("Controller: failed to register weapon loop hotkey")
+        except Exception:
+            logger.exception("Controller: failed to register weapon loop hotkey")
 
     def nose_up(self, hold_seconds: float = 2.5, block: bool = True):
         """Nose-up maneuver: presses and holds the configured nose-up key.
@@ -71,7 +99,7 @@ class Controller:
             hold_seconds: How long to hold the key (default 2.5 seconds)
         """
         # Use generic executor to perform the key press
-        self._execute_key_press(NOSE_UP_KEY, hold_seconds=hold_seconds, block=block, action_name='nose_up')
+        return self._execute_key_press(NOSE_UP_KEY, hold_seconds=hold_seconds, block=block, action_name='nose_up')
     
     def nose_down(self, hold_seconds: float = 2.5, block: bool = True):
         """Nose-down maneuver: presses and holds the configured nose-down key.
@@ -80,7 +108,7 @@ class Controller:
             hold_seconds: How long to hold the key (default 2.5 seconds)
         """
         # Use generic executor to perform the key press
-        self._execute_key_press(NOSE_DOWN_KEY, hold_seconds=hold_seconds, block=block, action_name='nose_down')
+        return self._execute_key_press(NOSE_DOWN_KEY, hold_seconds=hold_seconds, block=block, action_name='nose_down')
 
     def afterburner(self, hold_seconds: float = 2.5, block: bool = True):
         """Afterburner: presses and holds the configured afterburner key.
@@ -89,7 +117,7 @@ class Controller:
             hold_seconds: How long to hold the key (default 2.5 seconds)
         """
         # Use generic executor to perform the key press
-        self._execute_key_press(AFTERBURNER_KEY, hold_seconds=hold_seconds, block=block, action_name='afterburner')
+        return self._execute_key_press(AFTERBURNER_KEY, hold_seconds=hold_seconds, block=block, action_name='afterburner')
 
     def _execute_key_press(self, key: str, hold_seconds: float = 2.5, block: bool = True, action_name: str | None = None):
         """Generic key press executor used by maneuvers.
@@ -97,66 +125,56 @@ class Controller:
         Args:
             key: key name to press/release
             hold_seconds: duration to hold the key
-            block: if True, run in current thread; otherwise spawn a daemon thread
+            block: if True, wait until the key is released (or cancelled); otherwise return at once
             action_name: optional label for logging
+
+        Returns:
+            the dispatcher Hold, or None if the input backend is not available
         """
         label = action_name or key
-        logger.debug("Controller: %s - pressing '%s' key for %s seconds", label, key, hold_seconds)
-
-        def _do_press():
-            try:
-                if not keyboard_module:
-                    logger.error("Controller: keyboard library not available for %s", label)
-                    return
-                logger.debug("Controller: using keyboard library for '%s' press", key)
-                keyboard_module.press(key)
-                start = time.time()
-                while (time.time() - start) < hold_seconds:
-                    if self._mission_cancel.is_set():
-                        logger.debug("Controller: %s cancelled", label)
-                        break
-                    time.sleep(0.05)
-                try:
-                    keyboard_module.release(key)
-                except Exception:
-                    logger.exception("Controller: failed to release '%s' key", key)
-                logger.debug("Controller: %s complete", label)
-            except Exception:
-                logger.exception("Controller: %s failed", label)
-
+        if not self.backend.available:
+            logger.error("Controller: %s input backend not available for %s", self.backend.name, label)
+            return None
+        flightrec.record(flightrec.ACTION, int(hold_seconds * 1000), name=label)
+        hold = self.dispatcher.hold(key, hold_seconds, label=label)
         if block:
-            _do_press()
-        else:
-            t = threading.Thread(target=_do_press, daemon=True)
-            t.start()
+            hold.wait()
+        return hold
+
+    def perform(self, action, hold_seconds: float | None = None, block: bool = False, label: str | None = None):
+        """Press the key of a named ACTIONS entry (its default hold unless `hold_seconds` is given)."""
+        key, default_hold = ACTIONS[action]
+        return self._execute_key_press(
+            key, hold_seconds=default_hold if hold_seconds is None else hold_seconds, block=block, action_name=label or action
+        )
 
     def airbrake(self, hold_seconds: float = 1.0, block: bool = True):
         """Apply airbrake by holding the configured airbrake key."""
-        self._execute_key_press(AIRBRAKE_KEY, hold_seconds=hold_seconds, block=block, action_name='airbrake')
+        return self._execute_key_press(AIRBRAKE_KEY, hold_seconds=hold_seconds, block=block, action_name='airbrake')
 
     def roll_left(self, hold_seconds: float = 0.3, block: bool = True):
         """Roll left by holding the configured roll-left key."""
-        self._execute_key_press(ROLL_LEFT_KEY, hold_seconds=hold_seconds, block=block, action_name='roll_left')
+        return self._execute_key_press(ROLL_LEFT_KEY, hold_seconds=hold_seconds, block=block, action_name='roll_left')
 
     def roll_right(self, hold_seconds: float = 0.3, block: bool = True):
         """Roll right by holding the configured roll-right key."""
-        self._execute_key_press(ROLL_RIGHT_KEY, hold_seconds=hold_seconds, block=block, action_name='roll_right')
+        return self._execute_key_press(ROLL_RIGHT_KEY, hold_seconds=hold_seconds, block=block, action_name='roll_right')
 
     def deploy_flares(self, hold_seconds: float = 0.05, block: bool = True):
         """Deploy flares (short press of the configured flares key)."""
-        self._execute_key_press(DEPLOY_FLARES_KEY, hold_seconds=hold_seconds, block=block, action_name='deploy_flares')
+        return self._execute_key_press(DEPLOY_FLARES_KEY, hold_seconds=hold_seconds, block=block, action_name='deploy_flares')
 
     def wingsweep(self, hold_seconds: float = 0.5, block: bool = True):
         """Perform a wingsweep maneuver by pressing the configured wingsweep key."""
-        self._execute_key_press(WINGSWEEP_KEY, hold_seconds=hold_seconds, block=block, action_name='wingsweep')
+        return self._execute_key_press(WINGSWEEP_KEY, hold_seconds=hold_seconds, block=block, action_name='wingsweep')
 
     def fire_machine_gun(self, hold_seconds: float = 1.0, block: bool = True):
         """Fire machine gun by holding the configured machine-gun key."""
-        self._execute_key_press(FIRE_MACHINIE_GUN, hold_seconds=hold_seconds, block=block, action_name='fire_machine_gun')
+        return self._execute_key_press(FIRE_MACHINIE_GUN, hold_seconds=hold_seconds, block=block, action_name='fire_machine_gun')
 
     def fire_active_weapon(self, hold_seconds: float = 0.1, block: bool = True):
         """Activate the currently selected weapon (short press)."""
-        self._execute_key_press(FIRE_ACTIVE_WEAPON, hold_seconds=hold_seconds, block=block, action_name='fire_active_weapon')
+        return self._execute_key_press(FIRE_ACTIVE_WEAPON, hold_seconds=hold_seconds, block=block, action_name='fire_active_weapon')
 
     def start_weapon_loop(self, interval: float | None = None):
         """Start continuously firing the active weapon in a loop.
@@ -214,104 +232,130 @@ class Controller:
             logger.info("Controller: toggling weapon loop ON")
             self.start_weapon_loop()
 
-    def mission_loiter(self):
-        """This mission sequence performs a predefined set of maneuvers for the Aaarvark, it flies up and tries to stay up
-        Compatible Jets: F111, F-14, Mig-23, J20
+    def _schedule(self, name):
+        schedule = self._schedules.get(name)
+        if schedule is None:
+            if self._missions is None:
+                self._missions = load_missions()
+            schedule = self._schedules[name] = compile_mission(self._missions, name, ACTIONS, jet=self.jet)
+            logger.debug("Controller: compiled mission %s (%d holds, %.1fs)", name, len(schedule), schedule.duration)
+        return schedule
+
+    def run_mission(self, name, time_scale: float = 1.0):
+        """Run mission timeline `name` and wait until it finishes, is cancelled, or exit is requested.
+
+        The whole timeline is scheduled on the input dispatcher up front; returns the
+        planned-vs-actual timing report (also logged), or None if a mission was already running.
+        `time_scale` speeds up (< 1) or slows down the whole timeline, e.g. for benchmarks.
         """
         # Check if mission is already running
         acquired = self._mission_lock.acquire(blocking=False)
         if not acquired:
             logger.debug("Controller: mission already in progress, skipping")
-            return
+            return None
+
+        try:
+            schedule = self._schedule(name)
+            if time_scale != 1.0:
+                schedule = schedule.scaled(time_scale)
+        except MissionError:
+            self._mission_lock.release()
+            logger.exception("Controller: cannot compile mission %s", name)
+            return None
 
-        logger.info("Controller: mission_loiter - starting mission sequence")
+        logger.info("Controller: %s - starting mission (%d inputs, %.1fs)", name, len(schedule), schedule.duration)
         self._mission_complete.clear()
         self._mission_cancel.clear()
-
-        def _mission_runner():
-            try:
-                # Execute mission maneuvers (maneuvers log their own activity)
-                self.nose_up(2.0)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after nose_up")
-                    return
-                self.wingsweep()
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after wingsweep")
-                    return
-                self.afterburner(10.0)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after afterburner")
-                    return
-                self.afterburner(10.0)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after afterburner")
-                    return
-                self.wingsweep()
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after wingsweep")
-                    return
-                self.roll_right(4)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after roll_right")
-                    return
-                self.afterburner(10)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after afterburner")
-                    return
-                self.deploy_flares()
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after deploy_flares")
-                    return
-                self.roll_left(10)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after roll_left")
-                    return
-                self.deploy_flares()
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after deploy_flares")
-                    return
-                self.roll_right(30)
-                if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled after roll_right")
-                    return
-                self.roll_left(30)
+        try:
+            if self.backend.available:
+                holds = self._mission_holds = run_schedule(self.dispatcher, schedule)
                 if self._mission_cancel.is_set():
-                    logger.info("Controller: mission cancelled")
-                    return
-                #self.nose_down(4.0)
-                #time.sleep(10.0)  # additional wait time to stabilize
-                logger.info("Controller: mission_loiter - sequence complete")
-            except Exception:
-                logger.exception("Controller: mission_loiter failed")
-            finally:
-                self._mission_complete.set()
-                try:
-                    self._mission_lock.release()
-                except RuntimeError:
-                    pass
-
-        mission_a = threading.Thread(target=_mission_runner, daemon=True)
-        mission_a.start()
-        
-        # Wait for mission to complete or exit requested
-        while not self._mission_complete.is_set():
-            if self._exit_event and self._exit_event.is_set():
-                logger.info("Controller: exit requested, aborting mission wait")
-                self.cancel_mission()
-                break
-            time.sleep(0.05)
+                    self.dispatcher.cancel(holds)  # interrupted while it was being scheduled
+            else:
+                logger.error("Controller: %s input backend not available for mission %s", self.backend.name, name)
+                holds = []
+            # Wait for mission to complete or exit requested
+            for hold in holds:
+                while not hold.wait(0.05):
+                    if self._exit_event and self._exit_event.is_set():
+                        logger.info("Controller: exit requested, aborting mission wait")
+                        self.cancel_mission()
+                if hold.cancelled or self._mission_cancel.is_set():
+                    break
+            report = timing_report(schedule, holds)
+            self.last_mission_report = report
+            if holds:
+                logger.info(
+                    "Controller: %s %s - %d/%d inputs, planned %.2fs actual %.2fs, "
+                    "press error mean %.2fms max %.2fms, release error mean %.2fms max %.2fms",
+                    name,
+                    "cancelled" if report["cancelled"] else "complete",
+                    report["completed"],
+                    report["holds"],
+                    report["planned_s"],
+                    report["actual_s"],
+                    report["press"]["mean_ms"],
+                    report["press"]["max_ms"],
+                    report["release"]["mean_ms"],
+                    report["release"]["max_ms"],
+                )
+            return report
+        finally:
+            self._mission_holds = []
+            self._mission_complete.set()
+            self._mission_lock.release()
+
+    @property
+    def mission_running(self):
+        return self._mission_lock.locked()
+
+    def mission_loiter(self):
+        """This mission sequence performs a predefined set of maneuvers for the Aaarvark, it flies up and tries to stay up
+        Compatible Jets: F111, F-14, Mig-23, J20
+
+        The maneuvers are the `loiter` timeline in missions.yaml.
+        """
+        return self.run_mission("loiter")
 
     def cancel_mission(self):
         """Request cancellation of any running mission.
 
-        Sets the cancel flag which maneuvers poll; also sets the mission-complete
-        event so callers waiting on completion will unblock.
+        Sets the cancel flag `run_mission` checks while it waits on the timeline,
+        releases every held key at once, and sets the mission-complete event so
+        callers waiting on completion will unblock.
         """
         logger.info("Controller: cancel_mission called")
         self._mission_cancel.set()
+        self.dispatcher.cancel_all()
         self.stop_weapon_loop()  # Stop weapon loop when mission is cancelled
         try:
             self._mission_complete.set()
         except Exception:
-            logger.exception("Controller: failed to set mission_complete during cancel")
\ No newline at end of file
+            logger.exception("Controller: failed to set mission_complete during cancel")
+
+    def interrupt_mission(self):
+        """Cancel only the running mission's inputs, e.g. when a rule takes over.
+
+        Unlike `cancel_mission` this leaves other holds (a rule's own, the weapon loop)
+        alone and joins no thread, so it is cheap enough to call from the frame loop.
+        """
+        if not self.mission_running:
+            return
+        logger.info("Controller: mission interrupted")
+        self._mission_cancel.set()
+        self.dispatcher.cancel(self._mission_holds)
+
+    def close(self):
+        """Release all held keys and stop the input dispatcher."""
+        self.stop_weapon_loop()
+        self.dispatcher.stop()
+        self.backend.close()
+        jitter = self.dispatcher.jitter()["release"]
+        if jitter["count"]:
+            logger.info(
+                "Controller: %d key releases, timing error p50=%.3fms p99=%.3fms max=%.3fms",
+                jitter["count"],
+                jitter["p50_ms"],
+                jitter["p99_ms"],
+                jitter["max_ms"],
+            )
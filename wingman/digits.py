@@ -0,0 +1,277 @@
+"""Template-matching digit reader for the fixed-font HUD readouts.
+
+EasyOCR costs 0.5-1.5 s per frame on CPU; the HUD numbers (speed, altitude, ammo,
+score) are drawn in one font at fixed positions, so they can be read far cheaper:
+crop each configured field, binarize it, cut it into glyphs at the empty columns of
+its ink projection, and score every glyph against the learned templates with one
+normalized cross-correlation matrix product. That runs in a few milliseconds.
+
+Templates are learned from labelled crops, typically produced by running EasyOCR
+once over a recording (`python -m wingman.digits --bootstrap session.wmrec`), and
+cached as a small .npz file. EasyOCR remains available as a per-field fallback.
+"""
+import os
+import re
+import logging
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATES = os.path.join("~", ".cache", "wingman", "digits.npz")
+GLYPH_SIZE = (8, 12)  # (width, height) every glyph is resampled to before matching
+
+
+def _runs(flags):
+    """Return (starts, ends) of the runs of True in a 1-D bool array."""
+    padded = np.zeros(len(flags) + 2, dtype=np.int8)
+    padded[1:-1] = flags
+    edges = np.diff(padded)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _normalize(vectors):
+    vectors = vectors - vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class DigitRecognizer:
+    """Read digits from fixed HUD fields by glyph template matching.
+
+    Args:
+        fields: mapping of field name -> [x, y, w, h] in frame coordinates
+        templates: optional (chars, vectors, glyph_width) as produced by `learn`
+        min_score: lowest correlation (0..1) a glyph may match with; fields with a
+            weaker glyph are treated as unreadable
+        fallback: optional callable(roi) -> str used for unreadable fields (EasyOCR);
+            a field whose fallback raises is left out
+    """
+
+    def __init__(self, fields, templates=None, min_score: float = 0.75, fallback=None):
+        self.fields = {name: tuple(int(v) for v in box) for name, box in fields.items()}
+        self.min_score = min_score
+        self.fallback = fallback
+        self.chars = np.empty(0, dtype="<U1")
+        self.vectors = np.empty((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+        self.glyph_width = 0.0
+        if templates is not None:
+            self.chars, self.vectors, self.glyph_width = templates
+
+    @property
+    def trained(self):
+        return len(self.chars) > 0
+
+    def _crop(self, frame, name):
+        if isinstance(frame, dict):
+            return frame[name]  # already cropped by the capture ROIs
+        x, y, w, h = self.fields[name]
+        return frame[y:y + h, x:x + w]
+
+    @staticmethod
+    def binarize(roi):
+        """Ink mask of a HUD crop; Otsu picks the threshold and the minority side is ink."""
+        gray = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        if cv2.countNonZero(ink) * 2 > ink.size:
+            cv2.bitwise_not(ink, dst=ink)
+        return ink
+
+    def segment(self, ink):
+        """Cut an ink mask into glyph crops using its column projection; returns a list of arrays.
+
+        Runs wider than 1.5 glyphs (touching digits) are split evenly once the
+        typical glyph width is known.
+        """
+        starts, ends = _runs(ink.any(axis=0))
+        glyphs = []
+        for x0, x1 in zip(starts, ends):
+            pieces = 1
+            if self.glyph_width and x1 - x0 > 1.5 * self.glyph_width:
+                pieces = int(round((x1 - x0) / self.glyph_width))
+            bounds = np.linspace(x0, x1, pieces + 1).astype(int)
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                col = ink[:, a:b]
+                rows = np.flatnonzero(col.any(axis=1))
+                if len(rows):
+                    glyphs.append(col[rows[0]:rows[-1] + 1])
+        return glyphs
+
+    @staticmethod
+    def _vectors(glyphs):
+        out = np.empty((len(glyphs), GLYPH_SIZE[0] * GLYPH_SIZE[1]), dtype=np.float32)
+        for i, glyph in enumerate(glyphs):
+            out[i] = cv2.resize(glyph, GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+        return _normalize(out)
+
+    def read_field(self, frame, name):
+        """Return (text, score) for one field; score is the weakest glyph's correlation."""
+        glyphs = self.segment(self.binarize(self._crop(frame, name)))
+        if not glyphs or not self.trained:
+            return "", 0.0
+        scores = self._vectors(glyphs) @ self.vectors.T
+        best = scores.argmax(axis=1)
+        return "".join(self.chars[best]), float(scores[np.arange(len(best)), best].min())
+
+    def scan(self, frame):
+        """Read every field; same output shape as `scan_screen_for_numbers`.
+
+        Returns {field_name: "123", ...}; several digit groups in one field are joined
+        with spaces and unreadable fields are left out. `frame` may also be a
+        {field_name: crop} dict of capture ROI views.
+        """
+        result = {}
+        for name in self.fields:
+            text, score = self.read_field(frame, name)
+            if score < self.min_score:
+                if self.fallback is None:
+                    logger.debug("Digits: %s unreadable (score %.2f)", name, score)
+                    continue
+                try:
+                    text = self.fallback(self._crop(frame, name))
+                except Exception as e:
+                    logger.warning("Digits: fallback failed to read %s: %s", name, e)
+                    continue
+            numbers = re.findall(r"\d+", text)
+            if numbers:
+                result[name] = " ".join(numbers)
+        return result
+
+    def learn(self, frame, labels):
+        """Add templates from `frame` given the true text of some fields ({name: "123"}).
+
+        A field is used only when it segments into exactly as many glyphs as its label
+        has characters; returns the number of glyphs learned.
+        """
+        chars, glyphs = [], []
+        for name, text in labels.items():
+            text = re.sub(r"\s", "", text)
+            pieces = self.segment(self.binarize(self._crop(frame, name)))
+            if text and len(pieces) == len(text):
+                chars.extend(text)
+                glyphs.extend(pieces)
+        if not glyphs:
+            return 0
+        widths = [g.shape[1] for g in glyphs]
+        total = len(self.chars) + len(glyphs)
+        self.glyph_width = (self.glyph_width * len(self.chars) + float(np.sum(widths))) / total
+        self.chars = np.concatenate((self.chars, np.array(chars, dtype="<U1")))
+        self.vectors = np.concatenate((self.vectors, self._vectors(glyphs)))
+        return len(glyphs)
+
+    def compact(self, per_char: int = 4):
+        """Keep at most `per_char` templates per character (the most typical ones)."""
+        keep = []
+        for ch in np.unique(self.chars):
+            idx = np.flatnonzero(self.chars == ch)
+            if len(idx) > per_char:
+                # most typical = highest mean correlation with the other samples of this char
+                typical = (self.vectors[idx] @ self.vectors[idx].T).mean(axis=1)
+                idx = idx[np.argsort(typical)[::-1][:per_char]]
+            keep.extend(idx)
+        keep = np.sort(np.array(keep, dtype=np.intp))
+        self.chars = self.chars[keep]
+        self.vectors = self.vectors[keep]
+
+    def save(self, path=DEFAULT_TEMPLATES):
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, chars=self.chars, vectors=self.vectors, glyph_width=self.glyph_width)
+        logger.info("Digits: saved %d templates to %s", len(self.chars), path)
+
+    @staticmethod
+    def load_templates(path=DEFAULT_TEMPLATES):
+        """Return templates saved by `save`, or None if there is no such file."""
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return data["chars"], data["vectors"].astype(np.float32), float(data["glyph_width"])
+
+
+def easyocr_fallback(reader=None):
+    """Return a fallback callable(roi) -> str backed by EasyOCR, or None if it is not installed."""
+    from .ocr import get_reader
+
+    reader = reader or get_reader()
+    if reader is None:
+        return None
+
+    def read(roi):
+        return " ".join(text for _, text, _ in reader.readtext(roi, detail=1, paragraph=False))
+
+    return read
+
+
+def _images(source):
+    while True:
+        frame = source.read()
+        if frame is None:
+            return
+        yield frame.image
+
+
+def bootstrap(recognizer, frames, reader, limit: int = 200):
+    """Learn templates by labelling field crops of `frames` with an EasyOCR reader.
+
+    Only crops EasyOCR reads as pure digits are used. Returns the number of glyphs learned.
+    """
+    learned = 0
+    for i, frame in enumerate(frames):
+        if i >= limit:
+            break
+        labels = {}
+        for name in recognizer.fields:
+            texts = [t for _, t, conf in reader.readtext(recognizer._crop(frame, name), detail=1) if conf > 0.5]
+            text = "".join(texts).replace(" ", "")
+            if text.isdigit():
+                labels[name] = text
+        learned += recognizer.learn(frame, labels)
+    recognizer.compact()
+    return learned
+
+
+def main():
+    import argparse
+    import yaml
+
+    from .ocr import get_reader
+    from .recording import ReplaySource
+
+    parser = argparse.ArgumentParser(
+        description="Learn HUD digit templates from a recording using EasyOCR",
+        epilog="The recording must hold whole capture-region frames: make it with capture.rois "
+        "empty, since hud.fields are positions in the full region.",
+    )
+    parser.add_argument("--config", default="wingman/config.yaml")
+    parser.add_argument(
+        "--bootstrap", metavar="PATH", required=True, help="Recording (.wmrec) of the whole capture region (capture.rois empty) to label"
+    )
+    parser.add_argument("--frames", type=int, default=200, help="Maximum frames to label")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f) or {}
+    hud_cfg = cfg.get("hud", {})
+    recognizer = DigitRecognizer(hud_cfg.get("fields", {}))
+    with ReplaySource(args.bootstrap) as source:
+        region = cfg.get("region", {})
+        expected = (region.get("height"), region.get("width"))
+        if None not in expected and tuple(source.shape[:2]) != expected:
+            raise SystemExit(
+                "%s holds %dx%d frames but the capture region is %dx%d; hud.fields only line up with "
+                "recordings of the whole region (record with capture.rois empty)" % ((args.bootstrap,) + source.shape[1::-1] + expected[::-1])
+            )
+        reader = get_reader()
+        if reader is None:
+            raise SystemExit("easyocr is required to bootstrap digit templates")
+        learned = bootstrap(recognizer, _images(source), reader, limit=args.frames)
+    logger.info("Digits: learned %d glyphs, kept %d templates for %s", learned, len(recognizer.chars), "".join(sorted(set(recognizer.chars))))
+    recognizer.save(hud_cfg.get("templates", DEFAULT_TEMPLATES))
+
+
+if __name__ == "__main__":
+    main()
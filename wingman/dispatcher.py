@@ -0,0 +1,272 @@
+"""Single-thread timed key input.
+
+All key presses and releases go through one InputDispatcher thread holding a
+time-ordered heap of events. The thread sleeps on a condition variable until shortly
+before the next deadline and spins the last stretch, so releases land within a
+fraction of a millisecond of their due time instead of up to one 50 ms poll late.
+Holds on different keys overlap freely (afterburner while rolling); overlapping holds
+of the same key keep it down until the last one ends. `cancel_all` releases every
+held key immediately.
+
+The clock is injectable and `process_due` runs due events without the thread, which
+lets simulations drive input on a virtual timeline.
+"""
+import sys
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+
+from . import flightrec
+
+
+logger = logging.getLogger(__name__)
+
+PRESS = 0
+RELEASE = 1
+
+# seconds before a deadline at which sleeping stops and spinning starts; on Windows the
+# dispatcher raises the timer resolution to 1 ms while it runs (see _timer_resolution)
+DEFAULT_SPIN = 0.002
+
+
+def _timer_resolution(enable: bool):
+    """Raise (or restore) the Windows timer resolution to 1 ms.
+
+    Condition.wait() otherwise only wakes on the ~15.6 ms system tick there, which
+    would force a 16 ms spin before every deadline. No-op on other platforms.
+    """
+    if sys.platform != "win32":
+        return
+    try:
+        import ctypes
+
+        winmm = ctypes.WinDLL("winmm")
+        (winmm.timeBeginPeriod if enable else winmm.timeEndPeriod)(1)
+    except (OSError, AttributeError):
+        logger.debug("InputDispatcher: could not change the timer resolution", exc_info=True)
+
+
+class Hold:
+    """Handle for one scheduled key hold; `done` is set once the key was released (or cancelled)."""
+
+    __slots__ = ("key", "press_at", "release_at", "label", "done", "cancelled", "pressed_at", "released_at")
+
+    def __init__(self, key, press_at, release_at, label=None):
+        self.key = key
+        self.press_at = press_at
+        self.release_at = release_at
+        self.label = label or key
+        self.done = threading.Event()
+        self.cancelled = False
+        self.pressed_at = None
+        self.released_at = None
+
+    def wait(self, timeout: float | None = None):
+        return self.done.wait(timeout)
+
+
+class InputDispatcher:
+    """Schedule key presses and releases on one thread.
+
+    Args:
+        press: callable(key) that presses a key
+        release: callable(key) that releases a key
+        clock: monotonic time source in seconds (time.perf_counter by default)
+        spin: seconds before a deadline at which the thread stops sleeping and spins
+        history: number of recent timing errors kept for `jitter()`
+    """
+
+    def __init__(self, press, release, clock=time.perf_counter, spin: float = DEFAULT_SPIN, history: int = 1000):
+        self._press = press
+        self._release = release
+        self.clock = clock
+        self.spin = spin
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._held = {}  # key -> number of active holds
+        self._holds = set()
+        self._thread = None
+        self._stop = False
+        self.press_errors = deque(maxlen=history)
+        self.release_errors = deque(maxlen=history)
+
+    def start(self):
+        if self._thread is None:
+            self._stop = False
+            _timer_resolution(True)
+            self._thread = threading.Thread(target=self._run, name="input-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Release everything that is held and stop the thread."""
+        self.cancel_all()
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+            _timer_resolution(False)
+
+    def hold(self, key, seconds: float, at: float | None = None, label=None):
+        """Press `key` at `at` (default: now) and release it `seconds` later; returns a Hold."""
+        start = self.clock() if at is None else at
+        h = Hold(key, start, start + max(0.0, seconds), label)
+        with self._cond:
+            self._holds.add(h)
+            self._push(h.press_at, PRESS, h)
+            self._push(h.release_at, RELEASE, h)
+            self._cond.notify_all()
+        return h
+
+    def _push(self, due, kind, h):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, kind, self._seq, h))
+
+    @property
+    def held_keys(self):
+        with self._cond:
+            return sorted(k for k, n in self._held.items() if n > 0)
+
+    def cancel_all(self):
+        """Drop every pending event and release all held keys now."""
+        with self._cond:
+            self._heap.clear()
+            holds = list(self._holds)
+            self._holds.clear()
+            keys = [k for k, n in self._held.items() if n > 0]
+            self._held.clear()
+            # released under the lock, like _fire's sends, so no press can slip in between
+            for key in keys:
+                self._send(self._release, key)
+            self._cond.notify_all()
+        now = self.clock()
+        for h in holds:
+            h.cancelled = True
+            if h.pressed_at is not None and h.released_at is None:
+                h.released_at = now
+            h.done.set()
+        if keys or holds:
+            flightrec.record(flightrec.CANCEL, len(holds), len(keys))
+
+    def cancel(self, holds):
+        """Cancel some holds, e.g. one mission's, leaving every other hold running.
+
+        Pending presses are dropped; a key that was already pressed is released now
+        unless another hold still keeps it down.
+        """
+        with self._cond:
+            holds = [h for h in holds if h in self._holds]
+            now = self.clock()
+            keys = []
+            for h in holds:
+                self._holds.discard(h)
+                if h.pressed_at is not None and h.released_at is None:
+                    count = self._held.get(h.key, 0)
+                    self._held[h.key] = max(0, count - 1)
+                    if count == 1:
+                        keys.append(h.key)
+                        self._send(self._release, h.key)
+                    h.released_at = now
+            self._cond.notify_all()
+        for h in holds:
+            h.cancelled = True
+            h.done.set()
+        if holds:
+            flightrec.record(flightrec.CANCEL, len(holds), len(keys))
+
+    def next_due(self):
+        """Time of the next pending event, or None."""
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now):
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def process_due(self, now: float | None = None):
+        """Run every event due at `now` (default: the clock); returns how many ran."""
+        events = self._pop_due(self.clock() if now is None else now)
+        for due, kind, _, h in events:
+            self._fire(due, kind, h)
+        return len(events)
+
+    def _fire(self, due, kind, h):
+        key = h.key
+        with self._cond:
+            if h not in self._holds:
+                return  # cancelled meanwhile
+            count = self._held.get(key, 0)
+            if kind == PRESS:
+                self._held[key] = count + 1
+            else:
+                self._held[key] = max(0, count - 1)
+                self._holds.discard(h)
+            now = self.clock()
+            # sent under the lock: a cancel_all racing this press would otherwise see
+            # nothing held yet and leave the key stuck down
+            if (kind == PRESS and count == 0) or (kind == RELEASE and count == 1):
+                self._send(self._press if kind == PRESS else self._release, key)
+            if kind == PRESS:
+                h.pressed_at = now
+            else:
+                h.released_at = now
+        (self.press_errors if kind == PRESS else self.release_errors).append(now - due)
+        flightrec.record(
+            flightrec.KEY_DOWN if kind == PRESS else flightrec.KEY_UP, flightrec.intern(key), int((now - due) * 1e6), name=h.label
+        )
+        if kind == RELEASE:
+            h.done.set()
+
+    def _send(self, fn, key):
+        try:
+            fn(key)
+        except Exception:
+            logger.exception("InputDispatcher: failed to send '%s'", key)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                remaining = self._heap[0][0] - self.clock()
+                if remaining > self.spin:
+                    self._cond.wait(remaining - self.spin)
+                    continue
+                target = self._heap[0][0]
+            # final approach: spin (yielding the GIL) for a precise wake-up
+            while self.clock() < target:
+                time.sleep(0)
+            self.process_due()
+
+    def jitter(self):
+        """Timing error stats in milliseconds for recent presses and releases.
+
+        Errors are measured from an event's due time to the moment its key call is
+        made; p50/p99/max of releases is what a hold's accuracy comes down to.
+        """
+        out = {}
+        for name, errors in (("press", self.press_errors), ("release", self.release_errors)):
+            values = sorted(errors)
+            if not values:
+                out[name] = {"count": 0}
+                continue
+            n = len(values)
+            out[name] = {
+                "count": n,
+                "mean_ms": sum(values) / n * 1000,
+                "p50_ms": values[n // 2] * 1000,
+                "p99_ms": values[min(n - 1, int(n * 0.99))] * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+        return out
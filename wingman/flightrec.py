@@ -0,0 +1,248 @@
+"""Always-on flight recorder: a fixed-size ring buffer of binary trace events.
+
+Hot paths record what happened (frame captured, detections, decision, key down/up,
+cancel) as one 32-byte struct packed into a preallocated bytearray, instead of
+formatting `logger.debug` lines that are only useful when running at DEBUG. Recording
+an event is a struct.pack_into and a couple of dict lookups (1-2 microseconds), so
+the recorder stays on and the last few minutes are always available.
+
+The buffer is dumped to a file on demand (hotkey), on an unhandled exception and on
+exit, and a dump converts to Chrome trace JSON for chrome://tracing or Perfetto:
+
+    python -m wingman.flightrec ~/.cache/wingman/traces/flight-20240101-120000.wmfr
+
+Dump layout: header (magic, version, record size, record count, total recorded, meta
+length, wall-clock time of perf_counter zero), the records oldest first, then JSON
+with the interned names and thread names.
+"""
+import os
+import sys
+import re
+import json
+import time
+import struct
+import logging
+import argparse
+import itertools
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WMFLIGHT"
+VERSION = 1
+DEFAULT_DIR = os.path.join("~", ".cache", "wingman", "traces")
+DEFAULT_CAPACITY = 65536
+
+# timestamp and duration (perf_counter seconds), kind, thread, interned name, three ints
+RECORD = struct.Struct("<ddBBHiii")
+_HEADER = struct.Struct("<8sIIQQQd")
+
+# default thread names carry a process-wide counter ("Thread-12 (_loop)")
+_THREAD_NUMBER = re.compile(r"^Thread-\d+")
+
+# event kinds; a, b and c mean:
+FRAME = 1  # frame grabbed: a=seq; dur = grab time
+DETECT = 2  # detection pass: a=blobs found; dur = detection time
+DECIDE = 3  # AI decision: a, b = target (-1 for none), c = fire | track id << 1; dur = lead
+ACTION = 4  # controller action requested: name = label, a = hold in ms
+KEY_DOWN = 5  # key pressed: name = hold label, a = key, b = lateness in microseconds
+KEY_UP = 6  # key released: same fields as KEY_DOWN
+CANCEL = 7  # holds cancelled: a = holds dropped, b = keys released
+MARK = 8  # free-form note: name = text
+
+KINDS = {
+    FRAME: "frame",
+    DETECT: "detect",
+    DECIDE: "decide",
+    ACTION: "action",
+    KEY_DOWN: "key_down",
+    KEY_UP: "key_up",
+    CANCEL: "cancel",
+    MARK: "mark",
+}
+
+
+class FlightRecorder:
+    """Ring buffer of the last `capacity` trace events.
+
+    Writers on any thread call `record`; each takes its own slot from an atomic
+    counter, so there is no lock on the recording path. A dump taken while other
+    threads record may contain a torn newest record, which the converter skips.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, clock=time.perf_counter):
+        self.enabled = True
+        self.clock = clock
+        self.resize(capacity)
+
+    def resize(self, capacity):
+        """Reallocate for `capacity` events, dropping what was recorded."""
+        self.capacity = max(1, int(capacity))
+        self._buf = bytearray(self.capacity * RECORD.size)
+        self._counter = itertools.count()
+        self._total = 0
+        self._names = {"": 0}
+        self._names_lock = threading.Lock()
+        self._local = threading.local()
+        self._thread_names = []
+        self._thread_ids = {}
+
+    def intern(self, name):
+        """Small integer id for a string (key, label, note) stored once in the dump."""
+        i = self._names.get(name)
+        if i is None:
+            with self._names_lock:
+                i = self._names.setdefault(name, len(self._names))
+        return i
+
+    def _thread(self):
+        i = getattr(self._local, "thread", None)
+        if i is None:
+            # threads of the same kind ("Thread-12 (_loop)", "vision-batch_0") share one
+            # track, so short-lived threads do not grow the table for the whole process
+            name = _THREAD_NUMBER.sub("Thread", threading.current_thread().name)
+            with self._names_lock:
+                i = self._thread_ids.get(name)
+                if i is None:
+                    # the record has one byte for the thread; the last id is shared
+                    i = min(len(self._thread_names), 255)
+                    if i < 255:
+                        self._thread_ids[name] = i
+                    if i == len(self._thread_names):
+                        self._thread_names.append(name if i < 255 else "other")
+            self._local.thread = i
+        return i
+
+    def record(self, kind, a=0, b=0, c=0, name="", ts=None, dur=0.0):
+        """Record one event; `ts` defaults to now on the recorder's clock."""
+        if not self.enabled:
+            return
+        n = next(self._counter)
+        self._total = n + 1
+        RECORD.pack_into(
+            self._buf,
+            (n % self.capacity) * RECORD.size,
+            self.clock() if ts is None else ts,
+            dur,
+            kind,
+            self._thread(),
+            self.intern(name) if name else 0,
+            a,
+            b,
+            c,
+        )
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    def snapshot(self):
+        """(records oldest first as bytes, total events recorded so far)."""
+        total = self._total
+        data = bytes(self._buf)
+        if total <= self.capacity:
+            return data[: total * RECORD.size], total
+        split = (total % self.capacity) * RECORD.size
+        return data[split:] + data[:split], total
+
+    def dump(self, path=None, directory=DEFAULT_DIR):
+        """Write the buffer to `path` (default: a timestamped file in `directory`); returns the path."""
+        if path is None:
+            directory = os.path.expanduser(directory)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, time.strftime("flight-%Y%m%d-%H%M%S.wmfr"))
+        records, total = self.snapshot()
+        names = sorted(self._names, key=self._names.get)
+        meta = json.dumps({"names": names, "threads": list(self._thread_names), "kinds": KINDS}).encode()
+        count = len(records) // RECORD.size
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, RECORD.size, count, total, len(meta), time.time() - self.clock()))
+            f.write(records)
+            f.write(meta)
+        logger.info("FlightRecorder: wrote %d of %d events to %s", count, total, path)
+        return path
+
+
+# The process-wide recorder the hot paths write to; main sizes it from config
+recorder = FlightRecorder()
+record = recorder.record
+intern = recorder.intern
+
+
+def dump(path=None, directory=DEFAULT_DIR):
+    return recorder.dump(path, directory)
+
+
+def load(path):
+    """(events, meta) from a dump; events are (ts, dur, kind, thread, name, a, b, c) tuples."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, size, count, total, meta_length, wall_zero = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        raise ValueError("%s is not a wingman flight recorder dump (version %d)" % (path, VERSION))
+    start = _HEADER.size
+    meta = json.loads(data[start + count * size : start + count * size + meta_length])
+    meta.update(total=total, wall_zero=wall_zero)
+    events = [RECORD.unpack_from(data, start + i * size) for i in range(count)]
+    # a torn or not-yet-written slot has an unknown kind; keep the order by time
+    events = sorted((e for e in events if e[2] in KINDS), key=lambda e: e[0])
+    return events, meta
+
+
+def to_chrome_trace(events, meta):
+    """Chrome trace JSON object for `load`ed events, with one track per thread and per key."""
+    names = meta["names"]
+    threads = meta["threads"]
+    t0 = events[0][0] if events else 0.0
+    out = [{"ph": "M", "pid": 1, "tid": i, "name": "thread_name", "args": {"name": n}} for i, n in enumerate(threads)]
+    key_tracks = {}
+
+    def us(t):
+        return round((t - t0) * 1e6, 3)
+
+    for ts, dur, kind, tid, name, a, b, c in events:
+        label = names[name] if name < len(names) else str(name)
+        e = {"pid": 1, "tid": tid, "ts": us(ts)}
+        if kind == FRAME:
+            e.update(ph="X", name="capture", dur=round(dur * 1e6, 3), args={"seq": a})
+        elif kind == DETECT:
+            e.update(ph="X", name="detect", dur=round(dur * 1e6, 3), args={"blobs": a})
+        elif kind == DECIDE:
+            args = {"target": None if a < 0 else [a, b], "fire": bool(c & 1)}
+            if c >> 1:
+                args.update(track=c >> 1, lead_ms=round(dur * 1000, 1))
+            e.update(ph="i", s="t", name="decide", args=args)
+        elif kind == ACTION:
+            e.update(ph="i", s="t", name=label, args={"hold_ms": a})
+        elif kind in (KEY_DOWN, KEY_UP):
+            key = names[a] if a < len(names) else str(a)
+            if key not in key_tracks:
+                key_tracks[key] = 1000 + len(key_tracks)
+                out.append({"ph": "M", "pid": 1, "tid": key_tracks[key], "name": "thread_name", "args": {"name": "key " + key}})
+            e.update(ph="B" if kind == KEY_DOWN else "E", tid=key_tracks[key], name=label, args={"late_us": b})
+        elif kind == CANCEL:
+            e.update(ph="i", s="g", name="cancel", args={"holds": a, "keys": b})
+        else:
+            e.update(ph="i", s="t", name=label)
+        out.append(e)
+    return {"traceEvents": out, "displayTimeUnit": "ms", "otherData": {"recorded": meta["total"], "wall_zero": meta["wall_zero"]}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a flight recorder dump to Chrome trace JSON")
+    parser.add_argument("dump", help="Dump written by the flight recorder (.wmfr)")
+    parser.add_argument("--out", help="JSON path to write (default: the dump path with .json)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    events, meta = load(args.dump)
+    out = args.out or os.path.splitext(args.dump)[0] + ".json"
+    with open(out, "w") as f:
+        json.dump(to_chrome_trace(events, meta), f)
+    span = events[-1][0] - events[0][0] if events else 0.0
+    logger.info("Wrote %s: %d events over %.1fs (of %d recorded); open it in chrome://tracing or ui.perfetto.dev", out, len(events), span, meta["total"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
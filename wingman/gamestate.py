@@ -0,0 +1,272 @@
+"""Game-state classification from perceptual hashes of reference screens.
+
+Each frame (or a set of ROIs of it) is reduced to a difference hash: the image is
+shrunk to (size + 1) x size grey pixels and every bit says whether a pixel is clearly
+brighter than its left-hand neighbour. Screens that look alike (death, lobby,
+results) give hashes a few bits apart regardless of small changes, so a frame is
+labelled with the nearest reference hash by Hamming distance, computed for the whole
+index at once with NumPy.
+
+The index is built offline from labelled screenshots and saved as one file:
+
+    [0, 64)            header: magic, version, hash bytes, count, meta offset, meta length
+    [4096, ...)        hashes: `count` x `hash bytes` uint8
+    [..., meta offset) labels: `count` uint16 codes
+    [meta offset, ...) JSON: label names, ROIs and hash parameters
+
+and is memory-mapped when loaded. Hashing plus lookup takes well under a millisecond,
+so the classifier can gate the loop and skip vision on screens that are not gameplay.
+
+    python -m wingman.gamestate --build screens/ --out ~/.cache/wingman/states.wmstate
+    python -m wingman.gamestate --index ~/.cache/wingman/states.wmstate --test shot.png
+
+where screens/<label>/ holds PNG/JPEG screenshots (or .wmrec recordings) of that state.
+"""
+import os
+import sys
+import json
+import glob
+import struct
+import logging
+import argparse
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WMSTATE\x00"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIIQQ")
+HASHES_OFFSET = 4096
+DEFAULT_INDEX = os.path.join("~", ".cache", "wingman", "states.wmstate")
+GAMEPLAY = "gameplay"
+
+_popcount = getattr(np, "bitwise_count", None)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(image, size: int = 16, margin: int = 2):
+    """Difference hash of a BGR or grey image as size * size / 8 bytes.
+
+    A bit is set when a pixel is more than `margin` grey levels brighter than its
+    left neighbour, so flat areas hash to zeros instead of to their noise.
+    """
+    h, w = image.shape[:2]
+    # nearest-neighbour thinning first: area-averaging a whole frame straight down to
+    # a few pixels is ~100x slower and the hash does not need it
+    coarse = (min(w, 8 * (size + 1)), min(h, 8 * size))
+    small = cv2.resize(image, coarse, interpolation=cv2.INTER_NEAREST)
+    small = cv2.resize(small, (size + 1, size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    small = small.astype(np.int16)
+    return np.packbits(small[:, 1:] > small[:, :-1] + margin)
+
+
+def hamming(hashes, query):
+    """Bit distance from `query` to every row of `hashes` (N x B uint8)."""
+    x = np.bitwise_xor(hashes, query)
+    if _popcount is not None:
+        return _popcount(x).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[x].sum(axis=1, dtype=np.int32)
+
+
+class StateIndex:
+    """Labelled reference hashes.
+
+    Args:
+        hashes: (N, B) uint8 array, one hash per reference screen
+        codes: (N,) label index per hash
+        labels: label names
+        rois: {name: (x, y, w, h)} hashed (in name order) instead of the whole frame
+        size, margin: dhash parameters the hashes were made with
+    """
+
+    def __init__(self, hashes, codes, labels, rois=None, size: int = 16, margin: int = 2):
+        self.hashes = hashes
+        self.codes = codes
+        self.labels = list(labels)
+        self.rois = {name: tuple(r) for name, r in sorted((rois or {}).items())}
+        self.size = size
+        self.margin = margin
+        self.bits = hashes.shape[1] * 8 if len(hashes) else size * size * max(1, len(self.rois))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def hash(self, frame):
+        """Hash a frame, or a {roi name: crop} dict of capture views, the way the index was built."""
+        if not self.rois:
+            return dhash(frame, self.size, self.margin)
+        if isinstance(frame, dict):
+            parts = [frame[name] for name in self.rois]
+        else:
+            parts = [frame[y:y + h, x:x + w] for x, y, w, h in self.rois.values()]
+        return np.concatenate([dhash(p, self.size, self.margin) for p in parts])
+
+    def nearest(self, query):
+        """(label, distance in bits) of the closest reference hash; (None, bits) when empty."""
+        if not len(self.codes):
+            return None, self.bits
+        d = hamming(self.hashes, query)
+        i = int(np.argmin(d))
+        return self.labels[int(self.codes[i])], int(d[i])
+
+    @classmethod
+    def build(cls, references, rois=None, size: int = 16, margin: int = 2):
+        """Index from {label: iterable of BGR images}."""
+        index = cls(np.empty((0, 0), dtype=np.uint8), np.empty(0, dtype=np.uint16), sorted(references), rois, size, margin)
+        hashes, codes = [], []
+        for code, label in enumerate(index.labels):
+            for image in references[label]:
+                hashes.append(index.hash(image))
+                codes.append(code)
+        if hashes:
+            index.hashes = np.stack(hashes)
+            index.bits = index.hashes.shape[1] * 8
+        index.codes = np.array(codes, dtype=np.uint16)
+        return index
+
+    def save(self, path=DEFAULT_INDEX):
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        nbytes = self.hashes.shape[1] if len(self.hashes) else 0
+        meta_offset = HASHES_OFFSET + len(self) * nbytes + len(self) * 2
+        meta = json.dumps({"labels": self.labels, "rois": self.rois, "size": self.size, "margin": self.margin}).encode()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, nbytes, len(self), meta_offset, len(meta)))
+            f.seek(HASHES_OFFSET)
+            f.write(np.ascontiguousarray(self.hashes, dtype=np.uint8).data)
+            f.write(self.codes.astype("<u2").data)
+            f.write(meta)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX):
+        """Memory-map an index written by `save`."""
+        path = os.path.expanduser(path)
+        with open(path, "rb") as f:
+            magic, version, nbytes, count, meta_offset, meta_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("%s is not a wingman state index (version %d)" % (path, VERSION))
+            f.seek(meta_offset)
+            meta = json.loads(f.read(meta_length))
+        if count:
+            hashes = np.memmap(path, dtype=np.uint8, mode="r", offset=HASHES_OFFSET, shape=(count, nbytes))
+            codes = np.memmap(path, dtype="<u2", mode="r", offset=HASHES_OFFSET + count * nbytes, shape=(count,))
+        else:
+            hashes, codes = np.empty((0, 0), dtype=np.uint8), np.empty(0, dtype=np.uint16)
+        return cls(hashes, codes, meta["labels"], meta.get("rois"), meta.get("size", 16), meta.get("margin", 2))
+
+
+class GameStateClassifier:
+    """Stable game state from per-frame nearest-hash lookups.
+
+    Args:
+        index: StateIndex
+        max_distance: largest match distance as a fraction of the hash bits; farther
+            frames count as `default`
+        confirm_frames: consecutive frames a new state needs before it is reported
+        default: state for frames that match nothing (normally gameplay)
+        gameplay: states in which vision and missions should run
+    """
+
+    def __init__(self, index, max_distance: float = 0.15, confirm_frames: int = 3, default: str = GAMEPLAY, gameplay=(GAMEPLAY,)):
+        self.index = index
+        self.max_bits = int(max_distance * index.bits)
+        self.confirm_frames = max(1, int(confirm_frames))
+        self.default = default
+        self.gameplay = set(gameplay)
+        self.state = default
+        self.distance = 0
+        self._candidate = default
+        self._streak = 0
+
+    @property
+    def is_gameplay(self):
+        return self.state in self.gameplay
+
+    def classify(self, frame):
+        """(label, distance) for one frame, without debouncing."""
+        label, distance = self.index.nearest(self.index.hash(frame))
+        if label is None or distance > self.max_bits:
+            return self.default, distance
+        return label, distance
+
+    def update(self, frame):
+        """Classify `frame` and return the debounced state, logging every change."""
+        label, self.distance = self.classify(frame)
+        if label == self.state:
+            self._streak = 0
+            return self.state
+        if label == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate, self._streak = label, 1
+        if self._streak >= self.confirm_frames:
+            logger.info("GameState: %s -> %s (distance %d bits)", self.state, label, self.distance)
+            self.state = label
+            self._streak = 0
+        return self.state
+
+
+def _reference_images(directory):
+    """{label: [images]} from directory/<label>/ screenshots and .wmrec recordings."""
+    references = {}
+    for label_dir in sorted(glob.glob(os.path.join(directory, "*"))):
+        if not os.path.isdir(label_dir):
+            continue
+        images = []
+        for path in sorted(glob.glob(os.path.join(label_dir, "*"))):
+            if path.endswith(".wmrec"):
+                from .recording import ReplaySource
+
+                with ReplaySource(path) as source:
+                    images += [np.array(source.frames[i]) for i in range(len(source))]
+            else:
+                image = cv2.imread(path, cv2.IMREAD_COLOR)
+                if image is not None:
+                    images.append(image)
+        if images:
+            references[os.path.basename(label_dir)] = images
+    return references
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or test a game-state hash index")
+    parser.add_argument("--build", metavar="DIR", help="Build from DIR/<label>/ screenshots or recordings")
+    parser.add_argument("--out", default=DEFAULT_INDEX, help="Index path to write with --build")
+    parser.add_argument("--size", type=int, default=16, help="dhash size (bits per ROI = size^2)")
+    parser.add_argument("--rois", metavar="JSON", help='ROIs to hash, e.g. \'{"banner": [660, 80, 600, 120]}\'')
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Index to load with --test")
+    parser.add_argument("--test", metavar="IMAGE", nargs="+", help="Print the nearest state of each image")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    if args.build:
+        references = _reference_images(args.build)
+        if not references:
+            logger.error("No labelled images under %s (expected %s/<label>/*.png)", args.build, args.build)
+            return 1
+        index = StateIndex.build(references, json.loads(args.rois) if args.rois else None, args.size)
+        index.save(args.out)
+        logger.info(
+            "Wrote %s: %d screens, %s", args.out, len(index), ", ".join("%s=%d" % (k, len(v)) for k, v in references.items())
+        )
+    if args.test:
+        index = StateIndex.load(args.out if args.build else args.index)
+        for path in args.test:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                print("%s: unreadable" % path)
+                continue
+            label, distance = index.nearest(index.hash(image))
+            print("%s: %s (%d/%d bits)" % (path, label, distance, index.bits))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
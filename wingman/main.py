@@ -3,7 +3,6 @@ import yaml
 import time
 import logging
 import threading
-import re
 try:
     import keyboard as keyboard_module
 except Exception:
@@ -13,89 +12,150 @@ except Exception:
 BEGIN_MISSION_KEY = 'enter'
 CANCEL_MISSION_KEY = 'end'
 EXIT_KEY = 'backspace'
+DUMP_TRACE_KEY = 'home'
 
-# Note: enabling this will slow down startup by 10seconds due to easyocr/tensorflow init
-# try:
-#     import easyocr
-# except Exception:
-#     easyocr = None
-
-from .capture import Capture
+from .capture import GRAB_OVERHEAD_PX, Capture, ThreadedCapture, subviews
 from .vision import Vision
 from .controller import Controller
 from .ai import SimpleAI
+from .tracker import Tracker
+from .pipeline import Pipeline
+from .colorlut import ColorLUT, DEFAULT_CACHE_DIR
+from .recording import FrameRecorder, ReplaySource
+from .ocr import OCRService, scan_screen_for_numbers  # noqa: F401  (kept importable from main)
+from .workers import WorkerPool, PooledVision
+from .timeline import load_missions
+from .backends import make_backend
+from .telemetry import Telemetry, DEFAULT_DIR as TELEMETRY_DIR
+from . import flightrec
+from .viewer import DebugViewer
+from .pacing import FrameScheduler, load_ladder
+from .rules import RuleEngine, RuleError, frame_facts, load_rules, rule_classes
+from .gamestate import DEFAULT_INDEX, GameStateClassifier, StateIndex
+from .digits import DigitRecognizer, DEFAULT_TEMPLATES, easyocr_fallback
 
 
 def load_config(path):
     with open(path, "r") as f:
-        return yaml.safe_load(f)
+        cfg = yaml.safe_load(f)
+    check_rules(cfg)
+    return cfg
+
 
+def check_rules(cfg):
+    """Raise RuleError if the enabled rules could never be evaluated or never fire.
 
-def scan_screen_for_numbers(frame, reader=None):
+    Rules run in the paced loop only, and rules on color classes other than `enemy`
+    need the ColorLUT in this process (not the vision worker pool).
     """
-    Scan a screen frame for numbers using EasyOCR.
-    
-    Args:
-        frame: numpy array (BGR image) from screen capture
-        reader: optional EasyOCR Reader instance (will create if None)
-    
-    Returns:
-        dict: Dictionary with detected text as keys and extracted numbers as values.
-              Format: {"label_text": "123", "position_x_y": "456", ...}
+    rules_cfg = cfg.get("rules", {})
+    if not rules_cfg.get("enabled", False):
+        return
+    if cfg.get("pipeline", {}).get("enabled", False):
+        raise RuleError("rules are only evaluated by the paced loop; disable either rules or pipeline")
+    classes = [c for c in rule_classes(load_rules(rules_cfg.get("list"))) if c != "enemy"]
+    if not classes:
+        return
+    workers_cfg = cfg.get("workers", {})
+    if not cfg.get("color_lut", {}).get("enabled", False):
+        raise RuleError("rules on color classes %s need color_lut enabled" % ", ".join(classes))
+    if workers_cfg.get("enabled", False) and workers_cfg.get("task", "vision") == "vision":
+        raise RuleError("rules on color classes %s need the vision workers disabled" % ", ".join(classes))
+    unknown = sorted(set(classes) - set(cfg.get("color_classes") or {}))
+    if unknown:
+        raise RuleError("rules use color classes %s missing from color_classes" % ", ".join(unknown))
+
+
+def capture_rois_from(cfg, region, state_rois=None):
+    """Named capture ROIs from config, or None to grab the whole region.
+
+    `capture.rois` lists the user's ROIs ("vision" defaults to the whole region);
+    HUD digit fields, OCR rois and the game-state index's `state_rois` are added as
+    "hud.<field>", "ocr.<name>" and "state.<name>" so those readers get their crops
+    straight from the capture.
     """
-    if easyocr is None:
-        return {"error": "easyocr not installed"}
-    
-    # Initialize reader if not provided
-    if reader is None:
-        try:
-            reader = easyocr.Reader(['en'], gpu=True)
-        except Exception as e:
-            return {"error": f"Failed to initialize EasyOCR: {e}"}
-    
-    try:
-        # Detect all text with bounding boxes and confidence
-        results = reader.readtext(frame, detail=1, paragraph=False)
-    except Exception as e:
-        return {"error": f"EasyOCR read error: {e}"}
-    
-    # Extract numbers and associated text
-    number_dict = {}
-    
-    for bbox, text, confidence in results:
-        # Extract numbers from the detected text
-        numbers = re.findall(r'\d+', text)
-        
-        if numbers:
-            # Get position for labeling
-            x_center = int(sum([p[0] for p in bbox]) / 4)
-            y_center = int(sum([p[1] for p in bbox]) / 4)
-            
-            # Create key: use the full text if it contains non-digits, otherwise use position
-            if re.search(r'[^\d\s]', text):
-                # Text contains letters/labels
-                key = text.strip()
-            else:
-                # Pure numbers, use position as key
-                key = f"pos_{x_center}_{y_center}"
-            
-            # Join multiple numbers found in the same text region
-            value = ' '.join(numbers)
-            number_dict[key] = value
-    
-    return number_dict
+    rois = dict(cfg.get("capture", {}).get("rois") or {})
+    if not rois:
+        return None
+    rois.setdefault("vision", [0, 0, region[2], region[3]])
+    for prefix, section, key in (("hud.", "hud", "fields"), ("ocr.", "ocr", "rois")):
+        for name, rect in (cfg.get(section, {}).get(key) or {}).items():
+            rois[prefix + name] = rect
+    for name, rect in (state_rois or {}).items():
+        rois["state." + name] = rect
+    return rois
+
+
+def run_replay(source, vis, ai, pipeline_cfg=None, pool=None, telemetry=None):
+    """Drive vision and AI from a frame source until it runs out; returns frames per second.
+
+    With a WorkerPool, frames are streamed through the workers and decided on in order
+    as their results come back. With `pipeline_cfg["enabled"]` the stages run
+    concurrently (with blocking queues so no recorded frame is dropped), otherwise
+    strictly one after the other.
+    """
+    logger = logging.getLogger("wingman")
+    logger.info("Replaying %d frames", len(source))
+    frames = 0
+    start = time.perf_counter()
+    if pool is not None:
+        timestamps = {}
+        while True:
+            frame = source.read()
+            if frame is not None:
+                timestamps[pool.submit(frame.image)] = frame.timestamp
+            while len(pool) and (frame is None or pool.ready()):
+                result = pool.get()
+                if result is None:
+                    raise TimeoutError("worker pool returned no result within %.1fs" % pool.timeout)
+                seq, enemies = result
+                ai.decide(enemies, timestamps.pop(seq))
+                frames += 1
+            if frame is None:
+                break
+    elif pipeline_cfg and pipeline_cfg.get("enabled", False):
+        pipeline = Pipeline(
+            source, vis, ai, policy="block", queue_size=pipeline_cfg.get("queue_size", 2), report_interval=0, telemetry=telemetry
+        )
+        pipeline.run()
+        frames = pipeline.completed
+    else:
+        while True:
+            frame = source.read()
+            if frame is None:
+                break
+            t0 = time.perf_counter()
+            enemies = vis.find_enemies(frame.image)
+            t1 = time.perf_counter()
+            ai.decide(enemies, frame.timestamp)
+            if telemetry is not None:
+                t2 = time.perf_counter()
+                telemetry.record("vision", t1 - t0)
+                telemetry.record("ai", t2 - t1)
+            frames += 1
+    elapsed = time.perf_counter() - start
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    logger.info("Replay finished: %d frames in %.2fs (%.1f fps)", frames, elapsed, fps)
+    return fps
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="wingman/config.yaml")
     parser.add_argument("--log-level", default="INFO", help="Logging level (DEBUG, INFO, WARNING, ERROR)")
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--record", metavar="PATH", help="Record captured frames to PATH while running")
+    parser.add_argument("--replay", metavar="PATH", help="Run vision and AI over a recording instead of the screen, as fast as possible")
+    parser.add_argument("--replay-realtime", action="store_true", help="With --replay, pace frames at their recorded rate")
     args = parser.parse_args()
 
     logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.INFO), format="%(asctime)s [%(levelname)s] %(message)s")
     logger = logging.getLogger("wingman")
 
-    cfg = load_config(args.config)
+    try:
+        cfg = load_config(args.config)
+    except RuleError as e:
+        parser.error("%s: %s" % (args.config, e))
     region = (
         cfg["region"]["left"],
         cfg["region"]["top"],
@@ -111,8 +171,158 @@ def main():
         logger.info("HSV lower/upper: %s %s", hsv_lower, hsv_upper)
         return
 
-    cap = Capture(region)
-    vis = Vision(hsv_lower, hsv_upper, debug=cfg.get("debug", {}).get("show_window", False))
+    # Start loading EasyOCR (~10s) now so it overlaps with the rest of startup
+    ocr = None
+    ocr_cfg = cfg.get("ocr", {})
+    if ocr_cfg.get("enabled", False):
+        ocr = OCRService(
+            ocr_cfg.get("rois") or cfg.get("hud", {}).get("fields"),
+            cache_size=ocr_cfg.get("cache_size", 256),
+            shift=ocr_cfg.get("ignore_bits", 2),
+            gpu=ocr_cfg.get("gpu", True),
+        ).start()
+
+    viewer = None
+    debug_cfg = cfg.get("debug", {})
+    if debug_cfg.get("show_window", False):
+        viewer = DebugViewer(max_fps=debug_cfg.get("viewer_fps", 15), draw_markers=debug_cfg.get("draw_markers", True)).start()
+
+    vision_cfg = cfg.get("vision", {})
+    lut = None
+    lut_cfg = cfg.get("color_lut", {})
+    if lut_cfg.get("enabled", False):
+        color_classes = dict(cfg.get("color_classes") or {})
+        color_classes.setdefault("enemy", cfg["enemy_hsv"])
+        lut = ColorLUT.load_or_build(color_classes, bits=lut_cfg.get("bits", 6), cache_dir=lut_cfg.get("cache_dir", DEFAULT_CACHE_DIR))
+    vis = Vision(
+        hsv_lower,
+        hsv_upper,
+        debug=debug_cfg.get("show_window", False),
+        viewer=viewer,
+        engine=vision_cfg.get("engine", "contours"),
+        min_area=vision_cfg.get("min_area", 20),
+        lut=lut,
+        pyramid_scale=vision_cfg.get("pyramid_scale", 1),
+        pyramid_tolerance=vision_cfg.get("pyramid_tolerance", 2),
+        incremental_tile=vision_cfg.get("incremental_tile", 0),
+        change_threshold=vision_cfg.get("change_threshold", 12),
+    )
+    aim_cfg = cfg.get("aim", {})
+    tracker = None
+    if aim_cfg.get("tracking", False):
+        tracker = Tracker(
+            gate=aim_cfg.get("track_gate", 80.0),
+            max_misses=aim_cfg.get("track_max_misses", 5),
+            min_hits=aim_cfg.get("track_min_hits", 2),
+        )
+    # Game state: frames that look like death/lobby/results screens skip vision and missions
+    state = None
+    gamestate_cfg = cfg.get("gamestate", {})
+    if gamestate_cfg.get("enabled", False):
+        try:
+            index = StateIndex.load(gamestate_cfg.get("index", DEFAULT_INDEX))
+        except (OSError, ValueError):
+            logger.warning("GameState: no usable index at %s; run `python -m wingman.gamestate --build <screens>`", gamestate_cfg.get("index", DEFAULT_INDEX))
+        else:
+            state = GameStateClassifier(
+                index,
+                max_distance=gamestate_cfg.get("max_distance", 0.15),
+                confirm_frames=gamestate_cfg.get("confirm_frames", 3),
+                gameplay=gamestate_cfg.get("gameplay", ["gameplay"]),
+            )
+            logger.info("GameState: %d reference screens (%s)", len(index), ", ".join(index.labels))
+
+    # Capture ROIs: detections are then in "vision" ROI coordinates, so the AI aims at its centre
+    capture_cfg = cfg.get("capture", {})
+    capture_rois = capture_rois_from(cfg, region, state.index.rois if state is not None else None)
+    ai_region = region
+    if capture_rois:
+        x, y, w, h = capture_rois["vision"]
+        ai_region = (region[0] + x, region[1] + y, w, h)
+    ai = SimpleAI(ai_region, smoothing=aim_cfg.get("smoothing", 0.25), fire_cooldown=aim_cfg.get("fire_cooldown", 0.2), tracker=tracker)
+
+    pool = None
+    workers_cfg = cfg.get("workers", {})
+    if workers_cfg.get("enabled", False) and workers_cfg.get("task", "vision") == "vision":
+        pool = WorkerPool(
+            vis,
+            processes=workers_cfg.get("processes", 0),
+            split=workers_cfg.get("split", "rows"),
+            overlap=workers_cfg.get("overlap", 32),
+            slots=workers_cfg.get("slots", 0),
+            # detection sees the vision ROI (or the whole region); size the shared slots for it
+            frame_shape=(ai_region[3], ai_region[2], 3),
+            timeout=workers_cfg.get("timeout", 5.0),
+        )
+
+    flight_cfg = cfg.get("flight_recorder", {})
+    flightrec.recorder.enabled = flight_cfg.get("enabled", True)
+    flightrec.recorder.resize(flight_cfg.get("capacity", flightrec.DEFAULT_CAPACITY))
+
+    def dump_trace():
+        if not flightrec.recorder.enabled:
+            return
+        try:
+            flightrec.dump(directory=flight_cfg.get("dir", flightrec.DEFAULT_DIR))
+        except OSError:
+            logger.exception("Could not write the flight recorder dump")
+
+    telemetry = None
+    telemetry_cfg = cfg.get("telemetry", {})
+    if telemetry_cfg.get("enabled", False):
+        telemetry = Telemetry(
+            budget=telemetry_cfg.get("frame_budget_ms", 16.6) / 1000.0,
+            stage_budgets={k: v / 1000.0 for k, v in (telemetry_cfg.get("stage_budgets_ms") or {}).items()},
+            directory=telemetry_cfg.get("dir", TELEMETRY_DIR),
+            interval=telemetry_cfg.get("interval", 5.0),
+        ).start()
+
+    if args.replay:
+        try:
+            with ReplaySource(args.replay, realtime=args.replay_realtime) as source:
+                run_replay(source, vis, ai, cfg.get("pipeline", {}), pool=pool, telemetry=telemetry)
+        finally:
+            if pool is not None:
+                pool.close()
+            if telemetry is not None:
+                telemetry.stop()
+                telemetry.log_summary()
+            if flight_cfg.get("dump_on_exit", False):
+                dump_trace()
+        return
+
+    if pool is not None:
+        vis = PooledVision(pool)
+
+    digits = None
+    hud_cfg = cfg.get("hud", {})
+    if hud_cfg.get("fields"):
+        templates = DigitRecognizer.load_templates(hud_cfg.get("templates", DEFAULT_TEMPLATES))
+        fallback = easyocr_fallback() if hud_cfg.get("easyocr_fallback", False) else None
+        if templates is not None or fallback is not None:
+            digits = DigitRecognizer(hud_cfg["fields"], templates, min_score=hud_cfg.get("min_score", 0.75), fallback=fallback)
+        else:
+            logger.info("HUD digit templates not found; run `python -m wingman.digits --bootstrap <recording>` to learn them")
+
+    grab_overhead_px = capture_cfg.get("grab_overhead_px", GRAB_OVERHEAD_PX)
+    if capture_cfg.get("threaded", False):
+        cap = ThreadedCapture(
+            region,
+            ring_size=capture_cfg.get("ring_size", 3),
+            max_fps=capture_cfg.get("max_fps", 0),
+            rois=capture_rois,
+            grab_overhead_px=grab_overhead_px,
+        )
+        cap.start()
+    else:
+        cap = Capture(region, rois=capture_rois, grab_overhead_px=grab_overhead_px)
+        logger.info("Capture: %s", cap.layout.describe())
+    hud_prefix = "ocr." if ocr_cfg.get("rois") else "hud."
+    if telemetry is not None:
+        cap.on_grab = telemetry.recorder("capture")
+    if args.record:
+        cap = FrameRecorder(cap, args.record)
+        logger.info("Recording frames to %s", args.record)
     # Determine fire control: prefer boolean `left_mouse_button`, fall back to `fire_button` string
     controls_cfg = cfg.get("controls", {})
     if controls_cfg.get("left_mouse_button") is True:
@@ -124,15 +334,85 @@ def main():
     exit_requested = threading.Event()
     exit_requested.clear()
     
-    ctrl = Controller(region, fire_button=fire_button, exit_event=exit_requested)
-    ai = SimpleAI(region, smoothing=cfg.get("aim", {}).get("smoothing", 0.25), fire_cooldown=cfg.get("aim", {}).get("fire_cooldown", 0.2))
+    mission_cfg = cfg.get("mission", {})
+    missions = load_missions(mission_cfg["file"]) if mission_cfg.get("file") else None
+    mission_name = mission_cfg.get("name", "loiter")
+    ctrl = Controller(
+        region,
+        fire_button=fire_button,
+        exit_event=exit_requested,
+        missions=missions,
+        jet=mission_cfg.get("jet"),
+        backend=make_backend(controls_cfg.get("input_backend", "keyboard")),
+    )
 
-    try:
-        # Toggle start/pause of the main loop with the 'm' key.
-        # Uses `keyboard` if available, otherwise falls back to OS-specific listeners.
-        running = threading.Event()
-        running.clear()  # start paused until first 'm'
+    # Toggle start/pause of the main loop with the 'm' key.
+    # Uses `keyboard` if available, otherwise falls back to OS-specific listeners.
+    running = threading.Event()
+    running.clear()  # start paused until first 'm'
+
+    # Cleared while the game state is not gameplay: vision is skipped and missions stop
+    gameplay = threading.Event()
+    gameplay.set()
 
+    def in_gameplay(frame):
+        state.update(subviews(frame.views, "state.") or frame.image)
+        if state.is_gameplay:
+            gameplay.set()
+            return True
+        if gameplay.is_set():
+            gameplay.clear()
+            if ctrl.mission_running:
+                ctrl.cancel_mission()
+        return False
+
+    pacing_cfg = cfg.get("pacing", {})
+    ladder = load_ladder(pacing_cfg.get("ladder"))
+    scheduler = FrameScheduler(
+        fps=pacing_cfg.get("fps", 30),
+        ladder=ladder if pacing_cfg.get("adaptive", True) else ladder[:1],
+        down_after=pacing_cfg.get("down_after", 3),
+        up_after=pacing_cfg.get("up_after", 90),
+        headroom=pacing_cfg.get("headroom", 0.6),
+    )
+
+    pipeline = None
+    pipeline_cfg = cfg.get("pipeline", {})
+    auto_fire = pipeline_cfg.get("auto_fire", False)
+
+    def act(action):
+        if auto_fire and action.get("fire"):
+            ctrl.fire_active_weapon(block=False)
+
+    if pipeline_cfg.get("enabled", False):
+        pipeline = Pipeline(
+            cap,
+            vis,
+            ai,
+            act=act,
+            exit_event=exit_requested,
+            running=running,
+            policy=pipeline_cfg.get("queue_policy", "latest"),
+            queue_size=pipeline_cfg.get("queue_size", 2),
+            telemetry=telemetry,
+            gate=in_gameplay if state is not None else None,
+            scheduler=scheduler,
+        )
+        pipeline.start()
+
+    mission = None
+    hud = {}
+
+    rule_engine = None
+    extra_classes = []
+    rules_cfg = cfg.get("rules", {})
+    if rules_cfg.get("enabled", False):
+        # check_rules has already ensured the paced loop and a ColorLUT for these
+        rule_engine = RuleEngine(load_rules(rules_cfg.get("list"), target=rules_cfg.get("target_latency_ms", 50) / 1000.0), ctrl)
+        extra_classes = [c for c in rule_engine.classes if c != "enemy"]
+        logger.info("Rules: %d loaded (%s)", len(rule_engine.rules), ", ".join(r.name for r in rule_engine.rules))
+
+    try:
         def toggle_running():
             if running.is_set():
                 running.clear()
@@ -144,7 +424,13 @@ def main():
         # Try keyboard global hook first
         keyboard_avail = keyboard_module is not None
         if keyboard_avail:
-            logger.info("Press '%s' to toggle start/pause of main loop; '%s' to cancel mission; '%s' to exit", BEGIN_MISSION_KEY, CANCEL_MISSION_KEY, EXIT_KEY)
+            logger.info(
+                "Press '%s' to toggle start/pause of main loop; '%s' to cancel mission; '%s' to exit; '%s' to dump the flight recorder",
+                BEGIN_MISSION_KEY,
+                CANCEL_MISSION_KEY,
+                EXIT_KEY,
+                DUMP_TRACE_KEY,
+            )
             try:
                 keyboard_module.on_press_key(BEGIN_MISSION_KEY, lambda e: toggle_running())
                 def _on_cancel(e):
@@ -163,6 +449,7 @@ def main():
                     exit_requested.set()
                 
                 keyboard_module.on_press_key(EXIT_KEY, _on_exit)
+                keyboard_module.on_press_key(DUMP_TRACE_KEY, lambda e: dump_trace())
             except Exception:
                 logger.warning("keyboard.on_press_key failed; falling back to console listener")
                 keyboard_avail = False
@@ -218,42 +505,94 @@ def main():
                         elif v == EXIT_KEY:
                             logger.info("Exiting...")
                             exit_requested.set()
+                        elif v == DUMP_TRACE_KEY:
+                            dump_trace()
 
                 t = threading.Thread(target=input_listener, daemon=True)
                 t.start()
                 logger.info("Type '%s' + Enter to toggle start/pause", BEGIN_MISSION_KEY)
 
-        while True:
-            if exit_requested.is_set():
-                logger.info("Exit requested, shutting down")
-                break
+        def mission_loop():
+            # missions block for their whole timeline, so they run beside the paced perception loop
+            while running.is_set() and gameplay.is_set() and not exit_requested.is_set():
+                ctrl.run_mission(mission_name)
+                exit_requested.wait(3)
+
+        while not exit_requested.is_set():
             if not running.is_set():
-                time.sleep(0.05)
+                # wakes as soon as the loop is resumed; the timeout keeps exit responsive
+                running.wait(0.25)
+                scheduler.reset()
                 continue
-            frame = cap.get_frame()
-            enemies = vis.find_enemies(frame)
-            # logger.debug("Detected %d enemies", len(enemies))
-            # action = ai.decide(enemies)
-            # logger.debug("AI action: %s", action)
-            # target = action.get("target")
-            # if action.get("fire"):
-            #     logger.info("Firing")
-            #     ctrl.fire()
-
-            #screen_numbers = scan_screen_for_numbers(frame)
-            #print("Detected numbers:", screen_numbers)
-            #logger.info("Firing")
-            #ctrl.fire()
-            #ctrl.nose_up()
-            ctrl.mission_loiter()
-            time.sleep(3)
-
-             
-            
+            if gameplay.is_set() and (mission is None or not mission.is_alive()):
+                mission = threading.Thread(target=mission_loop, name="mission", daemon=True)
+                mission.start()
+            if pipeline is not None:
+                # the pipeline runs capture, vision and AI on its own threads
+                exit_requested.wait(0.25)
+                continue
+            if not scheduler.wait(exit_requested):
+                break
+            frame = cap.read()
+            if state is not None and not in_gameplay(frame):
+                scheduler.finish()
+                continue
+            t0 = time.perf_counter()
+            enemies = scheduler.detect(vis, frame.image)
+            t1 = time.perf_counter()
+            action = ai.decide(enemies, frame.timestamp)
+            t2 = time.perf_counter()
+            act(action)
+            t3 = time.perf_counter()
+            ai.report_latency(t3 - frame.timestamp)
+            if telemetry is not None:
+                telemetry.record("vision", t1 - t0)
+                telemetry.record("ai", t2 - t1)
+                telemetry.record("input", t3 - t2)
+                telemetry.record("end_to_end", t3 - frame.timestamp)
+            if scheduler.ocr_due():
+                if digits is not None:
+                    hud.update(digits.scan(subviews(frame.views, "hud.") or frame.image))
+                    logger.debug("HUD: %s", hud)
+                if ocr is not None:
+                    logger.debug("OCR: %s", ocr.scan(subviews(frame.views, hud_prefix) or frame.image))
+            if rule_engine is not None:
+                detections = {"enemy": enemies}
+                if extra_classes:
+                    detections.update(vis.detect_classes(frame.image, extra_classes))
+                rule_engine.evaluate(frame_facts(detections, hud), frame.timestamp)
+            scheduler.finish()
+        logger.info("Exit requested, shutting down")
+
     except KeyboardInterrupt:
         logger.info("Exiting")
     except Exception:
         logger.exception("Unhandled exception in main loop")
+        if flight_cfg.get("dump_on_error", True):
+            dump_trace()
+    finally:
+        if pipeline is not None:
+            pipeline.stop()
+        if pool is not None:
+            pool.close()
+        if ocr is not None:
+            ocr.stop()
+            ocr.log_stats()
+        if mission is not None:
+            mission.join(timeout=1.0)
+        if scheduler.frames:
+            logger.info("Pacing: %s", scheduler.stats())
+        if rule_engine is not None:
+            rule_engine.log_summary()
+        ctrl.close()
+        cap.close()
+        if telemetry is not None:
+            telemetry.stop()
+            telemetry.log_summary()
+        if viewer is not None:
+            viewer.stop()
+        if flight_cfg.get("dump_on_exit", False):
+            dump_trace()
 
 
 if __name__ == "__main__":
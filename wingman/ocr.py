@@ -0,0 +1,268 @@
+"""Screen OCR helpers built on EasyOCR.
+
+EasyOCR (and the torch stack under it) takes around 10 seconds to import, so it is
+only imported the first time OCR is actually used, or on a background thread by
+OCRService while the rest of the program starts.
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+_easyocr = None
+_easyocr_loaded = False
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def load_easyocr():
+    """Import and return the easyocr module, or None if it is not installed."""
+    global _easyocr, _easyocr_loaded
+    if not _easyocr_loaded:
+        try:
+            import easyocr as module
+        except Exception:
+            module = None
+        _easyocr = module
+        _easyocr_loaded = True
+    return _easyocr
+
+
+def get_reader(gpu=True):
+    """Return a shared EasyOCR Reader, created on first use; None if easyocr is unavailable.
+
+    Creating a Reader loads the detection and recognition models, so it is done once
+    per process rather than per scan.
+    """
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            easyocr = load_easyocr()
+            if easyocr is None:
+                return None
+            _reader = easyocr.Reader(["en"], gpu=gpu)
+        return _reader
+
+
+def scan_screen_for_numbers(frame, reader=None):
+    """
+    Scan a screen frame for numbers using EasyOCR.
+    
+    Args:
+        frame: numpy array (BGR image) from screen capture
+        reader: optional EasyOCR Reader instance (the shared `get_reader()` one if None)
+    
+    Returns:
+        dict: Dictionary with detected text as keys and extracted numbers as values.
+              Format: {"label_text": "123", "position_x_y": "456", ...}
+    """
+    easyocr = load_easyocr()
+    if easyocr is None:
+        return {"error": "easyocr not installed"}
+    
+    # Reuse the process-wide reader if none is provided
+    if reader is None:
+        try:
+            reader = get_reader()
+        except Exception as e:
+            return {"error": f"Failed to initialize EasyOCR: {e}"}
+    
+    try:
+        # Detect all text with bounding boxes and confidence
+        results = reader.readtext(frame, detail=1, paragraph=False)
+    except Exception as e:
+        return {"error": f"EasyOCR read error: {e}"}
+    
+    # Extract numbers and associated text
+    number_dict = {}
+    
+    for bbox, text, confidence in results:
+        # Extract numbers from the detected text
+        numbers = re.findall(r'\d+', text)
+        
+        if numbers:
+            # Get position for labeling
+            x_center = int(sum([p[0] for p in bbox]) / 4)
+            y_center = int(sum([p[1] for p in bbox]) / 4)
+            
+            # Create key: use the full text if it contains non-digits, otherwise use position
+            if re.search(r'[^\d\s]', text):
+                # Text contains letters/labels
+                key = text.strip()
+            else:
+                # Pure numbers, use position as key
+                key = f"pos_{x_center}_{y_center}"
+            
+            # Join multiple numbers found in the same text region
+            value = ' '.join(numbers)
+            number_dict[key] = value
+    
+    return number_dict
+
+
+def fingerprint(roi, shift=2):
+    """Cheap content hash of an image region.
+
+    The lowest `shift` bits of every channel are dropped first, so capture noise of a
+    level or two does not count as a change.
+    """
+    data = roi >> shift if shift else np.ascontiguousarray(roi)
+    h = hashlib.blake2b(repr(roi.shape).encode(), digest_size=16)
+    h.update(data)
+    return h.digest()
+
+
+class OCRService:
+    """EasyOCR behind a background thread and a per-region result cache.
+
+    `start()` loads the reader on a daemon thread, which then runs every OCR read,
+    so `scan` never waits on EasyOCR. Each region is fingerprinted every scan: a
+    cached read of the same pixels is returned at once; a changed region is handed to
+    the thread (newest crop per region only) and `scan` returns that region's last
+    read until the new one is done.
+
+    Args:
+        rois: mapping of name -> [x, y, w, h]; None scans the whole frame as one region
+        cache_size: most (region, fingerprint) results kept (LRU)
+        shift: low bits per channel ignored by the fingerprint
+        gpu: passed to the EasyOCR Reader
+    """
+
+    def __init__(self, rois=None, cache_size: int = 256, shift: int = 2, gpu: bool = True):
+        self.rois = {name: tuple(int(v) for v in box) for name, box in (rois or {}).items()}
+        self.cache_size = cache_size
+        self.shift = shift
+        self.gpu = gpu
+        self.reader = None
+        self.ready = threading.Event()
+        self._cache = OrderedDict()  # (roi name, fingerprint) -> (result dict, OCR seconds)
+        self._last = {}  # roi name -> newest finished read
+        self._pending = {}  # roi name -> (cache key, crop) waiting for the thread
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.ocr_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def start(self):
+        """Begin loading the reader in the background; returns immediately."""
+        if self._thread is None:
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="ocr", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the OCR thread; reads still pending are dropped."""
+        with self._cond:
+            self._stop = True
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            self.reader = get_reader(gpu=self.gpu)
+        except Exception:
+            logger.exception("OCR: failed to initialize EasyOCR")
+        if self.reader is None:
+            logger.warning("OCR: easyocr not available, OCR disabled")
+        else:
+            logger.info("OCR: reader ready after %.1fs", time.perf_counter() - start)
+        self.ready.set()
+
+    def _run(self):
+        self._load()
+        if self.reader is None:
+            return
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                name = next(iter(self._pending))
+                key, roi = self._pending.pop(name)
+            self._read(name, key, roi)
+
+    def _read(self, name, key, roi):
+        start = time.perf_counter()
+        found = scan_screen_for_numbers(roi, reader=self.reader)
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.misses += 1
+            self.ocr_seconds += elapsed
+            if "error" in found:
+                logger.debug("OCR: %s: %s", name, found["error"])
+                return
+            if self.rois and found:
+                found = {name: " ".join(found.values())}
+            self._cache[key] = (found, elapsed)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._last[name] = found
+
+    def _regions(self, frame):
+        if isinstance(frame, dict):
+            return list(frame.items())  # {name: crop} from the capture ROIs
+        if not self.rois:
+            return [("frame", frame)]
+        return [(name, frame[y:y + h, x:x + w]) for name, (x, y, w, h) in self.rois.items()]
+
+    def scan(self, frame):
+        """Return the merged `scan_screen_for_numbers` result of every region; never blocks on OCR.
+
+        Numbers found by a region are keyed by the region name when it is configured
+        (e.g. {"speed": "412"}); a whole-frame scan keeps EasyOCR's own keys. `frame`
+        may also be a {name: crop} dict of capture ROI views. A region whose pixels
+        changed reports its previous read until the background read finishes.
+        """
+        result = {}
+        for name, roi in self._regions(frame):
+            key = (name, fingerprint(roi, self.shift))
+            with self._cond:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self._last[name] = cached[0]
+                    self.hits += 1
+                    self.saved_seconds += cached[1]
+                elif self.reader is not None and not self._stop:
+                    # the frame buffer is reused by capture, so the thread gets its own copy
+                    self._pending[name] = (key, roi.copy())
+                    self._cond.notify()
+                result.update(self._last.get(name, {}))
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ocr_seconds": self.ocr_seconds,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def log_stats(self):
+        s = self.stats()
+        logger.info(
+            "OCR: %d hits / %d misses (%.0f%% hit rate), %.1fs spent in OCR, ~%.1fs saved by the cache",
+            s["hits"],
+            s["misses"],
+            s["hit_rate"] * 100,
+            s["ocr_seconds"],
+            s["saved_seconds"],
+        )
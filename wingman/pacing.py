@@ -0,0 +1,203 @@
+"""Deadline-based frame pacing with an adaptive quality ladder.
+
+FrameScheduler runs the perception loop at a target frame rate: `wait()` sleeps
+until the next frame's deadline (or returns at once when the loop is behind) and
+`finish()` measures the frame's work against the frame budget. Several frames over
+budget in a row step down one rung of the quality ladder; a long run of frames with
+headroom steps back up. Every change is logged with its reason, so weaker machines
+keep a steady rate at lower quality instead of falling further and further behind.
+
+Each rung (QualityLevel) sets how much of the vision image is searched (centred crop),
+the Vision downscale factor and morphology switch, and how often HUD/OCR reads run.
+"""
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from .dispatcher import DEFAULT_SPIN
+
+
+logger = logging.getLogger(__name__)
+
+# roi: fraction of the vision image's width and height searched (centred on it)
+# downscale: Vision.downscale; morphology: Vision.morphology
+# ocr_every: read the HUD/OCR fields every N-th frame
+QualityLevel = namedtuple("QualityLevel", "name roi downscale morphology ocr_every")
+
+# Cheapest-to-lose first: OCR frequency, then the opening, then resolution, then area
+DEFAULT_LADDER = (
+    QualityLevel("full", 1.0, 1, True, 1),
+    QualityLevel("ocr-4", 1.0, 1, True, 4),
+    QualityLevel("no-morphology", 1.0, 1, False, 8),
+    QualityLevel("half-res", 1.0, 2, False, 8),
+    QualityLevel("half-res-roi", 0.6, 2, False, 16),
+)
+
+
+def load_ladder(entries):
+    """QualityLevels from config dicts; missing keys fall back to the full-quality values."""
+    if not entries:
+        return DEFAULT_LADDER
+    full = DEFAULT_LADDER[0]
+    ladder = []
+    for i, e in enumerate(entries):
+        level = QualityLevel(
+            str(e.get("name", "level-%d" % i)),
+            float(e.get("roi", full.roi)),
+            int(e.get("downscale", full.downscale)),
+            bool(e.get("morphology", full.morphology)),
+            max(1, int(e.get("ocr_every", full.ocr_every))),
+        )
+        if not 0.0 < level.roi <= 1.0 or level.downscale < 1:
+            raise ValueError("invalid quality level %r: roi must be in (0, 1] and downscale >= 1" % (level,))
+        ladder.append(level)
+    return tuple(ladder)
+
+
+class FrameScheduler:
+    """Pace a loop to `fps` and adapt quality to the measured frame cost.
+
+    Args:
+        fps: target frame rate; the frame budget is 1 / fps
+        ladder: QualityLevels from best to cheapest
+        down_after: consecutive over-budget frames before stepping down
+        up_after: consecutive frames under `headroom` * budget before stepping up
+        headroom: fraction of the budget a frame must stay under to count towards stepping up
+        clock: time source (perf_counter; inject a fake one for tests)
+        spin: final stretch before a deadline that is spun instead of slept
+    """
+
+    def __init__(
+        self,
+        fps: float = 30.0,
+        ladder=DEFAULT_LADDER,
+        down_after: int = 3,
+        up_after: int = 90,
+        headroom: float = 0.6,
+        clock=time.perf_counter,
+        spin: float = DEFAULT_SPIN,
+    ):
+        if fps <= 0:
+            raise ValueError("fps must be positive")
+        self.budget = 1.0 / fps
+        self.ladder = tuple(ladder)
+        self.down_after = down_after
+        self.up_after = up_after
+        self.headroom = headroom
+        self.clock = clock
+        self.spin = spin
+        self.index = 0
+        self.frames = 0
+        self.over_budget = 0
+        self.late = 0
+        self.changes = []
+        self._over = 0
+        self._under = 0
+        self._deadline = None
+        self._started = None
+        # a pipeline waits on its capture thread, finishes on its vision thread, and
+        # the main thread resets after a pause
+        self._lock = threading.Lock()
+
+    @property
+    def level(self):
+        return self.ladder[self.index]
+
+    def reset(self):
+        """Forget the schedule (e.g. after a pause) so the next frame starts immediately."""
+        with self._lock:
+            self._deadline = None
+            self._started = None
+            self._over = 0
+            self._under = 0
+
+    def wait(self, stop=None):
+        """Sleep until the next frame is due; returns False if `stop` (an Event) was set meanwhile."""
+        with self._lock:
+            now = self.clock()
+            if self._deadline is None or now - self._deadline > self.budget:
+                # first frame, or more than a whole frame behind: start a fresh schedule
+                # instead of rushing through the missed frames
+                if self._deadline is not None:
+                    self.late += 1
+                self._deadline = now
+            # sleep on a copy: reset() may clear the schedule meanwhile
+            deadline = self._deadline
+            self._deadline += self.budget
+        delay = deadline - now - self.spin
+        if delay > 0 and stop is not None and stop.wait(delay):
+            return False
+        if delay > 0 and stop is None:
+            time.sleep(delay)
+        while self.clock() < deadline:
+            time.sleep(0)
+        with self._lock:
+            self._started = self.clock()
+        return stop is None or not stop.is_set()
+
+    def finish(self, cost=None):
+        """Record the current frame's cost and adjust the quality level; returns the cost in seconds.
+
+        The cost defaults to the time since `wait` returned. A pipeline, whose stages
+        overlap frames, passes the cost of its slowest stage instead.
+        """
+        with self._lock:
+            return self._finish(cost)
+
+    def _finish(self, cost):
+        if cost is None:
+            if self._started is None:
+                return 0.0
+            cost = self.clock() - self._started
+            self._started = None
+        self.frames += 1
+        if cost > self.budget:
+            self.over_budget += 1
+            self._over += 1
+            self._under = 0
+            if self._over >= self.down_after and self.index < len(self.ladder) - 1:
+                self._step(+1, "%d frames over the %.1f ms budget (last %.1f ms)" % (self._over, self.budget * 1000, cost * 1000))
+        else:
+            self._over = 0
+            if cost < self.headroom * self.budget:
+                self._under += 1
+                if self._under >= self.up_after and self.index > 0:
+                    self._step(-1, "%d frames under %.0f%% of the budget (last %.1f ms)" % (self._under, self.headroom * 100, cost * 1000))
+            else:
+                self._under = 0
+        return cost
+
+    def _step(self, direction, reason):
+        old = self.level
+        self.index += direction
+        self._over = 0
+        self._under = 0
+        self.changes.append((self.frames, old.name, self.level.name, reason))
+        logger.info("Pacing: quality %s -> %s: %s", old.name, self.level.name, reason)
+
+    def ocr_due(self):
+        """True on frames where HUD/OCR fields should be read at the current level."""
+        return self.frames % self.level.ocr_every == 0
+
+    def detect(self, vision, image):
+        """Run `vision.find_enemies` at the current level; coordinates stay relative to `image`."""
+        level = self.level
+        if hasattr(vision, "downscale"):
+            vision.downscale = level.downscale
+            vision.morphology = level.morphology
+        if level.roi >= 1.0:
+            return vision.find_enemies(image)
+        h, w = image.shape[:2]
+        ch, cw = int(h * level.roi), int(w * level.roi)
+        y0, x0 = (h - ch) // 2, (w - cw) // 2
+        return [(x + x0, y + y0, area) for x, y, area in vision.find_enemies(image[y0:y0 + ch, x0:x0 + cw])]
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "over_budget": self.over_budget,
+            "late": self.late,
+            "level": self.level.name,
+            "changes": len(self.changes),
+        }
@@ -0,0 +1,310 @@
+"""Staged concurrent pipeline: capture -> vision -> AI -> input.
+
+Each stage runs on its own thread and hands work to the next through a bounded
+StageQueue, so throughput is set by the slowest stage rather than the sum of all of
+them. With the default "latest" policy a slow stage always works on the freshest
+frame and stale ones are dropped instead of piling up.
+"""
+import time
+import logging
+import threading
+from collections import deque
+
+from . import flightrec
+
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("latest", "drop_oldest", "block")
+
+
+class StageQueue:
+    """Bounded hand-off between two stages.
+
+    Policies:
+        latest: hold a single item; a new item replaces one that was not taken yet
+        drop_oldest: hold up to `maxsize` items, discarding the oldest when full
+        block: hold up to `maxsize` items and make the producer wait (no drops; for replay)
+    """
+
+    def __init__(self, maxsize: int = 1, policy: str = "latest", on_drop=None):
+        if policy not in POLICIES:
+            raise ValueError("unknown queue policy %r (expected one of %s)" % (policy, ", ".join(POLICIES)))
+        self.maxsize = 1 if policy == "latest" else max(1, int(maxsize))
+        self.policy = policy
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, item):
+        """Queue `item`; only the "block" policy ever waits. Returns False once closed."""
+        with self._cond:
+            if self.policy == "block":
+                self._cond.wait_for(lambda: self._closed or len(self._items) < self.maxsize)
+            if self._closed:
+                dropped = item
+            else:
+                dropped = self._items.popleft() if len(self._items) >= self.maxsize else None
+                self._items.append(item)
+                self._cond.notify_all()
+            if dropped is not None:
+                self.dropped += 1
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return not self._closed
+
+    def get(self, timeout: float | None = None):
+        """Return the next item, or None on timeout or once closed and drained."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout) or not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self, discard: bool = False):
+        """Stop accepting items and wake everyone up.
+
+        Consumers still drain what is queued unless `discard` is set, in which case
+        pending items go straight to `on_drop`.
+        """
+        with self._cond:
+            self._closed = True
+            pending = list(self._items) if discard else []
+            if discard:
+                self._items.clear()
+            self._cond.notify_all()
+        if self.on_drop is not None:
+            for item in pending:
+                self.on_drop(item)
+
+
+class Packet:
+    """One frame's trip through the pipeline, with a perf_counter() stamp per stage."""
+
+    __slots__ = ("frame", "enemies", "action", "stamps")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.enemies = None
+        self.action = None
+        self.stamps = {"capture": frame.timestamp}
+
+    @property
+    def latency(self):
+        """Capture-to-last-stage latency in seconds."""
+        return max(self.stamps.values()) - self.stamps["capture"]
+
+
+class Pipeline:
+    """Run capture, vision, AI and input as concurrent stages.
+
+    Args:
+        source: FrameSource to pull frames from (live capture or replay)
+        vision: Vision instance
+        ai: SimpleAI instance
+        act: callable(action_dict) run on the input stage, e.g. to press keys
+        exit_event: threading.Event that stops the pipeline when set
+        running: optional threading.Event; capture idles while it is clear (paused)
+        policy / queue_size: StageQueue settings for every link
+        on_packet: optional callable(Packet) run after the input stage
+        report_interval: seconds between throughput/latency log lines (0 disables)
+        telemetry: optional Telemetry; records vision, ai, input and end-to-end latency
+        gate: optional callable(Frame) -> bool; frames it rejects (e.g. menus) skip vision
+        scheduler: optional pacing.FrameScheduler; capture starts frames on its schedule
+            and vision runs at its quality level, stepping it by the vision stage's cost
+    """
+
+    def __init__(
+        self,
+        source,
+        vision,
+        ai,
+        act=None,
+        exit_event=None,
+        running=None,
+        policy: str = "latest",
+        queue_size: int = 1,
+        on_packet=None,
+        report_interval: float = 5.0,
+        telemetry=None,
+        gate=None,
+        scheduler=None,
+    ):
+        self.source = source
+        self.vision = vision
+        self.ai = ai
+        self.act = act
+        self.exit_event = exit_event or threading.Event()
+        self.running = running
+        self.on_packet = on_packet
+        self.report_interval = report_interval
+        self.telemetry = telemetry
+        self.gate = gate
+        self.scheduler = scheduler
+        self._stop = threading.Event()
+        self._threads = []
+        self.to_vision = StageQueue(queue_size, policy, on_drop=self._release)
+        self.to_ai = StageQueue(queue_size, policy)
+        self.to_input = StageQueue(queue_size, policy)
+        self.completed = 0
+        self.latencies = deque(maxlen=1000)
+        self.exhausted = threading.Event()
+        self._started = None
+
+    def _release(self, packet):
+        self.source.release(packet.frame)
+
+    @property
+    def stopping(self):
+        return self._stop.is_set() or self.exit_event.is_set()
+
+    def start(self):
+        self._started = time.perf_counter()
+        for name, target in (
+            ("capture", self._capture_stage),
+            ("vision", self._vision_stage),
+            ("ai", self._ai_stage),
+            ("input", self._input_stage),
+        ):
+            t = threading.Thread(target=self._guard, args=(name, target), name="pipeline-" + name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info("Pipeline: started (policy=%s)", self.to_vision.policy)
+
+    def stop(self, timeout: float = 2.0):
+        """Stop all stages and wait for them to exit."""
+        self._stop.set()
+        for q in (self.to_vision, self.to_ai, self.to_input):
+            q.close(discard=True)
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+        self.log_stats()
+
+    def run(self):
+        """Start, block until the source runs out or exit is requested, then stop."""
+        self.start()
+        try:
+            while not self.stopping:
+                if self.exhausted.wait(0.1):
+                    # let the last frames drain through the later stages
+                    for t in self._threads[1:]:
+                        t.join()
+                    break
+        finally:
+            self.stop()
+
+    def _guard(self, name, target):
+        try:
+            target()
+        except Exception:
+            logger.exception("Pipeline: %s stage failed", name)
+            flightrec.record(flightrec.MARK, name="pipeline %s stage failed" % name)
+            self._stop.set()
+
+    def _capture_stage(self):
+        last_seq = 0
+        while not self.stopping:
+            if self.running is not None and not self.running.wait(0.1):
+                continue
+            if self.scheduler is not None and not self.scheduler.wait(self.exit_event):
+                continue
+            frame = self.source.acquire(last_seq, timeout=0.1)
+            if frame is None:
+                if self.source.finite:
+                    break
+                continue
+            last_seq = frame.seq
+            if self.gate is not None and not self.gate(frame):
+                self.source.release(frame)
+                continue
+            self.to_vision.put(Packet(frame))
+        self.exhausted.set()
+        self.to_vision.close()
+
+    def _vision_stage(self):
+        while True:
+            packet = self.to_vision.get(timeout=0.1)
+            if packet is None:
+                if self._stop.is_set() or self.to_vision.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            try:
+                if self.scheduler is not None:
+                    packet.enemies = self.scheduler.detect(self.vision, packet.frame.image)
+                else:
+                    packet.enemies = self.vision.find_enemies(packet.frame.image)
+            finally:
+                self.source.release(packet.frame)
+            packet.stamps["vision"] = time.perf_counter()
+            if self.scheduler is not None:
+                self.scheduler.finish(packet.stamps["vision"] - start)
+            if self.telemetry is not None:
+                self.telemetry.record("vision", packet.stamps["vision"] - start)
+            self.to_ai.put(packet)
+        self.to_ai.close()
+
+    def _ai_stage(self):
+        while True:
+            packet = self.to_ai.get(timeout=0.1)
+            if packet is None:
+                if self._stop.is_set() or self.to_ai.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            packet.action = self.ai.decide(packet.enemies, packet.frame.timestamp)
+            packet.stamps["ai"] = time.perf_counter()
+            if self.telemetry is not None:
+                self.telemetry.record("ai", packet.stamps["ai"] - start)
+            self.to_input.put(packet)
+        self.to_input.close()
+
+    def _input_stage(self):
+        last_report = time.perf_counter()
+        while True:
+            packet = self.to_input.get(timeout=0.1)
+            if packet is None:
+                if self._stop.is_set() or self.to_input.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            if self.act is not None:
+                self.act(packet.action)
+            now = time.perf_counter()
+            packet.stamps["input"] = now
+            latency = packet.latency
+            if self.telemetry is not None:
+                self.telemetry.record("input", now - start)
+                self.telemetry.record("end_to_end", latency)
+            self.latencies.append(latency)
+            self.ai.report_latency(latency)
+            self.completed += 1
+            if self.on_packet is not None:
+                self.on_packet(packet)
+            if self.report_interval and now - last_report >= self.report_interval:
+                last_report = now
+                self.log_stats()
+
+    def log_stats(self):
+        if not self.latencies or self._started is None:
+            return
+        elapsed = time.perf_counter() - self._started
+        lat = sorted(self.latencies)
+        logger.info(
+            "Pipeline: %d frames (%.1f fps), latency p50=%.1fms p95=%.1fms, dropped vision/ai/input=%d/%d/%d",
+            self.completed,
+            self.completed / elapsed if elapsed > 0 else 0.0,
+            lat[len(lat) // 2] * 1000,
+            lat[int(len(lat) * 0.95)] * 1000,
+            self.to_vision.dropped,
+            self.to_ai.dropped,
+            self.to_input.dropped,
+        )
@@ -0,0 +1,155 @@
+"""Frame recordings: write captured frames to disk and replay them without a display.
+
+File layout (little endian):
+
+    [0, 64)            header: magic, version, height, width, channels, count, index offset
+    [4096, ...)        frames: `count` raw HxWxC uint8 images back to back
+    [index offset, ..) index: `count` records of (seq int64, timestamp float64)
+
+Frames start on a page boundary so the replay side can memory-map them as one
+(count, H, W, C) array and hand out views without copying.
+"""
+import time
+import struct
+import logging
+
+import numpy as np
+
+from .capture import Frame, FrameSource
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WMREC\x00\x00\x00"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIIIIQQ")
+FRAMES_OFFSET = 4096
+INDEX_DTYPE = np.dtype([("seq", "<i8"), ("timestamp", "<f8")])
+
+
+class FrameRecorder(FrameSource):
+    """Pass-through frame source that also appends every new frame to a recording file.
+
+    Wrap any FrameSource (normally the live capture); frames are written as they are
+    read, and the index is written when the recorder is closed.
+    """
+
+    def __init__(self, source, path, max_frames: int | None = None):
+        self.source = source
+        self.path = path
+        self.max_frames = max_frames
+        self._file = open(path, "wb")
+        self._shape = None
+        self._seqs = []
+        self._timestamps = []
+        self._last_seq = None
+        self.finite = source.finite
+
+    def __len__(self):
+        return len(self._seqs)
+
+    def _record(self, frame):
+        if frame is not None and frame.seq != self._last_seq:
+            self._last_seq = frame.seq
+            if self.max_frames is None or len(self._seqs) < self.max_frames:
+                self.write(frame)
+        return frame
+
+    def read(self):
+        return self._record(self.source.read())
+
+    def acquire(self, after_seq: int = 0, timeout: float | None = None):
+        return self._record(self.source.acquire(after_seq, timeout))
+
+    def release(self, frame):
+        self.source.release(frame)
+
+    def write(self, frame):
+        """Append one Frame to the recording."""
+        img = frame.image
+        if self._shape is None:
+            if img.dtype != np.uint8 or img.ndim != 3:
+                raise ValueError("expected an HxWxC uint8 image, got %s %s" % (img.dtype, img.shape))
+            self._shape = img.shape
+            self._file.seek(FRAMES_OFFSET)
+        elif img.shape != self._shape:
+            raise ValueError("frame shape changed from %s to %s" % (self._shape, img.shape))
+        self._file.write(np.ascontiguousarray(img).data)
+        self._seqs.append(frame.seq)
+        self._timestamps.append(frame.timestamp)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            height, width, channels = self._shape or (0, 0, 0)
+            count = len(self._seqs)
+            index = np.empty(count, dtype=INDEX_DTYPE)
+            index["seq"] = self._seqs
+            index["timestamp"] = self._timestamps
+            index_offset = FRAMES_OFFSET + count * height * width * channels
+            self._file.seek(index_offset)
+            self._file.write(index.tobytes())
+            self._file.seek(0)
+            self._file.write(_HEADER.pack(MAGIC, VERSION, height, width, channels, 0, count, index_offset))
+            logger.info("Recording: wrote %d frames to %s", count, self.path)
+        finally:
+            self._file.close()
+            self.source.close()
+
+
+class ReplaySource(FrameSource):
+    """Frame source that replays a recording from a memory-mapped file.
+
+    Images are read-only views into the mapping, so replay never copies pixel data.
+    With `realtime=True` frames are paced by their recorded timestamps; otherwise they
+    are returned as fast as the caller asks. Frame timestamps are rebased onto the
+    current `time.perf_counter()` clock so latency measurements downstream still work.
+    """
+
+    finite = True
+
+    def __init__(self, path, realtime: bool = False, loop: bool = False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        with open(path, "rb") as f:
+            magic, version, height, width, channels, _, count, index_offset = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a wingman recording" % path)
+        self.shape = (height, width, channels)
+        if count:
+            self.frames = np.memmap(path, dtype=np.uint8, mode="r", offset=FRAMES_OFFSET, shape=(count,) + self.shape)
+            self.index = np.memmap(path, dtype=INDEX_DTYPE, mode="r", offset=index_offset, shape=(count,))
+        else:
+            # np.memmap refuses zero-length mappings
+            self.frames = np.empty((0,) + self.shape, dtype=np.uint8)
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+        self._pos = 0
+        self._t0 = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def read(self):
+        if self._pos >= len(self.frames):
+            if not self.loop or not len(self.frames):
+                return None
+            self._pos = 0
+            self._t0 = None
+        i = self._pos
+        self._pos += 1
+        now = time.perf_counter()
+        if self.realtime:
+            if self._t0 is None:
+                self._t0 = now - float(self.index["timestamp"][i])
+            ts = self._t0 + float(self.index["timestamp"][i])
+            if ts > now:
+                time.sleep(ts - now)
+        else:
+            ts = now
+        return Frame(int(self.index["seq"][i]), ts, self.frames[i])
+
+    def rewind(self):
+        self._pos = 0
+        self._t0 = None
@@ -0,0 +1,244 @@
+"""Reactive rules: per-frame screen-state triggers.
+
+Rules come from the `rules:` section of config.yaml and are compiled once into
+predicates over a flat dict of per-frame facts:
+
+    <class>.count      blobs of a color class this frame (e.g. missile_warning.count)
+    <class>.max_area   area of its largest blob (0 when there is none)
+    hud.<field>        last number read from a HUD field (e.g. hud.altitude)
+
+A condition is "<fact> <op> <number>" with op one of < <= > >= == !=, or a bare class
+name meaning "<class>.count >= 1". `when:` takes one condition or a list that must all
+hold. Facts that are missing (a HUD field not read yet) make the condition false.
+
+Every frame the engine checks rules from highest priority down. A rule fires once its
+condition has held for `for_frames` frames in a row and its `cooldown` has passed; each
+key is pressed by at most one rule per frame. `interrupt: true` cancels a running
+mission's inputs first (other holds, such as the weapon loop, keep going). The time from frame capture to the key press is recorded per rule and
+checked against a latency target.
+"""
+import re
+import time
+import logging
+import operator
+
+from .controller import ACTIONS
+from .telemetry import LogHistogram
+
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_CONDITION = re.compile(r"^\s*([A-Za-z_][\w.]*)\s*(?:(<=|>=|==|!=|<|>)\s*(-?\d+(?:\.\d*)?)\s*)?$")
+
+
+class RuleError(ValueError):
+    """A rule in config cannot be compiled."""
+
+
+def compile_condition(text):
+    """Compile one condition string into (predicate(facts) -> bool, fact name)."""
+    m = _CONDITION.match(str(text))
+    if not m:
+        raise RuleError("cannot parse condition %r (expected '<fact> <op> <number>')" % (text,))
+    fact, op, value = m.groups()
+    if op is None:
+        if "." in fact:
+            raise RuleError("condition %r needs a comparison" % (text,))
+        fact, op, value = fact + ".count", ">=", "1"
+    compare = OPERATORS[op]
+    threshold = float(value)
+
+    def predicate(facts):
+        v = facts.get(fact)
+        return v is not None and compare(v, threshold)
+
+    return predicate, fact
+
+
+def frame_facts(detections=None, hud=None):
+    """Facts for one frame from {class: detections} and a HUD read ({field: "123"}).
+
+    Detections may be ENEMY_DTYPE arrays or lists of (x, y, area).
+    """
+    facts = {}
+    for name, found in (detections or {}).items():
+        n = len(found)
+        facts[name + ".count"] = n
+        if not n:
+            facts[name + ".max_area"] = 0.0
+        elif hasattr(found, "dtype"):
+            facts[name + ".max_area"] = float(found["area"].max())
+        else:
+            facts[name + ".max_area"] = float(max(e[2] for e in found))
+    for field, text in (hud or {}).items():
+        try:
+            facts["hud." + field] = float(str(text).split()[0])
+        except (ValueError, IndexError):
+            continue
+    return facts
+
+
+class Rule:
+    """One compiled rule; see the module docstring for the fields."""
+
+    def __init__(self, name, conditions, action, hold=None, priority=0, for_frames=1, cooldown=0.5, interrupt=False, target=0.05):
+        if action not in ACTIONS:
+            raise RuleError("rule %r: unknown action %r (expected one of %s)" % (name, action, ", ".join(ACTIONS)))
+        if isinstance(conditions, str):
+            conditions = [conditions]
+        if not conditions:
+            raise RuleError("rule %r has no condition" % (name,))
+        compiled = [compile_condition(c) for c in conditions]
+        self.name = name
+        self.conditions = list(conditions)
+        self.facts = {fact for _, fact in compiled}
+        predicates = [p for p, _ in compiled]
+        self.predicate = predicates[0] if len(predicates) == 1 else (lambda facts: all(p(facts) for p in predicates))
+        self.action = action
+        self.key, default_hold = ACTIONS[action]
+        self.hold = float(default_hold if hold is None else hold)
+        self.priority = priority
+        self.for_frames = max(1, int(for_frames))
+        self.cooldown = float(cooldown)
+        self.interrupt = interrupt
+        self.latency = LogHistogram(budget=target)
+        self.fired = 0
+        self.streak = 0
+        self.last_fired = None
+
+
+def load_rules(entries, target=0.05):
+    """Compile the `rules:` list from config into Rules, highest priority first."""
+    rules = []
+    for i, e in enumerate(entries or []):
+        try:
+            rules.append(
+                Rule(
+                    e.get("name", "rule-%d" % i),
+                    e.get("when"),
+                    e.get("do"),
+                    hold=e.get("hold"),
+                    priority=e.get("priority", 0),
+                    for_frames=e.get("for_frames", 1),
+                    cooldown=e.get("cooldown", 0.5),
+                    interrupt=e.get("interrupt", False),
+                    target=e.get("target_latency_ms", target * 1000) / 1000.0,
+                )
+            )
+        except AttributeError:
+            raise RuleError("rule %d must be a mapping with `when` and `do`" % i) from None
+    names = [r.name for r in rules]
+    if len(set(names)) != len(names):
+        raise RuleError("rule names must be unique")
+    return sorted(rules, key=lambda r: -r.priority)
+
+
+def rule_classes(rules):
+    """Color classes `rules` look at (so callers only detect what is needed)."""
+    return sorted({fact.split(".", 1)[0] for r in rules for fact in r.facts if not fact.startswith("hud.")})
+
+
+class RuleEngine:
+    """Evaluate rules every frame and fire their actions through a Controller.
+
+    Args:
+        rules: Rules (see `load_rules`)
+        controller: Controller whose dispatcher performs the actions
+        clock: time source matching frame timestamps (perf_counter)
+    """
+
+    def __init__(self, rules, controller, clock=time.perf_counter):
+        self.rules = sorted(rules, key=lambda r: -r.priority)
+        self.controller = controller
+        self.clock = clock
+        self._pending = []
+
+    @property
+    def classes(self):
+        """Color classes the rules look at (so callers only detect what is needed)."""
+        return rule_classes(self.rules)
+
+    def evaluate(self, facts, timestamp=None):
+        """Check every rule against this frame's facts; returns the rules that fired.
+
+        `timestamp` is the perf_counter() time the frame was captured; the latency of
+        each fired action is measured from it.
+        """
+        self._collect()
+        now = self.clock()
+        if timestamp is None:
+            timestamp = now
+        fired = []
+        pressed = set()
+        for rule in self.rules:
+            if not rule.predicate(facts):
+                rule.streak = 0
+                continue
+            rule.streak += 1
+            if rule.streak < rule.for_frames or rule.key in pressed:
+                continue
+            if rule.last_fired is not None and now - rule.last_fired < rule.cooldown:
+                continue
+            if rule.interrupt and self.controller.mission_running:
+                logger.info("Rules: %s interrupts the running mission", rule.name)
+                self.controller.interrupt_mission()
+            hold = self.controller.perform(rule.action, rule.hold, label="rule:" + rule.name)
+            rule.last_fired = now
+            rule.fired += 1
+            pressed.add(rule.key)
+            fired.append(rule)
+            if hold is not None:
+                self._pending.append((rule, hold, timestamp))
+            logger.debug("Rules: %s -> %s", rule.name, rule.action)
+        return fired
+
+    def _collect(self):
+        """Record detection-to-press latency for actions the dispatcher has pressed since."""
+        if not self._pending:
+            return
+        waiting = []
+        for rule, hold, timestamp in self._pending:
+            if hold.pressed_at is not None:
+                rule.latency.record(hold.pressed_at - timestamp)
+            elif not hold.done.is_set():
+                waiting.append((rule, hold, timestamp))
+        self._pending = waiting
+
+    def report(self):
+        """{rule name: firing count and detection-to-press latency stats in ms}."""
+        self._collect()
+        out = {}
+        for r in self.rules:
+            h = r.latency
+            out[r.name] = {
+                "fired": r.fired,
+                "p50_ms": h.percentile(50) * 1000,
+                "p99_ms": h.percentile(99) * 1000,
+                "max_ms": h.max * 1000,
+                "target_ms": h.budget * 1000,
+                "over_target": h.misses,
+            }
+        return out
+
+    def log_summary(self):
+        for name, s in self.report().items():
+            if s["fired"]:
+                logger.info(
+                    "Rules: %-16s fired %d, latency p50=%.1fms p99=%.1fms max=%.1fms, %d over %.0fms target",
+                    name,
+                    s["fired"],
+                    s["p50_ms"],
+                    s["p99_ms"],
+                    s["max_ms"],
+                    s["over_target"],
+                    s["target_ms"],
+                )
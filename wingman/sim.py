@@ -0,0 +1,318 @@
+"""Deterministic closed-loop simulator for end-to-end testing without the game.
+
+The Simulator is a FrameSource that renders a HUD scene on a virtual clock: colored
+enemy markers drifting over a textured world larger than the screen, plus numeric
+altitude and speed fields. It owns the input side as well. A SimBackend records
+which keys are held, and an InputDispatcher on the same virtual clock (driven with
+`process_due`, no thread) presses and releases them at their scheduled times, so
+the view pitches and rolls while the keys are down. Vision, SimpleAI and a real
+Controller built on these run as one closed loop:
+
+    python -m wingman.sim --seconds 30 --seed 1 --tracker
+
+Everything the loop sees and does depends only on the seed, so two runs with the same
+settings take identical decisions and report the same time-on-target and hits. The
+costs are measured on the wall clock: per-frame processing time (vision, AI,
+steering and HUD reads), capture-to-input latency of frames that pressed a key, and the frame rate
+that processing would sustain. Compare those between pipeline changes, or use
+`python -m wingman.bench sim` against a baseline.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+
+import cv2
+import numpy as np
+
+from .ai import SimpleAI
+from .backends import InputBackend, InputEvent
+from .capture import Frame, FrameSource
+from .controller import ACTIONS, Controller
+from .digits import DigitRecognizer
+from .dispatcher import InputDispatcher
+from .synth import FrameGenerator
+from .telemetry import LogHistogram
+from .tracker import Tracker
+from .vision import Vision
+
+
+logger = logging.getLogger(__name__)
+
+ENEMY_HSV = ([0, 120, 120], [10, 255, 255])
+
+# direction the view moves (x, y) while a key is held; markers move the other way on screen
+STEERING = {
+    ACTIONS["roll_left"][0]: (-1, 0),
+    ACTIONS["roll_right"][0]: (1, 0),
+    ACTIONS["nose_up"][0]: (0, -1),
+    ACTIONS["nose_down"][0]: (0, 1),
+}
+FIRE_KEY = ACTIONS["fire_weapon"][0]
+
+# HUD fields as fractions of the screen (x, y, w, h), drawn as white digits on black
+HUD_LAYOUT = {"altitude": (0.02, 0.04, 0.12, 0.05), "speed": (0.02, 0.11, 0.12, 0.05)}
+
+
+class SimBackend(InputBackend):
+    """Input backend of a Simulator: keeps the held keys and logs events in virtual time."""
+
+    name = "sim"
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.held = set()
+        self.events = []
+
+    def press(self, key):
+        self.held.add(key)
+        self.events.append(InputEvent(int(round(self.sim.now * 1e9)), "press", key))
+        if key == FIRE_KEY:
+            self.sim.shoot()
+
+    def release(self, key):
+        self.held.discard(key)
+        self.events.append(InputEvent(int(round(self.sim.now * 1e9)), "release", key))
+
+
+class Simulator(FrameSource):
+    """Seeded HUD scene on a virtual clock.
+
+    Args:
+        width, height: screen size
+        fps: virtual frame rate; `read()` advances the clock by 1 / fps
+        blobs: number of enemy markers in the world
+        world: world size as a multiple of the screen size (markers off screen are not drawn)
+        speed: max marker speed in pixels per frame
+        pan_rate: pixels per second the view moves while a steering key is held
+        hit_radius: a shot hits when a marker centre is this close to the crosshair
+        noise, hsv_lower, hsv_upper, seed: see synth.FrameGenerator
+    """
+
+    def __init__(
+        self,
+        width: int = 1280,
+        height: int = 720,
+        fps: float = 30.0,
+        blobs: int = 4,
+        world: float = 2.0,
+        speed: float = 3.0,
+        pan_rate: float = 400.0,
+        hit_radius: float = 40.0,
+        noise: float = 0.0,
+        hsv_lower=ENEMY_HSV[0],
+        hsv_upper=ENEMY_HSV[1],
+        seed: int = 0,
+    ):
+        self.width = width
+        self.height = height
+        self.period = 1.0 / fps
+        self.pan_rate = pan_rate
+        self.hit_radius = hit_radius
+        self.world = FrameGenerator(int(width * world), int(height * world), blobs, 0.0, hsv_lower, hsv_upper, speed=speed, seed=seed)
+        self.noise = float(noise)
+        self.rng = np.random.default_rng(seed + 1)
+        self.hud_fields = {
+            name: (int(fx * width), int(fy * height), int(fw * width), int(fh * height)) for name, (fx, fy, fw, fh) in HUD_LAYOUT.items()
+        }
+        self.now = 0.0
+        self.seq = 0
+        self.view = np.array([(self.world.width - width) / 2.0, (self.world.height - height) / 2.0])
+        self.shots = 0
+        self.hits = 0
+        self.backend = SimBackend(self)
+        self.dispatcher = InputDispatcher(self.backend.press, self.backend.release, clock=self.clock)
+        self._moved_at = 0.0
+
+    def clock(self):
+        return self.now
+
+    def controller(self):
+        """A Controller whose keys go to this simulator on its virtual clock."""
+        return Controller((0, 0, self.width, self.height), backend=self.backend, dispatcher=self.dispatcher)
+
+    def _move_view(self, until):
+        dt = until - self._moved_at
+        if dt > 0:
+            for key in self.backend.held:
+                d = STEERING.get(key)
+                if d is not None:
+                    self.view += np.array(d) * self.pan_rate * dt
+            np.clip(self.view, 0, (self.world.width - self.width, self.world.height - self.height), out=self.view)
+            self._moved_at = until
+        self.now = until
+
+    def advance(self, until):
+        """Move the clock to `until`, pressing and releasing keys at their due times on the way."""
+        while True:
+            due = self.dispatcher.next_due()
+            if due is None or due > until:
+                break
+            self._move_view(max(due, self._moved_at))
+            self.dispatcher.process_due(self.now)
+        self._move_view(until)
+
+    def screen_positions(self):
+        """(N, 2) marker centres in screen coordinates (some may be off screen)."""
+        return self.world.pos - self.view
+
+    def on_target(self):
+        """True when some marker centre is within `hit_radius` of the crosshair."""
+        d = self.screen_positions() - (self.width / 2.0, self.height / 2.0)
+        return bool(len(d)) and float(np.hypot(d[:, 0], d[:, 1]).min()) <= self.hit_radius
+
+    def shoot(self):
+        self.shots += 1
+        if self.on_target():
+            self.hits += 1
+
+    def hud_truth(self):
+        """{field: "123"} that the current frame shows."""
+        steering = sum(1 for key in self.backend.held if key in STEERING)
+        return {"altitude": str(int(5000 - self.view[1])), "speed": str(520 - 40 * steering)}
+
+    def render(self):
+        x0, y0 = (int(round(v)) for v in self.view)
+        frame = self.world.background[y0:y0 + self.height, x0:x0 + self.width].copy()
+        for (x, y), r in zip(np.rint(self.screen_positions()).astype(np.int32), self.world.radius):
+            if -r <= x < self.width + r and -r <= y < self.height + r:
+                cv2.circle(frame, (int(x), int(y)), int(r), self.world.color, -1)
+        for name, text in self.hud_truth().items():
+            x, y, w, h = self.hud_fields[name]
+            frame[y:y + h, x:x + w] = 0
+            cv2.putText(frame, text, (x + 4, y + h - 6), cv2.FONT_HERSHEY_SIMPLEX, h / 40.0, (255, 255, 255), 2, cv2.LINE_AA)
+        if self.noise:
+            noisy = frame.astype(np.float32)
+            noisy += self.rng.standard_normal(noisy.shape, dtype=np.float32) * self.noise
+            frame = np.clip(noisy, 0, 255, out=noisy).astype(np.uint8)
+        return frame
+
+    def read(self):
+        """Advance one frame (inputs, view and markers) and return it; timestamps are virtual."""
+        if self.seq:
+            self.advance(self.now + self.period)
+            self.world.step()
+        self.seq += 1
+        return Frame(self.seq, self.now, self.render())
+
+
+def steer(ctrl, decision, sim, deadzone: float = 30.0, hold: float = 0.05):
+    """Turn an AI decision into steering holds (and a shot when the target is on the crosshair).
+
+    Returns the number of actions issued.
+    """
+    target = decision.get("target")
+    if target is None:
+        return 0
+    dx = target[0] - sim.width / 2.0
+    dy = target[1] - sim.height / 2.0
+    issued = 0
+    if abs(dx) > deadzone:
+        ctrl.perform("roll_left" if dx < 0 else "roll_right", hold)
+        issued += 1
+    if abs(dy) > deadzone:
+        ctrl.perform("nose_up" if dy < 0 else "nose_down", hold)
+        issued += 1
+    if decision.get("fire") and np.hypot(dx, dy) <= sim.hit_radius:
+        ctrl.perform("fire_weapon")
+        issued += 1
+    return issued
+
+
+def run(sim, vision, ai, seconds: float = 20.0, input_delay: float = 0.05, hud: bool = False, train_frames: int = 10):
+    """Run the closed loop for `seconds` of virtual time; returns the report dict.
+
+    Inputs decided on a frame take effect `input_delay` virtual seconds after it was
+    captured, which is also the latency the AI leads its targets by.
+    With `hud`, a DigitRecognizer learns the HUD font from the first `train_frames`
+    frames and then reads every frame, and the share of correct reads is reported.
+    """
+    ctrl = sim.controller()
+    ai.report_latency(input_delay)
+    digits = DigitRecognizer(sim.hud_fields) if hud else None
+    cost = LogHistogram(budget=sim.period)
+    reaction = LogHistogram(budget=sim.period)
+    frames = on_target = reads = correct = 0
+    busy = 0.0
+    try:
+        while sim.now < seconds:
+            frame = sim.read()
+            start = time.perf_counter()
+            truth = sim.hud_truth()
+            enemies = vision.find_enemies(frame.image)
+            decision = ai.decide(enemies, frame.timestamp)
+            sim.now = frame.timestamp + input_delay
+            issued = steer(ctrl, decision, sim)
+            sim.now = frame.timestamp
+            if issued:
+                reaction.record(time.perf_counter() - start)
+            if digits is not None:
+                if sim.seq <= train_frames:
+                    digits.learn(frame.image, truth)
+                else:
+                    reads += len(truth)
+                    correct += sum(digits.scan(frame.image).get(k) == v for k, v in truth.items())
+            spent = time.perf_counter() - start
+            cost.record(spent)
+            busy += spent
+            frames += 1
+            on_target += sim.on_target()
+    finally:
+        ctrl.close()
+    report = {
+        "frames": frames,
+        "fps": frames / busy if busy else 0.0,
+        "p50_ms": cost.percentile(50) * 1000,
+        "p99_ms": cost.percentile(99) * 1000,
+        "over_budget": cost.misses,
+        "reaction_p50_ms": reaction.percentile(50) * 1000,
+        "reaction_p99_ms": reaction.percentile(99) * 1000,
+        "time_on_target": on_target / frames if frames else 0.0,
+        "shots": sim.shots,
+        "hits": sim.hits,
+        "inputs": sum(1 for e in sim.backend.events if e.kind == "press"),
+    }
+    if digits is not None:
+        report["hud_accuracy"] = correct / reads if reads else 0.0
+    return report
+
+
+def run_case(seed: int = 0, seconds: float = 20.0, engine: str = "components", tracker: bool = False, downscale: int = 1, **sim_args):
+    """Build a Simulator, Vision and SimpleAI from plain options and run them; returns the report."""
+    sim = Simulator(seed=seed, **sim_args)
+    vision = Vision(*ENEMY_HSV, engine=engine, downscale=downscale)
+    ai = SimpleAI((0, 0, sim.width, sim.height), tracker=Tracker() if tracker else None, clock=sim.clock)
+    return run(sim, vision, ai, seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Closed-loop vision/AI/controller run against a simulated HUD")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Virtual seconds to simulate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fps", type=float, default=30.0, help="Virtual frame rate")
+    parser.add_argument("--blobs", type=int, default=4, help="Enemy markers in the world")
+    parser.add_argument("--noise", type=float, default=0.0, help="Per-pixel Gaussian noise")
+    parser.add_argument("--engine", default="components", help="Vision engine")
+    parser.add_argument("--downscale", type=int, default=1, help="Vision downscale factor")
+    parser.add_argument("--tracker", action="store_true", help="Decide on tracks instead of raw detections")
+    parser.add_argument("--input-delay", type=float, default=0.05, help="Virtual capture-to-input delay in seconds")
+    parser.add_argument("--hud", action="store_true", help="Also read the HUD fields and report accuracy")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report to PATH")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    sim = Simulator(fps=args.fps, blobs=args.blobs, noise=args.noise, seed=args.seed)
+    vision = Vision(*ENEMY_HSV, engine=args.engine, downscale=args.downscale)
+    ai = SimpleAI((0, 0, sim.width, sim.height), tracker=Tracker() if args.tracker else None, clock=sim.clock)
+    report = run(sim, vision, ai, args.seconds, args.input_delay, args.hud)
+    for k, v in report.items():
+        print("%-16s %s" % (k, "%.3f" % v if isinstance(v, float) else v))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Synthetic frames for benchmarks and offline testing.
+
+Frames have a dark, textured background with filled circular markers drawn in a color
+from the middle of an HSV range (normally `enemy_hsv`), plus optional Gaussian noise.
+The true marker centres are returned alongside each frame so detection results can be
+checked as well as timed.
+"""
+import cv2
+import numpy as np
+
+from .vision import ENEMY_DTYPE
+
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+
+def hsv_to_bgr(hsv):
+    """BGR color of a single HSV triple (OpenCV ranges: H 0-180, S and V 0-255)."""
+    px = np.array([[hsv]], dtype=np.uint8)
+    return tuple(int(c) for c in cv2.cvtColor(px, cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def marker_color(hsv_lower, hsv_upper):
+    """A color safely inside [hsv_lower, hsv_upper]; hue ranges wrapping past 180 are handled."""
+    lo = np.array(hsv_lower, dtype=np.int32)
+    hi = np.array(hsv_upper, dtype=np.int32)
+    mid = (lo + hi) // 2
+    if lo[0] > hi[0]:
+        mid[0] = ((lo[0] + hi[0] + 180) // 2) % 180
+    return hsv_to_bgr(mid)
+
+
+class FrameGenerator:
+    """Produce frames with moving markers.
+
+    Args:
+        width, height: frame size
+        blobs: number of markers
+        noise: standard deviation of per-pixel Gaussian noise (0 disables)
+        hsv_lower, hsv_upper: HSV range the marker color is picked from
+        radius: (min, max) marker radius in pixels
+        speed: max marker speed in pixels per frame
+        seed: RNG seed; equal seeds give identical sequences
+    """
+
+    def __init__(
+        self,
+        width=1280,
+        height=720,
+        blobs=10,
+        noise=0.0,
+        hsv_lower=(0, 120, 120),
+        hsv_upper=(10, 255, 255),
+        radius=(6, 12),
+        speed=4.0,
+        seed=0,
+    ):
+        self.width = width
+        self.height = height
+        self.noise = float(noise)
+        self.color = marker_color(hsv_lower, hsv_upper)
+        self.rng = np.random.default_rng(seed)
+        r = self.rng.integers(radius[0], radius[1] + 1, blobs)
+        self.radius = r
+        self.pos = np.column_stack((self.rng.uniform(r, width - r), self.rng.uniform(r, height - r)))
+        self.vel = self.rng.uniform(-speed, speed, (blobs, 2))
+        # dim, low-saturation background texture so it never falls in a marker range
+        small = self.rng.integers(10, 60, (max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+        self.background = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    def step(self):
+        """Advance markers one frame, bouncing off the edges."""
+        self.pos += self.vel
+        for axis, limit in ((0, self.width), (1, self.height)):
+            low = self.pos[:, axis] < self.radius
+            high = self.pos[:, axis] > limit - 1 - self.radius
+            self.vel[low | high, axis] *= -1
+            np.clip(self.pos[:, axis], self.radius, limit - 1 - self.radius, out=self.pos[:, axis])
+
+    def render(self):
+        """Return (frame, truth) for the current marker positions; truth is an ENEMY_DTYPE array."""
+        frame = self.background.copy()
+        centres = np.rint(self.pos).astype(np.int32)
+        for (x, y), r in zip(centres, self.radius):
+            cv2.circle(frame, (int(x), int(y)), int(r), self.color, -1)
+        if self.noise:
+            noisy = frame.astype(np.float32)
+            noisy += self.rng.standard_normal(noisy.shape, dtype=np.float32) * self.noise
+            frame = np.clip(noisy, 0, 255, out=noisy).astype(np.uint8)
+        truth = np.empty(len(centres), dtype=ENEMY_DTYPE)
+        truth["x"] = centres[:, 0]
+        truth["y"] = centres[:, 1]
+        truth["area"] = np.pi * self.radius.astype(np.float32) ** 2
+        return frame, truth
+
+    def __iter__(self):
+        while True:
+            frame, truth = self.render()
+            yield frame, truth
+            self.step()
+
+
+def make_frame(resolution="720p", blobs=10, noise=0.0, hsv_lower=(0, 120, 120), hsv_upper=(10, 255, 255), seed=0):
+    """One synthetic frame; `resolution` is a RESOLUTIONS name or a (width, height) pair."""
+    width, height = RESOLUTIONS[resolution] if isinstance(resolution, str) else resolution
+    return FrameGenerator(width, height, blobs, noise, hsv_lower, hsv_upper, seed=seed).render()
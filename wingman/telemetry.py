@@ -0,0 +1,219 @@
+"""Low-overhead latency telemetry.
+
+Each stage (capture, vision, ai, input, and end-to-end capture-to-keypress) records
+its duration into a fixed-size histogram with logarithmic buckets, so memory never
+grows and percentiles stay within a few percent from microseconds to seconds.
+Recording a sample is a log, a clamp and a list increment (a few hundred
+nanoseconds), so telemetry can stay enabled.
+
+Durations longer than the frame budget (16.6 ms by default, i.e. 60 fps) are counted
+as misses per stage. Snapshots are written every few seconds as JSON and as a
+Prometheus text-format file (for node_exporter's textfile collector or just `cat`).
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("capture", "vision", "ai", "input", "end_to_end")
+DEFAULT_DIR = os.path.join("~", ".cache", "wingman", "telemetry")
+
+_log10 = math.log10
+
+
+class LogHistogram:
+    """Fixed-memory histogram over [min_value, max_value) with `per_decade` log buckets.
+
+    Values below the range land in the first bucket and values above it in the last.
+    Values over `budget` are also counted in `misses`.
+    """
+
+    __slots__ = ("min_value", "max_value", "per_decade", "budget", "_lo", "_n", "counts", "count", "total", "max", "misses")
+
+    def __init__(self, min_value: float = 1e-6, max_value: float = 10.0, per_decade: int = 20, budget: float = math.inf):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.per_decade = per_decade
+        self.budget = budget
+        self._lo = math.log10(min_value)
+        self._n = int(math.ceil((math.log10(max_value) - self._lo) * per_decade))
+        self.reset()
+
+    def record(self, value):
+        if value > self.min_value:
+            i = int((_log10(value) - self._lo) * self.per_decade) + 1
+            if i > self._n:
+                i = self._n
+        else:
+            i = 0
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.budget:
+            self.misses += 1
+            if value > self.max:
+                self.max = value
+        elif value > self.max:
+            self.max = value
+
+    def upper_bounds(self):
+        """Upper edge of every bucket (the last one is open-ended)."""
+        return [self.min_value * 10 ** (i / self.per_decade) for i in range(self._n)] + [math.inf]
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100), interpolated log-linearly inside its bucket."""
+        if not self.count:
+            return 0.0
+        target = q / 100.0 * self.count
+        seen = 0
+        lower = 0.0
+        for bound, c in zip(self.upper_bounds(), self.counts):
+            if c and seen + c >= target:
+                if lower <= 0.0 or math.isinf(bound):
+                    return min(bound, self.max)
+                return min(lower * (bound / lower) ** ((target - seen) / c), self.max)
+            seen += c
+            lower = bound
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * (self._n + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.misses = 0
+
+
+class Telemetry:
+    """Per-stage latency histograms, frame-budget misses and periodic file export.
+
+    Args:
+        budget: frame budget in seconds; a stage sample above it counts as a miss
+        stage_budgets: optional {stage: seconds} overriding `budget` per stage
+        directory: where telemetry.json and telemetry.prom are written (None = no files)
+        interval: seconds between file writes once `start()`ed
+    """
+
+    def __init__(self, budget: float = 1 / 60, stage_budgets=None, directory=DEFAULT_DIR, interval: float = 5.0, stages=STAGES):
+        self.budget = budget
+        self.budgets = {stage: (stage_budgets or {}).get(stage, budget) for stage in stages}
+        self.directory = os.path.expanduser(directory) if directory else directory
+        self.interval = interval
+        self.histograms = {stage: LogHistogram(budget=self.budgets[stage]) for stage in stages}
+        self.started = time.time()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, stage, seconds):
+        """Record one `stage` duration in seconds."""
+        self.histograms[stage].record(seconds)
+
+    def recorder(self, stage):
+        """Return a callable(seconds) recording into `stage`; cheaper than `record` in hot loops."""
+        return self.histograms[stage].record
+
+    @property
+    def misses(self):
+        return {stage: h.misses for stage, h in self.histograms.items()}
+
+    def snapshot(self):
+        stages = {}
+        for stage, h in self.histograms.items():
+            stages[stage] = {
+                "count": h.count,
+                "mean_ms": h.total / h.count * 1000 if h.count else 0.0,
+                "p50_ms": h.percentile(50) * 1000,
+                "p90_ms": h.percentile(90) * 1000,
+                "p99_ms": h.percentile(99) * 1000,
+                "max_ms": h.max * 1000,
+                "budget_ms": self.budgets[stage] * 1000,
+                "budget_misses": h.misses,
+            }
+        return {"timestamp": time.time(), "uptime_s": time.time() - self.started, "stages": stages}
+
+    def prometheus(self):
+        """Snapshot in Prometheus text exposition format."""
+        lines = [
+            "# HELP wingman_stage_latency_seconds Per-stage latency.",
+            "# TYPE wingman_stage_latency_seconds histogram",
+        ]
+        for stage, h in self.histograms.items():
+            cumulative = 0
+            for bound, c in zip(h.upper_bounds(), h.counts):
+                cumulative += c
+                le = "+Inf" if math.isinf(bound) else "%.6g" % bound
+                lines.append('wingman_stage_latency_seconds_bucket{stage="%s",le="%s"} %d' % (stage, le, cumulative))
+            lines.append('wingman_stage_latency_seconds_sum{stage="%s"} %.9g' % (stage, h.total))
+            lines.append('wingman_stage_latency_seconds_count{stage="%s"} %d' % (stage, h.count))
+        lines += [
+            "# HELP wingman_frame_budget_misses_total Samples over the stage's frame budget.",
+            "# TYPE wingman_frame_budget_misses_total counter",
+        ]
+        for stage, h in self.histograms.items():
+            lines.append('wingman_frame_budget_misses_total{stage="%s"} %d' % (stage, h.misses))
+        lines += [
+            "# HELP wingman_frame_budget_seconds Frame budget per stage.",
+            "# TYPE wingman_frame_budget_seconds gauge",
+        ]
+        for stage, b in self.budgets.items():
+            lines.append('wingman_frame_budget_seconds{stage="%s"} %.6g' % (stage, b))
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write telemetry.json and telemetry.prom into `directory` (atomically)."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name, text in (
+            ("telemetry.json", json.dumps(self.snapshot(), indent=2)),
+            ("telemetry.prom", self.prometheus()),
+        ):
+            path = os.path.join(self.directory, name)
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(text)
+            os.replace(tmp, path)
+
+    def start(self):
+        """Write files every `interval` seconds on a background thread."""
+        if self._thread is None and self.directory:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        try:
+            self.flush()
+        except OSError:
+            logger.exception("Telemetry: final write failed")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Telemetry: write failed")
+
+    def log_summary(self):
+        for stage, s in self.snapshot()["stages"].items():
+            if s["count"]:
+                logger.info(
+                    "Telemetry: %-10s n=%d p50=%.2fms p99=%.2fms max=%.2fms, %d over %.1fms budget",
+                    stage,
+                    s["count"],
+                    s["p50_ms"],
+                    s["p99_ms"],
+                    s["max_ms"],
+                    s["budget_misses"],
+                    s["budget_ms"],
+                )
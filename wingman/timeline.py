@@ -0,0 +1,169 @@
+"""Declarative mission timelines.
+
+A mission is a set of parallel tracks, each a list of steps, defined in YAML
+(see missions.yaml). It is compiled once into a flat schedule of key holds at
+absolute offsets from the mission start, which is handed to the InputDispatcher in
+one go: steps never wait on each other, so there is no drift between them and
+overlapping inputs on different tracks are exact.
+
+Steps:
+    {action: afterburner, hold: 10}   hold the action's key, then continue after it
+    {action: flares, hold: 0.05, then: 1.0}
+                                      continue 1.0 s after the press instead
+    {wait: 2.5}                       pause this track
+    {repeat: 3, steps: [...]}         run nested steps several times
+
+Per-jet variants can replace or add tracks and skip actions a jet does not have.
+"""
+import os
+import logging
+from collections import namedtuple
+
+import yaml
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MISSIONS = os.path.join(os.path.dirname(__file__), "missions.yaml")
+
+# offset: seconds from mission start; hold: seconds the key is held
+ScheduledHold = namedtuple("ScheduledHold", "offset key hold label track")
+
+
+class MissionError(ValueError):
+    """A mission definition that cannot be compiled."""
+
+
+def load_missions(path=DEFAULT_MISSIONS):
+    """Return the `missions:` mapping of a missions YAML file."""
+    with open(path, "r") as f:
+        return (yaml.safe_load(f) or {}).get("missions", {})
+
+
+class Schedule:
+    """A compiled mission: holds sorted by start offset."""
+
+    def __init__(self, name, holds, jet=None):
+        self.name = name
+        self.jet = jet
+        self.holds = sorted(holds, key=lambda h: (h.offset, h.track))
+
+    @property
+    def duration(self):
+        return max((h.offset + h.hold for h in self.holds), default=0.0)
+
+    def __len__(self):
+        return len(self.holds)
+
+    def scaled(self, factor):
+        """Copy of this schedule with every offset and hold multiplied by `factor`."""
+        return Schedule(
+            self.name,
+            [h._replace(offset=h.offset * factor, hold=h.hold * factor) for h in self.holds],
+            self.jet,
+        )
+
+    def __iter__(self):
+        return iter(self.holds)
+
+
+def _compile_steps(steps, actions, skip, track, start, out, path):
+    t = start
+    for i, step in enumerate(steps or []):
+        where = "%s[%d]" % (path, i)
+        if not isinstance(step, dict):
+            raise MissionError("%s: step must be a mapping, got %r" % (where, step))
+        if "repeat" in step:
+            for _ in range(int(step["repeat"])):
+                t = _compile_steps(step.get("steps"), actions, skip, track, t, out, where)
+        elif "wait" in step:
+            t += float(step["wait"])
+        elif "action" in step:
+            name = step["action"]
+            if name not in actions:
+                raise MissionError("%s: unknown action %r (known: %s)" % (where, name, ", ".join(sorted(actions))))
+            if name in skip:
+                continue
+            key, default_hold = actions[name]
+            hold = float(step.get("hold", default_hold))
+            out.append(ScheduledHold(t, key, hold, name, track))
+            t += float(step.get("then", hold))
+        else:
+            raise MissionError("%s: expected one of action / wait / repeat, got %r" % (where, step))
+    return t
+
+
+def compile_mission(missions, name, actions, jet=None):
+    """Compile mission `name` (for `jet`, if it has a variant) into a Schedule.
+
+    Args:
+        missions: mapping from `load_missions`
+        name: mission to compile
+        actions: mapping of action name -> (key, default hold seconds)
+        jet: optional jet name selecting a variant
+    """
+    if name not in missions:
+        raise MissionError("unknown mission %r (known: %s)" % (name, ", ".join(sorted(missions))))
+    spec = missions[name]
+    jets = spec.get("jets")
+    if jet and jets and jet not in jets:
+        logger.warning("Mission %s is not marked compatible with %s (jets: %s)", name, jet, ", ".join(jets))
+    tracks = dict(spec.get("tracks") or {})
+    skip = set()
+    variant = (spec.get("variants") or {}).get(jet) if jet else None
+    if variant:
+        tracks.update(variant.get("tracks") or {})
+        skip.update(variant.get("skip") or ())
+    if not tracks:
+        raise MissionError("mission %r has no tracks" % name)
+    holds = []
+    for track, steps in tracks.items():
+        offset = 0.0
+        if isinstance(steps, dict):
+            offset = float(steps.get("start", 0.0))
+            steps = steps.get("steps")
+        _compile_steps(steps, actions, skip, track, offset, holds, "%s.%s" % (name, track))
+    return Schedule(name, holds, jet)
+
+
+def run_schedule(dispatcher, schedule, start: float | None = None):
+    """Hand every hold of `schedule` to `dispatcher`, timed from `start` (default: now).
+
+    Returns the list of dispatcher Holds, in schedule order.
+    """
+    if start is None:
+        start = dispatcher.clock() + 0.005  # small margin so the first press is not already late
+    return [dispatcher.hold(h.key, h.hold, at=start + h.offset, label=h.label) for h in schedule]
+
+
+def timing_report(schedule, holds):
+    """Compare planned and actual timing of a finished (or cancelled) run.
+
+    Returns a dict with errors in milliseconds; offsets are relative to the first
+    planned press so clock epochs cancel out.
+    """
+    if not holds:
+        return {"mission": schedule.name, "holds": 0, "completed": 0}
+    t0 = min(h.press_at for h in holds)
+    press = [h.pressed_at - h.press_at for h in holds if h.pressed_at is not None]
+    done = [h for h in holds if h.released_at is not None and not h.cancelled]
+    release = [h.released_at - h.release_at for h in done]
+    # a cancelled run ends when its keys were released early
+    actual_end = max((h.released_at for h in holds if h.released_at is not None), default=t0) - t0
+
+    def summary(errors):
+        if not errors:
+            return {"mean_ms": 0.0, "max_ms": 0.0}
+        return {"mean_ms": sum(errors) / len(errors) * 1000, "max_ms": max(errors) * 1000}
+
+    return {
+        "mission": schedule.name,
+        "jet": schedule.jet,
+        "holds": len(holds),
+        "completed": len(done),
+        "cancelled": any(h.cancelled for h in holds),
+        "planned_s": schedule.duration,
+        "actual_s": actual_end,
+        "press": summary(press),
+        "release": summary(release),
+    }
@@ -0,0 +1,140 @@
+"""Multi-target tracking for detected HUD markers.
+
+Tracks keep an identity across frames and a constant-velocity (alpha-beta filter)
+state, so decisions can be made on where a contact will be rather than where it was
+when the frame was grabbed. All per-frame work is vectorized over tracks and
+detections; the only Python loop is over association rounds, which is usually 1-3.
+"""
+import logging
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+TRACK_DTYPE = np.dtype(
+    [
+        ("id", np.int64),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("vx", np.float64),
+        ("vy", np.float64),
+        ("area", np.float64),
+        ("hits", np.int32),
+        ("misses", np.int32),
+    ]
+)
+
+
+def detections_to_array(enemies):
+    """Return (N, 3) float64 [x, y, area] from a detection array or list of (x, y, area)."""
+    if isinstance(enemies, np.ndarray) and enemies.dtype.names:
+        out = np.empty((len(enemies), 3), dtype=np.float64)
+        out[:, 0] = enemies["x"]
+        out[:, 1] = enemies["y"]
+        out[:, 2] = enemies["area"]
+        return out
+    return np.asarray(enemies, dtype=np.float64).reshape(-1, 3)
+
+
+def associate(dist, gate):
+    """Greedy mutual-nearest-neighbour assignment on a (tracks, detections) distance matrix.
+
+    Each round matches every pair that are each other's nearest neighbour within `gate`,
+    then removes them and repeats. Returns (track_idx, det_idx) index arrays.
+    """
+    d = np.where(dist <= gate, dist, np.inf)
+    rows = []
+    cols = []
+    if d.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    track_idx = np.arange(d.shape[0])
+    while True:
+        best_det = d.argmin(axis=1)
+        best_track = d.argmin(axis=0)
+        mutual = (best_track[best_det] == track_idx) & np.isfinite(d[track_idx, best_det])
+        if not mutual.any():
+            break
+        r = track_idx[mutual]
+        c = best_det[mutual]
+        rows.append(r)
+        cols.append(c)
+        d[r, :] = np.inf
+        d[:, c] = np.inf
+    if not rows:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+class Tracker:
+    """Alpha-beta multi-target tracker with persistent track IDs.
+
+    Args:
+        gate: max distance (pixels) between a predicted track and a detection to associate
+        alpha: position gain of the filter (0..1)
+        beta: velocity gain of the filter (0..1)
+        max_misses: frames a track may go undetected before it is dropped
+        min_hits: detections needed before a track is reported as confirmed
+    """
+
+    def __init__(self, gate: float = 80.0, alpha: float = 0.6, beta: float = 0.2, max_misses: int = 5, min_hits: int = 2):
+        self.gate = gate
+        self.alpha = alpha
+        self.beta = beta
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.tracks = np.empty(0, dtype=TRACK_DTYPE)
+        self.timestamp = None
+        self._next_id = 1
+
+    def update(self, enemies, timestamp):
+        """Advance all tracks to `timestamp` and fold in this frame's detections."""
+        det = detections_to_array(enemies)
+        t = self.tracks
+        # a repeated (or out-of-order) timestamp, as replays and batches can produce,
+        # corrects positions only: there is no elapsed time to estimate a velocity from
+        dt = 0.0 if self.timestamp is None else max(timestamp - self.timestamp, 0.0)
+        if dt > 0 or self.timestamp is None:
+            self.timestamp = timestamp
+
+        px = t["x"] + t["vx"] * dt
+        py = t["y"] + t["vy"] * dt
+        dist = np.hypot(px[:, None] - det[None, :, 0], py[:, None] - det[None, :, 1])
+        ti, di = associate(dist, self.gate)
+
+        t["x"] = px
+        t["y"] = py
+        t["misses"] += 1
+        if len(ti):
+            rx = det[di, 0] - px[ti]
+            ry = det[di, 1] - py[ti]
+            t["x"][ti] += self.alpha * rx
+            t["y"][ti] += self.alpha * ry
+            if dt > 0:
+                t["vx"][ti] += self.beta * rx / dt
+                t["vy"][ti] += self.beta * ry / dt
+            t["area"][ti] = det[di, 2]
+            t["hits"][ti] += 1
+            t["misses"][ti] = 0
+
+        unmatched = np.ones(len(det), dtype=bool)
+        unmatched[di] = False
+        born = np.zeros(int(unmatched.sum()), dtype=TRACK_DTYPE)
+        born["id"] = np.arange(self._next_id, self._next_id + len(born))
+        self._next_id += len(born)
+        born["x"] = det[unmatched, 0]
+        born["y"] = det[unmatched, 1]
+        born["area"] = det[unmatched, 2]
+        born["hits"] = 1
+
+        self.tracks = np.concatenate((t[t["misses"] <= self.max_misses], born))
+        return self.tracks
+
+    def confirmed(self):
+        """Tracks seen at least `min_hits` times."""
+        return self.tracks[self.tracks["hits"] >= self.min_hits]
+
+    def predict(self, tracks, at):
+        """Return (N, 2) positions of `tracks` extrapolated to time `at`."""
+        dt = 0.0 if self.timestamp is None else at - self.timestamp
+        return np.column_stack((tracks["x"] + tracks["vx"] * dt, tracks["y"] + tracks["vy"] * dt))
@@ -0,0 +1,134 @@
+"""Rate-limited debug viewer.
+
+Drawing and `cv2.imshow`/`cv2.waitKey` cost about as much as detection itself, so the
+detection thread only hands its latest frame, mask and detections to a DebugViewer.
+The viewer copies them into its own buffers only when it is due to draw again (at
+most `max_fps` times a second) and renders on its own thread, so the detection hot
+path pays a timestamp check on most frames and two buffer copies on the rest.
+"""
+import time
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+MARKER_COLOR = (0, 255, 0)
+MASK_TINT = (255, 0, 255)
+
+
+def draw_markers(image, enemies, color=MARKER_COLOR):
+    """Circle and number each (x, y, area) detection on `image` in place."""
+    for i, (x, y, area) in enumerate(enemies):
+        r = max(6, int(np.sqrt(area / np.pi)) + 3)
+        cv2.circle(image, (int(x), int(y)), r, color, 2)
+        cv2.putText(image, str(i), (int(x) + r + 2, int(y) - r), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+    return image
+
+
+class DebugViewer:
+    """Show detections at a capped rate on a background thread.
+
+    Args:
+        max_fps: most redraws per second
+        draw_markers: overlay detections and the tinted mask on the captured frame;
+            otherwise show the mask alone with detections circled
+        window: HighGUI window name
+        sink: callable(image) that displays a rendered image (cv2.imshow + waitKey by default)
+    """
+
+    def __init__(self, max_fps: float = 15.0, draw_markers: bool = True, window: str = "wingman", sink=None):
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.draw_markers = draw_markers
+        self.window = window
+        self.sink = sink or self._show
+        self.rendered = 0
+        self._lock = threading.Lock()
+        self._fresh = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._due = 0.0
+        self._frame = None
+        self._mask = None
+        self._enemies = ()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="debug-viewer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._fresh.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def publish(self, frame, mask, enemies):
+        """Offer the latest detection result; copied only when a redraw is due. Never blocks.
+
+        `mask` may be a callable returning the mask, so a mask that is costly to build
+        (e.g. upscaled from a pyramid level) is only built for frames that are drawn.
+        """
+        now = time.perf_counter()
+        if now < self._due or self._fresh.is_set() or self._thread is None:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._frame is None or self._frame.shape != frame.shape:
+                self._frame = np.empty_like(frame)
+                self._mask = np.empty(frame.shape[:2], dtype=np.uint8)
+            np.copyto(self._frame, frame)
+            np.copyto(self._mask, mask() if callable(mask) else mask)
+            self._enemies = list(enemies)
+            self._due = now + self.min_interval
+        finally:
+            self._lock.release()
+        self._fresh.set()
+        return True
+
+    def render(self):
+        """Build the debug image from the last published data (viewer thread)."""
+        with self._lock:
+            if self.draw_markers:
+                image = self._frame.copy()
+                tint = np.zeros_like(image)
+                tint[self._mask > 0] = MASK_TINT
+                cv2.addWeighted(image, 1.0, tint, 0.5, 0, dst=image)
+            else:
+                image = cv2.cvtColor(self._mask, cv2.COLOR_GRAY2BGR)
+            enemies = self._enemies
+        draw_markers(image, enemies)
+        cv2.putText(image, "%d detections" % len(enemies), (8, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, MARKER_COLOR, 1, cv2.LINE_AA)
+        return image
+
+    def _show(self, image):
+        cv2.imshow(self.window, image)
+        cv2.waitKey(1)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if not self._fresh.wait(0.25):
+                    if self.sink is self._show:
+                        cv2.waitKey(1)  # keep the window responsive while idle
+                    continue
+                if self._stop.is_set():
+                    break
+                self.sink(self.render())
+                self.rendered += 1
+                self._fresh.clear()
+        except Exception:
+            logger.exception("DebugViewer: rendering failed, viewer stopped")
+        finally:
+            if self.sink is self._show:
+                try:
+                    cv2.destroyWindow(self.window)
+                except cv2.error:
+                    pass
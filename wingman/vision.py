@@ -1,30 +1,465 @@
+import time
 import logging
+import itertools
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 
+from . import flightrec
+from .colorlut import _in_hsv_range, hsv_ranges
+
 
 logger = logging.getLogger(__name__)
 
+# One row per detected blob: centroid in frame coordinates and area in pixels.
+ENEMY_DTYPE = np.dtype([("x", np.int32), ("y", np.int32), ("area", np.float32)])
+
+ENGINES = ("contours", "components")
+
+# Columnar result of Vision.find_enemies_batch: parallel 1-D arrays, one entry per blob,
+# ordered by frame index and then top to bottom within a frame.
+BatchDetections = namedtuple("BatchDetections", "frame x y area")
+
+# Work memory per batch chunk: frames are processed this many bytes of buffers at a time
+DEFAULT_CHUNK_BYTES = 64 << 20
+
+
+def as_tuples(enemies):
+    """Compatibility view of a detection array as the classic [(x, y, area), ...] list."""
+    return enemies.tolist()
+
+
+def match_detections(found, reference, tolerance=2.0):
+    """Compare two ENEMY_DTYPE arrays; return (matched, missed, extra) counts.
+
+    A reference blob counts as matched when some found blob's centroid lies within
+    `tolerance` pixels of it (each found blob matches at most one reference blob).
+    """
+    if len(found) == 0 or len(reference) == 0:
+        return 0, len(reference), len(found)
+    fx = found["x"].astype(np.float64)
+    fy = found["y"].astype(np.float64)
+    d = np.hypot(reference["x"][:, None] - fx[None, :], reference["y"][:, None] - fy[None, :])
+    nearest = d.argmin(axis=1)
+    ok = d[np.arange(len(reference)), nearest] <= tolerance
+    matched = len(np.unique(nearest[ok]))
+    return matched, len(reference) - matched, len(found) - matched
+
+
+def _merge_windows(boxes):
+    """Merge overlapping (y0, y1, x0, x1) boxes until none overlap, so no blob is labelled twice."""
+    windows = sorted(boxes)
+    while True:
+        merged = []
+        for box in windows:
+            for i, (y0, y1, x0, x1) in enumerate(merged):
+                if box[0] < y1 and y0 < box[1] and box[2] < x1 and x0 < box[3]:
+                    merged[i] = (min(y0, box[0]), max(y1, box[1]), min(x0, box[2]), max(x1, box[3]))
+                    break
+            else:
+                merged.append(box)
+        if len(merged) == len(windows):
+            return merged
+        windows = merged
+
+
+def _tile_runs(grid, tile, height, width):
+    """Turn each horizontal run of True cells in a tile grid into a (y0, y1, x0, x1) pixel box."""
+    padded = np.zeros((grid.shape[0], grid.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = grid
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return [
+        (r * tile, min((r + 1) * tile, height), s * tile, min(e * tile, width))
+        for r, s, e in zip(rows.tolist(), starts.tolist(), ends.tolist())
+    ]
+
+
+def _tile_groups(grid, tile, height, width):
+    """Pixel boxes (y0, y1, x0, x1) bounding each 8-connected group of True cells in a tile grid."""
+    n, _, stats, _ = cv2.connectedComponentsWithStats(grid.view(np.uint8), connectivity=8)
+    stats = stats[1:]
+    x0 = stats[:, cv2.CC_STAT_LEFT]
+    y0 = stats[:, cv2.CC_STAT_TOP]
+    x1 = x0 + stats[:, cv2.CC_STAT_WIDTH]
+    y1 = y0 + stats[:, cv2.CC_STAT_HEIGHT]
+    return [
+        (a * tile, min(b * tile, height), c * tile, min(d * tile, width))
+        for a, b, c, d in zip(y0.tolist(), y1.tolist(), x0.tolist(), x1.tolist())
+    ]
+
+
+def _boxes(stats, dx=0, dy=0):
+    """(x0, y0, x1, y1) boxes from connected-component stats, offset by (dx, dy)."""
+    left = stats[:, cv2.CC_STAT_LEFT] + dx
+    top = stats[:, cv2.CC_STAT_TOP] + dy
+    return np.column_stack((left, top, left + stats[:, cv2.CC_STAT_WIDTH], top + stats[:, cv2.CC_STAT_HEIGHT]))
+
+
+_BGR_BOXES = {}
+
+
+def bgr_box(hsv_lower, hsv_upper):
+    """Smallest (lower, upper) BGR box holding every color whose HSV lies in the range.
+
+    Computed once per range by converting all 2^24 colors, so a plain inRange on BGR
+    can rule out pixels before any HSV conversion. None when no color is in range.
+    """
+    key = (tuple(int(v) for v in hsv_lower), tuple(int(v) for v in hsv_upper))
+    if key not in _BGR_BOXES:
+        b, g, r = np.meshgrid(*(np.arange(256, dtype=np.uint8),) * 3, indexing="ij")
+        colors = np.stack((b, g, r), axis=-1).reshape(256 * 256, 256, 3)
+        hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+        inside = _in_hsv_range(hsv, key[0], key[1]).reshape(256, 256, 256) > 0
+        if not inside.any():
+            _BGR_BOXES[key] = None
+        else:
+            lower, upper = [], []
+            for axes in ((1, 2), (0, 2), (0, 1)):
+                present = np.flatnonzero(inside.any(axis=axes))
+                lower.append(present[0])
+                upper.append(present[-1])
+            _BGR_BOXES[key] = (np.array(lower, np.uint8), np.array(upper, np.uint8))
+    return _BGR_BOXES[key]
+
+
+def _compact_rows(selected):
+    """Pack the `selected` rows of a tall image; returns (source row per output row, runs).
+
+    Unselected rows become -1 (blank), and each run of them shrinks to one or two
+    blank rows, chosen so every kept row keeps the parity of its index (Grana
+    labelling scans row pairs, so blob order stays the same) and separate runs never
+    touch. `runs` lists (output row, source row, length) for the copies.
+    """
+    edges = np.diff(np.concatenate(([0], selected.view(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    src = np.full(len(selected) + 2 * len(starts) + 2, -1, dtype=np.int64)
+    runs = []
+    pos = 0
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        pos += start % 2 if pos == 0 else (1 if (pos + 1) % 2 == start % 2 else 2)
+        src[pos:pos + end - start] = np.arange(start, end)
+        runs.append((pos, start, end - start))
+        pos += end - start
+    # blank rows after the last run as well, up to an even height (Grana is about
+    # twice as slow on an odd one)
+    return src[:pos + 1 + (pos + 1) % 2], runs
+
+
+class _Scratch:
+    """Per-resolution work buffers so the hot path allocates nothing after the first frame."""
+
+    # own BGRA buffer for ColorLUT.classify; None uses the LUT's shared one
+    packed = None
+
+    def __init__(self, height, width):
+        self.hsv = np.empty((height, width, 3), dtype=np.uint8)
+        self.mask = np.empty((height, width), dtype=np.uint8)
+        self.opened = np.empty((height, width), dtype=np.uint8)
+        self.labels = np.empty((height, width), dtype=np.int32)
+        self.classes = np.empty((height, width), dtype=np.uint8)
+
+    def window(self, y0, y1, x0, x1):
+        """Scratch buffers restricted to a window, sharing memory with the full-size ones."""
+        view = _Scratch.__new__(_Scratch)
+        for name in ("hsv", "mask", "opened", "labels", "classes"):
+            setattr(view, name, getattr(self, name)[y0:y1, x0:x1])
+        if self.packed is not None:
+            view.packed = self.packed[y0:y1, x0:x1]
+        return view
+
+
+class _IncrementalState:
+    """What incremental detection remembers about the previous frame at one resolution."""
+
+    def __init__(self, height, width, tile):
+        self.prev = np.empty((height, width, 3), dtype=np.uint8)
+        self.diff = np.empty((height, width, 3), dtype=np.uint8)
+        # cleaned mask of the whole frame, patched tile by tile
+        self.opened = np.empty((height, width), dtype=np.uint8)
+        self.per_row = np.empty((-(-height // tile), width * 3), dtype=np.uint8)
+        self.col_starts = np.arange(0, width, tile) * 3
+        # last result (None until the first full pass) and its blobs' (x0, y0, x1, y1) boxes
+        self.enemies = None
+        self.boxes = None
+
 
 class Vision:
-    def __init__(self, hsv_lower, hsv_upper, debug=False):
+    def __init__(
+        self,
+        hsv_lower,
+        hsv_upper,
+        debug=False,
+        engine="contours",
+        min_area=20,
+        lut=None,
+        enemy_class="enemy",
+        pyramid_scale=1,
+        pyramid_tolerance=2,
+        incremental_tile=0,
+        change_threshold=12,
+        viewer=None,
+        morphology=True,
+        downscale=1,
+    ):
+        if engine not in ENGINES:
+            raise ValueError("unknown vision engine %r (expected one of %s)" % (engine, ", ".join(ENGINES)))
         self.hsv_lower = np.array(hsv_lower, dtype=np.uint8)
         self.hsv_upper = np.array(hsv_upper, dtype=np.uint8)
+        self._hsv_ranges = hsv_ranges(self.hsv_lower, self.hsv_upper)  # two when the hue wraps past 180
         self.debug = debug
+        # Optional DebugViewer fed with every frame's mask and detections; debug=True
+        # without one gets a plain mask viewer on first use
+        self.viewer = viewer
+        self.engine = engine
+        self.min_area = min_area
+        # Optional ColorLUT: classifies every color class in one pass instead of cvtColor + inRange
+        self.lut = lut
+        self.enemy_class = enemy_class
+        # Pyramid mode: find candidates at 1/pyramid_scale size, refine in full-res windows
+        self.pyramid_scale = int(pyramid_scale)
+        self.pyramid_tolerance = pyramid_tolerance
+        self._small = {}
+        # Incremental mode: only re-threshold tiles that changed since the previous frame
+        if incremental_tile and self.pyramid_scale > 1:
+            raise ValueError("pyramid and incremental modes are mutually exclusive")
+        self.incremental_tile = int(incremental_tile)
+        self.change_threshold = change_threshold
+        self._incremental = {}
+        self._kernel = np.ones((3, 3), np.uint8)
+        self._scratch = {}
+        # work buffers of find_enemies_batch, one per chunk in flight, kept between calls
+        self._batch_scratch = []
+        # Quality knobs a frame scheduler may turn down at runtime: skip the opening,
+        # and detect on a frame shrunk by an integer factor (results stay full-res)
+        self.morphology = morphology
+        self.downscale = int(downscale)
+        self._down = {}
 
-    def find_enemies(self, frame):
-        """Return list of enemy centroids in frame coordinates: [(x,y,area), ...]"""
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, self.hsv_lower, self.hsv_upper)
+    def __getstate__(self):
+        # worker processes get a copy without the viewer thread or scratch buffers
+        state = dict(self.__dict__)
+        state.update(debug=False, viewer=None, _scratch={}, _batch_scratch=[], _small={}, _incremental={}, _down={})
+        return state
+
+    def _scratch_for(self, shape):
+        buf = self._scratch.get(shape[:2])
+        if buf is None:
+            buf = self._scratch[shape[:2]] = _Scratch(*shape[:2])
+        return buf
+
+    def _mask(self, frame, buf, clean=True):
+        """Threshold `frame` against the enemy HSV range and clean it up, into `buf`."""
+        if self.lut is not None:
+            self.lut.mask(self.lut.classify(frame, out=buf.classes, work=buf.packed), self.enemy_class, out=buf.mask)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=buf.hsv)
+            (lower, upper), *wrapped = self._hsv_ranges
+            cv2.inRange(buf.hsv, lower, upper, dst=buf.mask)
+            for lower, upper in wrapped:
+                cv2.bitwise_or(buf.mask, cv2.inRange(buf.hsv, lower, upper), dst=buf.mask)
+        if not clean or not self.morphology:
+            return buf.mask
         # optional morphological clean
-        kernel = np.ones((3, 3), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        cv2.morphologyEx(buf.mask, cv2.MORPH_OPEN, self._kernel, dst=buf.opened)
+        return buf.opened
+
+    @staticmethod
+    def _label(mask, labels):
+        """Label blobs in `mask`; return (stats, centroids) without the background row."""
+        # Grana's block-based labelling is markedly faster than the default single-threaded
+        _, _, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            mask, 8, cv2.CV_32S, cv2.CCL_GRANA, labels=labels
+        )
+        return stats[1:], centroids[1:]
+
+    @property
+    def _min_area(self):
+        """min_area in pixels of the frame actually thresholded (smaller when downscaled)."""
+        return self.min_area / (self.downscale * self.downscale)
+
+    def _downscaled(self, frame):
+        s = self.downscale
+        shape = (frame.shape[0] // s, frame.shape[1] // s)
+        small = self._down.get(shape)
+        if small is None:
+            small = self._down[shape] = np.empty(shape + (3,), dtype=np.uint8)
+        cv2.resize(frame, (shape[1], shape[0]), dst=small, interpolation=cv2.INTER_AREA)
+        return small
+
+    def _to_enemies(self, stats, centroids, dx=0, dy=0):
+        areas = stats[:, cv2.CC_STAT_AREA]
+        keep = areas >= self._min_area
+        enemies = np.empty(int(np.count_nonzero(keep)), dtype=ENEMY_DTYPE)
+        enemies["x"] = centroids[keep, 0] + dx
+        enemies["y"] = centroids[keep, 1] + dy
+        enemies["area"] = areas[keep]
+        return enemies, keep
+
+    def _blobs(self, mask, buf):
+        return self._to_enemies(*self._label(mask, buf.labels))[0]
+
+    def detect(self, frame):
+        """Return enemy blobs in `frame` as an ENEMY_DTYPE array, one row per blob.
+
+        Centroids and areas come from a single connectedComponentsWithStats pass and
+        are filtered in NumPy, so the cost does not grow with a Python loop per blob.
+        Areas are pixel counts, which run slightly larger than the polygon areas the
+        contours engine reports for the same blob.
+        """
+        s = self.downscale
+        if s > 1:
+            enemies = self._detect(self._downscaled(frame))
+            enemies["x"] = enemies["x"] * s + s // 2
+            enemies["y"] = enemies["y"] * s + s // 2
+            enemies["area"] *= s * s
+            return enemies
+        return self._detect(frame)
+
+    def _detect(self, frame):
+        if self.pyramid_scale > 1:
+            return self._detect_pyramid(frame)
+        if self.incremental_tile:
+            return self._detect_incremental(frame)
+        buf = self._scratch_for(frame.shape)
+        return self._blobs(self._mask(frame, buf), buf)
+
+    def _candidate_windows(self, frame):
+        """Find blobs on a subsampled frame and return merged full-res windows around them."""
+        s = self.pyramid_scale
+        h, w = frame.shape[:2]
+        small_shape = (h // s, w // s)
+        small = self._small.get(small_shape)
+        if small is None:
+            small = self._small[small_shape] = np.empty(small_shape + (3,), dtype=np.uint8)
+        cv2.resize(frame, (small_shape[1], small_shape[0]), dst=small, interpolation=cv2.INTER_NEAREST)
+        sbuf = self._scratch_for(small_shape)
+        # no opening at low resolution: it would erase markers only a few pixels wide
+        mask = self._mask(small, sbuf, clean=False)
+        n, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            mask, 8, cv2.CV_32S, cv2.CCL_GRANA, labels=sbuf.labels
+        )
+        if n <= 1:
+            return []
+        stats = stats[1:]
+        stats = stats[stats[:, cv2.CC_STAT_AREA] * s * s >= self._min_area // 2]
+        # pad by one coarse pixel (what subsampling can hide), the match tolerance and the kernel
+        pad = s + int(np.ceil(self.pyramid_tolerance)) + self._kernel.shape[0]
+        x0 = np.clip(stats[:, cv2.CC_STAT_LEFT] * s - pad, 0, w)
+        y0 = np.clip(stats[:, cv2.CC_STAT_TOP] * s - pad, 0, h)
+        x1 = np.clip((stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH]) * s + pad, 0, w)
+        y1 = np.clip((stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT]) * s + pad, 0, h)
+        return _merge_windows(zip(y0.tolist(), y1.tolist(), x0.tolist(), x1.tolist()))
+
+    def _detect_pyramid(self, frame):
+        buf = self._scratch_for(frame.shape)
+        parts = []
+        for y0, y1, x0, x1 in self._candidate_windows(frame):
+            view = buf.window(y0, y1, x0, x1)
+            blobs = self._blobs(self._mask(frame[y0:y1, x0:x1], view), view)
+            blobs["x"] += x0
+            blobs["y"] += y0
+            parts.append(blobs)
+        if not parts:
+            return np.empty(0, dtype=ENEMY_DTYPE)
+        return np.concatenate(parts)
+
+    def _relabel(self, state, buf):
+        stats, centroids = self._label(state.opened, buf.labels)
+        state.enemies, keep = self._to_enemies(stats, centroids)
+        state.boxes = _boxes(stats[keep])
+        return state.enemies
+
+    def _detect_incremental(self, frame):
+        h, w = frame.shape[:2]
+        tile = self.incremental_tile
+        buf = self._scratch_for(frame.shape)
+        # the cached mask is only valid for the morphology setting it was built with
+        key = (h, w, self.morphology)
+        state = self._incremental.get(key)
+        if state is None:
+            state = self._incremental[key] = _IncrementalState(h, w, tile)
+
+        if state.enemies is not None:
+            # per-tile max abs difference against the last processed pixels
+            cv2.absdiff(frame, state.prev, dst=state.diff)
+            rows = state.diff.reshape(h, w * 3)
+            full = h // tile * tile
+            np.max(rows[:full].reshape(h // tile, tile, w * 3), axis=1, out=state.per_row[: h // tile])
+            if full < h:
+                np.max(rows[full:], axis=0, out=state.per_row[-1])
+            dirty = np.maximum.reduceat(state.per_row, state.col_starts, axis=1) > self.change_threshold
+            n_dirty = int(np.count_nonzero(dirty))
+            if n_dirty == 0:
+                return state.enemies
+        if state.enemies is None or n_dirty > dirty.size // 2:
+            np.copyto(state.prev, frame)
+            np.copyto(state.opened, self._mask(frame, buf))
+            return self._relabel(state, buf)
+
+        # patch the cached mask, re-thresholding each run of dirty tiles with enough
+        # context around it for the opening to behave as it would on the full frame
+        pad = self._kernel.shape[0]
+        for y0, y1, x0, x1 in _tile_runs(dirty, tile, h, w):
+            py0, py1, px0, px1 = max(y0 - pad, 0), min(y1 + pad, h), max(x0 - pad, 0), min(x1 + pad, w)
+            opened = self._mask(frame[py0:py1, px0:px1], buf.window(py0, py1, px0, px1))
+            state.opened[y0:y1, x0:x1] = opened[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+            state.prev[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+
+        # Relabel the dirty tiles plus a one-tile ring and keep cached blobs outside it.
+        # A blob reaching the edge of a relabelled window continues into clean tiles,
+        # so in that (rare) case the whole cached mask is relabelled instead.
+        ring = cv2.dilate(dirty.view(np.uint8), self._kernel).view(bool)
+        keep = np.ones(len(state.enemies), dtype=bool)
+        boxes = state.boxes
+        parts = [None]
+        part_boxes = [None]
+        for y0, y1, x0, x1 in _merge_windows(_tile_groups(ring, tile, h, w)):
+            keep &= ~((boxes[:, 0] < x1) & (boxes[:, 2] > x0) & (boxes[:, 1] < y1) & (boxes[:, 3] > y0))
+            stats, centroids = self._label(state.opened[y0:y1, x0:x1], buf.labels[y0:y1, x0:x1])
+            left, top = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+            right, bottom = left + stats[:, cv2.CC_STAT_WIDTH], top + stats[:, cv2.CC_STAT_HEIGHT]
+            escapes = ((left == 0) & (x0 > 0)) | ((top == 0) & (y0 > 0)) | ((right == x1 - x0) & (x1 < w)) | ((bottom == y1 - y0) & (y1 < h))
+            if escapes.any():
+                return self._relabel(state, buf)
+            enemies, k = self._to_enemies(stats, centroids, x0, y0)
+            parts.append(enemies)
+            part_boxes.append(_boxes(stats[k], x0, y0))
+        parts[0] = state.enemies[keep]
+        part_boxes[0] = boxes[keep]
+        state.enemies = np.concatenate(parts)
+        state.boxes = np.concatenate(part_boxes)
+        return state.enemies
+
+    def detect_classes(self, frame, names=None):
+        """Return {class name: ENEMY_DTYPE array} for every ColorLUT class (or just `names`).
+
+        The frame is classified once; each class then only costs a bit test,
+        morphology and labelling on the small label image.
+        """
+        if self.lut is None:
+            raise RuntimeError("detect_classes needs a ColorLUT")
+        buf = self._scratch_for(frame.shape)
+        labels = self.lut.classify(frame, out=buf.classes)
+        results = {}
+        for name in names or self.lut.names:
+            self.lut.mask(labels, name, out=buf.mask)
+            cv2.morphologyEx(buf.mask, cv2.MORPH_OPEN, self._kernel, dst=buf.opened)
+            results[name] = self._blobs(buf.opened, buf)
+        return results
+
+    def _find_contours(self, frame):
+        buf = self._scratch_for(frame.shape)
+        mask = self._mask(frame, buf)
 
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         enemies = []
         for c in contours:
             area = cv2.contourArea(c)
-            if area < 20:
+            if area < self._min_area:
                 continue
             M = cv2.moments(c)
             if M["m00"] == 0:
@@ -32,14 +467,195 @@ class Vision:
             cx = int(M["m10"] / M["m00"])
             cy = int(M["m01"] / M["m00"])
             enemies.append((cx, cy, area))
+        return enemies
 
-        logger.debug("Vision: found %d enemies", len(enemies))
+    def _last_mask(self, image):
+        """The mask the active detection path built for `image` (for the debug viewer)."""
+        h, w = image.shape[:2]
+        if self.pyramid_scale > 1:
+            # only the candidate windows are thresholded at full resolution; show the
+            # coarse mask they were found in, scaled up
+            coarse = self._scratch_for((h // self.pyramid_scale, w // self.pyramid_scale)).mask
+            return cv2.resize(coarse, (w, h), interpolation=cv2.INTER_NEAREST)
+        if self.incremental_tile:
+            state = self._incremental.get((h, w, self.morphology))
+            if state is not None:
+                return state.opened
+        buf = self._scratch_for(image.shape)
+        return buf.opened if self.morphology else buf.mask
 
-        if self.debug:
-            debug_img = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-            for (x, y, a) in enemies:
-                cv2.circle(debug_img, (x, y), 6, (0, 255, 0), 2)
-            cv2.imshow("mask", debug_img)
-            cv2.waitKey(1)
+    def find_enemies(self, frame):
+        """Return list of enemy centroids in frame coordinates: [(x,y,area), ...]"""
+        start = time.perf_counter()
+        s = self.downscale
+        image = self._downscaled(frame) if s > 1 else frame
+        if self.engine == "components" or self.pyramid_scale > 1 or self.incremental_tile:
+            enemies = as_tuples(self._detect(image))
+        else:
+            enemies = self._find_contours(image)
+
+        flightrec.record(flightrec.DETECT, len(enemies), ts=start, dur=time.perf_counter() - start)
+
+        if self.debug and self.viewer is None:
+            from .viewer import DebugViewer
+
+            self.viewer = DebugViewer(draw_markers=False).start()
+        if self.viewer is not None:
+            self.viewer.publish(image, lambda: self._last_mask(image), enemies)
 
+        if s > 1:
+            enemies = [(x * s + s // 2, y * s + s // 2, area * s * s) for x, y, area in enemies]
         return enemies
+
+    def find_enemies_batch(self, frames, chunk_bytes: int = DEFAULT_CHUNK_BYTES, workers: int = 1):
+        """Detect blobs in many frames at once; returns BatchDetections of 1-D arrays.
+
+        `frames` is a stacked (N, H, W, 3) array (e.g. a recording's memmap) or an
+        iterable of same-sized BGR frames, processed in chunks of at most `chunk_bytes`
+        of work memory (`workers` > 1 runs chunks on that many threads).
+
+        Per chunk, a cheap BGR range check on every third row finds the rows that can
+        hold a marker (a blob that survives the 3x3 opening always covers one of those
+        rows). Only those rows, with the few around them the opening reads, are packed
+        into one tall image for the HSV threshold, the opening and a single labelling
+        pass. Results match `detect` on every frame (component areas; pyramid and
+        incremental modes are not used).
+        """
+        iterator = iter(frames)
+        first = next(iterator, None)
+        if first is None:
+            return BatchDetections(*_empty_columns())
+        s = self.downscale
+        h, w = first.shape[0] // s, first.shape[1] // s
+        # BGR 3 + hsv 3 + mask, opened, classes 1 each + labels 4 bytes per pixel
+        size = max(1, int(chunk_bytes // (h * w * 13)))
+
+        if isinstance(frames, np.ndarray) and frames.ndim == 4:
+            chunks = ((i, frames[i:i + size]) for i in range(0, len(frames), size))
+        else:
+            def grouped():
+                rest = itertools.chain([first], iterator)
+                start = 0
+                while True:
+                    chunk = list(itertools.islice(rest, size))
+                    if not chunk:
+                        return
+                    yield start, chunk
+                    start += len(chunk)
+
+            chunks = grouped()
+
+        def run(item):
+            start, chunk = item
+            t0 = time.perf_counter()
+            try:
+                work = self._batch_scratch.pop()
+            except IndexError:
+                work = None
+            result, work = self._detect_chunk(chunk, first.shape, work)
+            if work is not None:
+                self._batch_scratch.append(work)
+            flightrec.record(flightrec.DETECT, len(result[0]), len(chunk), ts=t0, dur=time.perf_counter() - t0)
+            return (result[0] + start,) + result[1:]
+
+        if workers > 1:
+            parts = []
+            with ThreadPoolExecutor(workers, thread_name_prefix="vision-batch") as pool:
+                pending = deque()
+                for item in chunks:
+                    pending.append(pool.submit(run, item))
+                    # bounded read-ahead: a long recording's iterator is not loaded at once
+                    if len(pending) >= 2 * workers:
+                        parts.append(pending.popleft().result())
+                parts += [f.result() for f in pending]
+        else:
+            parts = [run(item) for item in chunks]
+        return BatchDetections(*(np.concatenate(column) for column in zip(*parts)))
+
+    def _candidate_rows(self, chunk, h, stride):
+        """(rows that may hold blob pixels, rows to process) as (len(chunk), stride) bool arrays."""
+        possible = np.zeros((len(chunk), stride), dtype=bool)
+        box = bgr_box(self.hsv_lower, self.hsv_upper) if self.lut is None else None
+        if box is None:
+            if self.lut is not None:
+                possible[:, :h] = True
+            return possible, possible
+        # every third row (a view, no copy) plus the last one, which erodes against nothing
+        step, reach = (3, 2) if self.morphology else (1, 0)
+        rows = np.arange(0, h, step)
+        lower, upper = box
+
+        def hits(sample):
+            return cv2.reduce(cv2.inRange(sample, lower, upper), 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() > 0
+
+        for i, frame in enumerate(chunk):
+            possible[i, rows[hits(frame[:h:step])]] = True
+            possible[i, h - 1] |= hits(frame[h - 1:h])[0]
+        # a surviving pixel is within 2 rows of a sampled hit, and the opening reads 2 rows further
+        for _ in range(reach):
+            possible[:, 1:] |= possible[:, :-1].copy()
+            possible[:, :-1] |= possible[:, 1:].copy()
+        possible[:, h:] = False
+        selected = possible.copy()
+        for _ in range(reach):
+            selected[:, 1:] |= selected[:, :-1].copy()
+            selected[:, :-1] |= selected[:, 1:].copy()
+        selected[:, h:] = False
+        return possible, selected
+
+    def _detect_chunk(self, chunk, shape, work):
+        """((frame, x, y, area) arrays for one chunk, work buffers); frame indices start at 0."""
+        s = self.downscale
+        for frame in chunk:
+            if frame.shape != shape:
+                raise ValueError("batch frames must all have the same shape (%s, got %s)" % (shape, frame.shape))
+        h, w = shape[0] // s, shape[1] // s
+        if s > 1:
+            chunk = [cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA) for frame in chunk]
+        # every frame gets an even number of rows in packed coordinates (see _compact_rows)
+        stride = h + 2 - h % 2
+        possible, selected = self._candidate_rows(chunk, h, stride)
+        src, runs = _compact_rows(selected.ravel())
+        if not runs:
+            return _empty_columns(), work
+
+        if work is None or len(work.mask) < len(src) or work.mask.shape[1] != w:
+            # sized for the whole chunk, so a denser chunk later does not reallocate
+            work = _Scratch(len(possible) * (stride + 1) + 2, w)
+            work.bgr = np.empty(work.hsv.shape, dtype=np.uint8)
+            if self.lut is not None:
+                # chunks on other threads must not share the LUT's work buffer
+                work.packed = np.empty(work.hsv.shape[:2] + (4,), dtype=np.uint8)
+        bgr = work.bgr[:len(src)]
+        view = work.window(0, len(src), 0, w)
+        for pos, start, n in runs:
+            i, r = divmod(start, stride)
+            bgr[pos:pos + n] = chunk[i][r:r + n]
+        blank = np.flatnonzero(src < 0)
+        mask = self._mask(bgr, view, clean=False)
+        if self.morphology:
+            # blank rows erode like the outside of a frame (255), then are cleared before dilating
+            mask[blank] = 255
+            cv2.erode(mask, self._kernel, dst=view.opened)
+            view.opened[blank] = 0
+            cv2.dilate(view.opened, self._kernel, dst=mask)
+        # rows that cannot hold a blob are empty in the real mask (and blank rows anyway)
+        mask[np.flatnonzero(~possible.ravel()[np.maximum(src, 0)] | (src < 0))] = 0
+        stats, centroids = self._label(mask, view.labels)
+        areas = stats[:, cv2.CC_STAT_AREA]
+        keep = areas >= self._min_area
+        top = stats[keep, cv2.CC_STAT_TOP]
+        rows = src[top]
+        index = rows // stride
+        x = centroids[keep, 0].astype(np.int32)
+        y = (centroids[keep, 1] + (rows - top) - index * stride).astype(np.int32)
+        area = areas[keep].astype(np.float32)
+        if s > 1:
+            x = x * s + s // 2
+            y = y * s + s // 2
+            area *= s * s
+        return (index, x, y, area), work
+
+
+def _empty_columns():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
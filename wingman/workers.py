@@ -0,0 +1,355 @@
+"""Process-pool execution of vision and OCR over shared-memory frames.
+
+OpenCV releases the GIL for parts of its work but the Python around it does not, so
+a single process tops out at about one core. A WorkerPool copies each frame once into
+a `multiprocessing.shared_memory` slot; worker processes attach to the same slots and
+run detection (or OCR) on regions of a frame given only the slot index and bounds, so
+pixel data is never pickled. Results are handed back in submission order.
+
+Split strategies:
+    none: one job per frame; parallelism comes from several frames in flight (replay)
+    rows: each frame is cut into horizontal bands, one job per band, so even a single
+        frame is spread over the pool. Bands overlap by `overlap` rows and a blob is
+        reported only by the band whose core holds its centroid, so blobs up to
+        `overlap` pixels tall are found exactly once.
+"""
+import os
+import time
+import queue
+import logging
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .vision import ENEMY_DTYPE, as_tuples
+
+
+logger = logging.getLogger(__name__)
+
+SPLITS = ("none", "rows")
+TASKS = ("vision", "ocr")
+
+
+class SharedFrameSlots:
+    """A fixed set of shared-memory frame buffers of `size` bytes each, addressed by index.
+
+    Any frame that fits can be stored in a slot; `view` reads it back at its shape.
+    The creating process owns (and unlinks) the memory; workers attach by name.
+    """
+
+    def __init__(self, count, size, names=None):
+        self.size = int(size)
+        self.owner = names is None
+        if self.owner:
+            self._shm = [shared_memory.SharedMemory(create=True, size=self.size) for _ in range(count)]
+        else:
+            self._shm = [shared_memory.SharedMemory(name=name) for name in names]
+        self.arrays = [np.ndarray(self.size, dtype=np.uint8, buffer=shm.buf) for shm in self._shm]
+
+    @property
+    def names(self):
+        return [shm.name for shm in self._shm]
+
+    def __len__(self):
+        return len(self._shm)
+
+    def __getitem__(self, slot):
+        return self.arrays[slot]
+
+    def view(self, slot, shape):
+        """Slot `slot` as a uint8 array of `shape` (which must fit in the slot)."""
+        return self.arrays[slot][: int(np.prod(shape))].reshape(shape)
+
+    def close(self):
+        self.arrays = []
+        for shm in self._shm:
+            shm.close()
+            if self.owner:
+                shm.unlink()
+        self._shm = []
+
+
+def _row_bands(height, parts, overlap):
+    """Split `height` rows into `parts` bands; return [(y0, y1, core0, core1), ...]."""
+    parts = max(1, min(parts, height))
+    edges = np.linspace(0, height, parts + 1).astype(int)
+    return [
+        (max(0, int(c0) - overlap), min(height, int(c1) + overlap), int(c0), int(c1))
+        for c0, c1 in zip(edges[:-1], edges[1:])
+    ]
+
+
+def _run_job(worker, image, y0, y1, core0, core1, downscale=1, morphology=True):
+    roi = image[y0:y1]
+    if worker["task"] == "ocr":
+        from .ocr import get_reader, scan_screen_for_numbers
+
+        return scan_screen_for_numbers(roi, reader=get_reader(gpu=False))
+
+    vision = worker["vision"]
+    vision.downscale = downscale
+    vision.morphology = morphology
+    if vision.engine == "components" or vision.pyramid_scale > 1:
+        enemies = vision.detect(roi)
+    else:
+        s = downscale
+        enemies = np.array([tuple(e) for e in vision._find_contours(vision._downscaled(roi) if s > 1 else roi)], dtype=ENEMY_DTYPE)
+        if s > 1:
+            enemies["x"] = enemies["x"] * s + s // 2
+            enemies["y"] = enemies["y"] * s + s // 2
+            enemies["area"] *= s * s
+    enemies["y"] += y0
+    return enemies[(enemies["y"] >= core0) & (enemies["y"] < core1)]
+
+
+def _worker_main(jobs, results, names, size, vision, task):
+    slots = SharedFrameSlots(len(names), size, names=names)
+    worker = {"task": task, "vision": vision}
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            seq, slot, shape, part, bounds, options = job
+            try:
+                results.put((seq, part, _run_job(worker, slots.view(slot, shape), *bounds, *options), None))
+            except Exception as e:
+                results.put((seq, part, None, "%s: %s" % (type(e).__name__, e)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        slots.close()
+
+
+class WorkerPool:
+    """Run Vision detection or OCR on frames in worker processes.
+
+    Args:
+        vision: Vision instance copied into every worker (required for the vision task)
+        processes: worker count; 0 uses every core
+        split: "none" or "rows" (see module docstring)
+        overlap: rows shared between neighbouring bands with split="rows"
+        task: "vision" (ENEMY_DTYPE arrays) or "ocr" (scan_screen_for_numbers dicts)
+        slots: shared frame buffers, i.e. the most frames in flight; default 2 per worker
+        frame_shape: largest frame expected, e.g. the capture region's (h, w, 3); slots
+            are sized for it so smaller frames and crops never restart the workers.
+            A larger frame grows the slots (and restarts the workers) once.
+        timeout: seconds `get` waits by default before giving up on a frame
+    """
+
+    def __init__(
+        self,
+        vision=None,
+        processes: int = 0,
+        split: str = "rows",
+        overlap: int = 32,
+        task: str = "vision",
+        slots: int = 0,
+        frame_shape=None,
+        timeout: float | None = 5.0,
+    ):
+        if split not in SPLITS:
+            raise ValueError("unknown split %r (expected one of %s)" % (split, ", ".join(SPLITS)))
+        if task not in TASKS:
+            raise ValueError("unknown worker task %r (expected one of %s)" % (task, ", ".join(TASKS)))
+        if task == "vision":
+            if vision is None:
+                raise ValueError("the vision task needs a Vision instance")
+            if vision.incremental_tile:
+                raise ValueError("incremental vision keeps per-frame state and cannot run in a worker pool")
+        self.vision = vision
+        self.processes = int(processes) or os.cpu_count() or 1
+        self.split = split
+        self.overlap = int(overlap)
+        self.task = task
+        self.slot_count = int(slots) or 2 * self.processes
+        self.slot_size = int(np.prod(frame_shape)) if frame_shape else 0
+        self.timeout = timeout
+        self.slots = None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs = []
+        self._jobs = None
+        self._results = None
+        self._free = deque()
+        self._pending = {}  # seq -> [slot, parts outstanding, part results]
+        self._done = {}
+        self._order = deque()
+        self._seq = 0
+
+    def _start(self, size):
+        self.close()
+        self.slot_size = size
+        self.slots = SharedFrameSlots(self.slot_count, size)
+        self._free = deque(range(self.slot_count))
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        for i in range(self.processes):
+            p = self._ctx.Process(
+                target=_worker_main,
+                args=(self._jobs, self._results, self.slots.names, size, self.vision, self.task),
+                name="wingman-worker-%d" % i,
+                daemon=True,
+            )
+            p.start()
+            self._procs.append(p)
+        logger.info(
+            "WorkerPool: %d %s workers, %d slots of %.1f MB, split=%s", self.processes, self.task, self.slot_count, size / 1e6, self.split
+        )
+
+    def __len__(self):
+        """Frames submitted whose results have not been taken yet."""
+        return len(self._order)
+
+    def submit(self, image, downscale: int = 1, morphology: bool = True):
+        """Copy `image` into a free slot and queue its jobs; returns the frame's sequence number.
+
+        `image` may be any size up to the slot size, including a non-contiguous crop;
+        `downscale` and `morphology` override the pool's Vision settings for this frame.
+        Blocks (collecting finished results) while every slot is in use.
+        """
+        if self.slots is None or image.nbytes > self.slots.size:
+            if self.slots is not None:
+                logger.warning("WorkerPool: frame %s is larger than the slots; restarting the workers", image.shape)
+            self._start(max(self.slot_size, image.nbytes))
+        else:
+            self._check_workers()
+        while not self._free:
+            self._collect(block=True, timeout=self.timeout, fail=True)
+        slot = self._free.popleft()
+        np.copyto(self.slots.view(slot, image.shape), image)
+        self._seq += 1
+        if self.split == "rows":
+            bands = _row_bands(image.shape[0], self.processes, self.overlap)
+        else:
+            bands = [(0, image.shape[0], 0, image.shape[0])]
+        self._pending[self._seq] = [slot, len(bands), [None] * len(bands)]
+        self._order.append(self._seq)
+        options = (int(downscale), bool(morphology))
+        for part, bounds in enumerate(bands):
+            self._jobs.put((self._seq, slot, image.shape, part, bounds, options))
+        return self._seq
+
+    def _check_workers(self):
+        dead = [p for p in self._procs if not p.is_alive()]
+        if dead:
+            names = ", ".join("%s (exit code %s)" % (p.name, p.exitcode) for p in dead)
+            self.close()
+            raise RuntimeError("WorkerPool: worker process died: %s" % names)
+
+    def _collect(self, block, timeout=None, fail=False):
+        """Take one finished job result; False if none came within `timeout`.
+
+        A blocking wait checks every half second that the workers are still alive;
+        with `fail`, running out of time raises TimeoutError instead of returning False.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.perf_counter())
+            try:
+                seq, part, result, error = self._results.get(block and wait > 0, max(wait, 0.0))
+                break
+            except queue.Empty:
+                if not block:
+                    return False
+                self._check_workers()
+                if deadline is not None and time.perf_counter() >= deadline:
+                    if fail:
+                        raise TimeoutError("WorkerPool: no result within %.1fs" % timeout) from None
+                    return False
+        entry = self._pending[seq]
+        if error is not None:
+            logger.warning("WorkerPool: frame %d part %d failed: %s", seq, part, error)
+        entry[2][part] = result
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._pending[seq]
+            self._free.append(entry[0])
+            self._done[seq] = self._merge(entry[2])
+        return True
+
+    def _merge(self, parts):
+        if self.task == "ocr":
+            merged = {}
+            for part in parts:
+                merged.update(part or {})
+            return merged
+        return np.concatenate([p if p is not None else np.empty(0, dtype=ENEMY_DTYPE) for p in parts])
+
+    def ready(self):
+        """True if the oldest submitted frame's result can be taken without waiting."""
+        while self._collect(block=False):
+            pass
+        return bool(self._order) and self._order[0] in self._done
+
+    def get(self, timeout: float | None = None):
+        """Return (seq, result) for the oldest submitted frame, or None on timeout / nothing pending.
+
+        `timeout` defaults to the pool's (which waits forever if None). Raises
+        RuntimeError if a worker process has died.
+        """
+        if not self._order:
+            return None
+        if timeout is None:
+            timeout = self.timeout
+        seq = self._order[0]
+        while seq not in self._done:
+            if not self._collect(block=True, timeout=timeout):
+                return None
+        self._order.popleft()
+        return seq, self._done.pop(seq)
+
+    def close(self):
+        """Stop the workers and free the shared memory."""
+        if self._jobs is not None:
+            for _ in self._procs:
+                self._jobs.put(None)
+            for p in self._procs:
+                p.join(timeout=2.0)
+                if p.is_alive():
+                    p.terminate()
+        self._procs = []
+        self._jobs = None
+        self._results = None
+        self._pending.clear()
+        self._done.clear()
+        self._order.clear()
+        if self.slots is not None:
+            self.slots.close()
+            self.slots = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PooledVision:
+    """Vision look-alike that farms `find_enemies` out to a WorkerPool.
+
+    Each call waits for its own frame, so this only helps with split="rows"; drop it
+    into the Pipeline (or the plain loop) in place of a Vision. `downscale` and
+    `morphology` are passed to the workers with every frame, so the FrameScheduler's
+    quality ladder applies to pooled detection too.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.downscale = pool.vision.downscale
+        self.morphology = pool.vision.morphology
+
+    def find_enemies(self, frame):
+        seq = self.pool.submit(frame, downscale=self.downscale, morphology=self.morphology)
+        while True:
+            result = self.pool.get()
+            if result is None:
+                logger.warning("PooledVision: no result within %.1fs, skipping the frame", self.pool.timeout)
+                return []
+            if result[0] == seq:
+                return as_tuples(result[1])
+            # a late result for a frame that was already skipped
+
+    def close(self):
+        self.pool.close()